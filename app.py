@@ -1,13 +1,58 @@
 # app.py - 3D Print Cost Evaluator (Refined UI/UX)
 
+import functools
+import io
+import time
+from contextlib import nullcontext
+from dataclasses import asdict, astuple
+
+import altair as alt
+import numpy as np
 import streamlit as st
 import pandas as pd
 
+from catalog_index import RANGE_FIELDS, CatalogIndex, CatalogQuery
 from cost_model import (
+    DEFAULT_SETTINGS,
+    CostQuantities,
     EnvironmentSettings,
+    STATUS_LABELS,
     ModelInput,
+    calculate_break_even_and_health,
     calculate_costs,
+    classify_model,
+    precompute_quantities,
+)
+from farm_schedule import FarmConfig, schedule_farm
+from fleet import evaluate_fleet
+from instrumentation import recording, stage
+from monte_carlo import DISTRIBUTION_KINDS, Distribution, MonteCarloConfig, simulate
+from portfolio import (
+    FORMAT_MIME_TYPES,
+    PortfolioInsights,
+    PortfolioResults,
+    PortfolioTotals,
+    environment_from_settings,
+    evaluate_portfolio,
+    file_format,
+    page_results,
+    read_portfolio,
+    report_bytes,
+    reprice_portfolio,
+    solve_thresholds,
+    validate_portfolio,
+    write_report,
+)
+from portfolio_diff import (
+    MAX_CHANGE_ROWS,
+    PortfolioSnapshot,
+    compare_snapshot,
+    update_portfolio,
 )
+from result_cache import ResultCache, content_digest, portfolio_cache_key
+from result_store import DEFAULT_STORE_PATH, ResultStore
+from sensitivity import sweep
+from slicer_import import READ_ERRORS, read_slicer_file
 
 
 st.set_page_config(
@@ -20,20 +65,7 @@ st.set_page_config(
 
 def init_session_defaults():
     """Initialize session state with sensible defaults."""
-    defaults = {
-        "filament_price_per_kg": 25.0,
-        "electricity_price_per_kwh": 0.30,
-        "printer_power_watts": 250.0,
-        "labour_rate_per_hour": 30.0,
-        "prep_time_minutes": 10.0,
-        "cleanup_time_minutes": 10.0,
-        "plate_change_time_minutes": 5.0,
-        "remote_check_minutes_per_hour": 2.0,
-        "has_automation": False,
-        "automated_plate_capacity": 4,
-        "healthy_margin_floor_percent": 20.0,
-    }
-    for key, value in defaults.items():
+    for key, value in DEFAULT_SETTINGS.items():
         st.session_state.setdefault(key, value)
 
 
@@ -43,100 +75,114 @@ def sidebar_env_settings() -> EnvironmentSettings:
     with st.sidebar:
         st.header("⚙️ Settings")
         
-        # Material & Energy Section
-        with st.expander("💰 Material & Energy Costs", expanded=True):
-            filament_price_per_kg = st.number_input(
-                "Filament price ($/kg)",
-                min_value=0.0,
-                value=float(st.session_state["filament_price_per_kg"]),
-                step=0.5,
-                help="Cost per kilogram of filament material",
-            )
-            electricity_price_per_kwh = st.number_input(
-                "Electricity rate ($/kWh)",
-                min_value=0.0,
-                value=float(st.session_state["electricity_price_per_kwh"]),
-                step=0.05,
-                help="Your local electricity cost per kilowatt-hour",
-            )
-            printer_power_watts = st.number_input(
-                "Printer power (W)",
-                min_value=0.0,
-                value=float(st.session_state["printer_power_watts"]),
-                step=10.0,
-                help="Average power consumption of your 3D printer",
-            )
+        live = st.toggle(
+            "Apply changes immediately",
+            key="live_settings",
+            help="Re-cost on every edit instead of batching edits until "
+            "**Apply settings**; pairs well with instant re-pricing",
+        )
 
-        # Labour & Time Section
-        with st.expander("👤 Labour & Time", expanded=True):
-            labour_rate_per_hour = st.number_input(
-                "Labour rate ($/hour)",
-                min_value=0.0,
-                value=float(st.session_state["labour_rate_per_hour"]),
-                step=1.0,
-                help="Your hourly rate for hands-on work",
-            )
-            
-            st.markdown("**Time per job:**")
-            prep_time_minutes = st.number_input(
-                "Prep time (min)",
-                min_value=0.0,
-                value=float(st.session_state["prep_time_minutes"]),
-                step=1.0,
-                help="Time to prepare printer and start the job",
-            )
-            cleanup_time_minutes = st.number_input(
-                "Cleanup time (min)",
-                min_value=0.0,
-                value=float(st.session_state["cleanup_time_minutes"]),
-                step=1.0,
-                help="Time to remove print and clean up",
-            )
-            plate_change_time_minutes = st.number_input(
-                "Plate change time (min)",
-                min_value=0.0,
-                value=float(st.session_state["plate_change_time_minutes"]),
-                step=1.0,
-                help="Time needed to swap build plates",
-            )
-            remote_check_minutes_per_hour = st.number_input(
-                "Remote monitoring (min/hour)",
-                min_value=0.0,
-                value=float(st.session_state["remote_check_minutes_per_hour"]),
-                step=0.5,
-                help="Time spent checking on prints remotely per hour of print time",
-            )
+        # Edits are batched in a form so the tabs rerun once per apply
+        settings = st.container() if live else st.form("settings_form", border=False)
+        with settings:
+            # Material & Energy Section
+            with st.expander("💰 Material & Energy Costs", expanded=True):
+                filament_price_per_kg = st.number_input(
+                    "Filament price ($/kg)",
+                    min_value=0.0,
+                    value=float(st.session_state["filament_price_per_kg"]),
+                    step=0.5,
+                    help="Cost per kilogram of filament material",
+                )
+                electricity_price_per_kwh = st.number_input(
+                    "Electricity rate ($/kWh)",
+                    min_value=0.0,
+                    value=float(st.session_state["electricity_price_per_kwh"]),
+                    step=0.05,
+                    help="Your local electricity cost per kilowatt-hour",
+                )
+                printer_power_watts = st.number_input(
+                    "Printer power (W)",
+                    min_value=0.0,
+                    value=float(st.session_state["printer_power_watts"]),
+                    step=10.0,
+                    help="Average power consumption of your 3D printer",
+                )
 
-        # Automation Section
-        with st.expander("🤖 Automation", expanded=True):
-            has_automation = st.checkbox(
-                "I have plate automation (AMS/sled system)",
-                value=bool(st.session_state["has_automation"]),
-                help="Enable if you have automated plate changing capability",
-            )
-            if has_automation:
+            # Labour & Time Section
+            with st.expander("👤 Labour & Time", expanded=True):
+                labour_rate_per_hour = st.number_input(
+                    "Labour rate ($/hour)",
+                    min_value=0.0,
+                    value=float(st.session_state["labour_rate_per_hour"]),
+                    step=1.0,
+                    help="Your hourly rate for hands-on work",
+                )
+
+                st.markdown("**Time per job:**")
+                prep_time_minutes = st.number_input(
+                    "Prep time (min)",
+                    min_value=0.0,
+                    value=float(st.session_state["prep_time_minutes"]),
+                    step=1.0,
+                    help="Time to prepare printer and start the job",
+                )
+                cleanup_time_minutes = st.number_input(
+                    "Cleanup time (min)",
+                    min_value=0.0,
+                    value=float(st.session_state["cleanup_time_minutes"]),
+                    step=1.0,
+                    help="Time to remove print and clean up",
+                )
+                plate_change_time_minutes = st.number_input(
+                    "Plate change time (min)",
+                    min_value=0.0,
+                    value=float(st.session_state["plate_change_time_minutes"]),
+                    step=1.0,
+                    help="Time needed to swap build plates",
+                )
+                remote_check_minutes_per_hour = st.number_input(
+                    "Remote monitoring (min/hour)",
+                    min_value=0.0,
+                    value=float(st.session_state["remote_check_minutes_per_hour"]),
+                    step=0.5,
+                    help="Time spent checking on prints remotely per hour of print time",
+                )
+
+            # Automation Section
+            with st.expander("🤖 Automation", expanded=True):
+                has_automation = st.checkbox(
+                    "I have plate automation (AMS/sled system)",
+                    value=bool(st.session_state["has_automation"]),
+                    help="Enable if you have automated plate changing capability",
+                )
+                # Always shown, since a form only applies the checkbox on submit
                 automated_plate_capacity = st.number_input(
                     "Automation capacity (plates)",
                     min_value=1,
                     value=int(st.session_state["automated_plate_capacity"]),
                     step=1,
-                    help="Maximum plates your system can handle unattended",
+                    help="Maximum plates your system can handle unattended; "
+                    "ignored without plate automation",
                 )
-            else:
-                automated_plate_capacity = 1
 
-        # Pricing Guidance Section
-        with st.expander("📊 Pricing Guidance", expanded=True):
-            healthy_margin_floor_percent = st.number_input(
-                "Target healthy margin (%)",
-                min_value=0.0,
-                max_value=95.0,
-                value=float(st.session_state["healthy_margin_floor_percent"]),
-                step=5.0,
-                help="Minimum profit margin you consider 'healthy' for your business",
-            )
-            
-            st.caption("This helps classify models as losing money, low margin, or healthy.")
+            # Pricing Guidance Section
+            with st.expander("📊 Pricing Guidance", expanded=True):
+                healthy_margin_floor_percent = st.number_input(
+                    "Target healthy margin (%)",
+                    min_value=0.0,
+                    max_value=95.0,
+                    value=float(st.session_state["healthy_margin_floor_percent"]),
+                    step=5.0,
+                    help="Minimum profit margin you consider 'healthy' for your business",
+                )
+
+                st.caption("This helps classify models as losing money, low margin, or healthy.")
+
+            if not live:
+                st.form_submit_button(
+                    "✅ Apply settings", type="primary", use_container_width=True
+                )
 
     # Persist to session state
     st.session_state.update({
@@ -163,36 +209,10 @@ def sidebar_env_settings() -> EnvironmentSettings:
         plate_change_time_minutes=plate_change_time_minutes,
         remote_check_minutes_per_hour=remote_check_minutes_per_hour,
         has_automation=has_automation,
-        automated_plate_capacity=automated_plate_capacity,
+        automated_plate_capacity=automated_plate_capacity if has_automation else 1,
     )
 
 
-def calculate_break_even_and_health(
-    total_cost: float, healthy_margin_floor_percent: float
-) -> tuple[float, float | None]:
-    """Calculate break-even price and healthy margin price."""
-    break_even_price = total_cost
-    if 0 < healthy_margin_floor_percent < 100:
-        m = healthy_margin_floor_percent / 100.0
-        healthy_price = total_cost / (1.0 - m)
-    else:
-        healthy_price = None
-    return break_even_price, healthy_price
-
-
-def classify_model(
-    sale_price: float, total_cost: float, healthy_price: float | None
-) -> str:
-    """Categorize a model's profitability."""
-    if sale_price < total_cost:
-        return "Losing money"
-    if healthy_price is None:
-        return "Profitable"
-    if sale_price < healthy_price:
-        return "Low margin"
-    return "Healthy"
-
-
 def get_status_color(status: str) -> str:
     """Return color for status indicators."""
     colors = {
@@ -204,6 +224,15 @@ def get_status_color(status: str) -> str:
     return colors.get(status, "#808080")
 
 
+# Status cell style per status code, so a page is coloured by indexing
+STATUS_STYLES = np.array(
+    [f"background-color: {get_status_color(status)}20" for status in STATUS_LABELS],
+    dtype=object,
+)
+PAGE_SIZES = (25, 50, 100, 250)
+NAME_MATCHES = ("Contains", "Starts with")
+
+
 def render_cost_breakdown_chart(breakdown):
     """Render a simple visual breakdown of costs."""
     cost_data = pd.DataFrame({
@@ -218,9 +247,120 @@ def render_cost_breakdown_chart(breakdown):
     st.bar_chart(cost_data.set_index("Category"), height=200)
 
 
+# ---------------------------------------------------------------------
+# Rerun timings
+# ---------------------------------------------------------------------
+RERUN_HISTORY = 20
+
+
+def record_rerun(scope: str, start: float) -> float:
+    """Add the time since ``start`` to the session's rerun history, in ms."""
+    elapsed_ms = (time.perf_counter() - start) * 1000.0
+    history = st.session_state.setdefault("rerun_timings", [])
+    history.append((scope, elapsed_ms))
+    del history[:-RERUN_HISTORY]
+    return elapsed_ms
+
+
+def timed_fragment(scope: str):
+    """Run a section as a fragment and record how long each of its runs takes.
+
+    Widgets inside a fragment rerun only that fragment, so editing one tab
+    does not re-render (or recompute) the others. While timings are shown,
+    the section's stages are also recorded and listed in a Performance panel.
+    """
+    def decorate(render):
+        @st.fragment
+        @functools.wraps(render)
+        def run(*args, **kwargs):
+            start = time.perf_counter()
+            instrument = st.session_state.get("show_timings")
+            with recording() if instrument else nullcontext() as recorder:
+                render(*args, **kwargs)
+            elapsed_ms = record_rerun(scope, start)
+            if instrument:
+                render_performance_panel(scope, elapsed_ms, recorder)
+        return run
+    return decorate
+
+
+def render_performance_panel(scope: str, elapsed_ms: float, recorder):
+    """Collapsible per-stage wall time and rows for one section run."""
+    with st.expander(f"⏱️ Performance: {scope} rendered in {elapsed_ms:,.0f} ms"):
+        if not recorder:
+            st.caption("No instrumented stages ran")
+            return
+        st.dataframe(
+            recorder.to_frame().round(1), use_container_width=True, hide_index=True
+        )
+        st.caption(
+            "Stages: upload read, validation, costing, classification, aggregation, "
+            "table render and export. Counters are calls to the scalar cost model."
+        )
+
+
+def render_timings_panel():
+    """Sidebar debug panel listing the latest full and fragment rerun times."""
+    with st.sidebar:
+        st.markdown("---")
+        if not st.toggle(
+            "🐞 Show performance timings",
+            key="show_timings",
+            help="Record per-stage timings and list recent rerun times",
+        ):
+            return
+        history = st.session_state.get("rerun_timings", [])
+        st.dataframe(
+            pd.DataFrame(history[::-1], columns=["Rerun", "ms"]).round(1),
+            use_container_width=True,
+            hide_index=True,
+        )
+        st.caption(
+            "Newest first. Tab edits rerun only their own tab; settings rerun the whole app."
+        )
+
+
 # ---------------------------------------------------------------------
 # Single model tab
 # ---------------------------------------------------------------------
+SINGLE_MODEL_DEFAULTS = {
+    "single_model_name": "",
+    "single_filament_grams": 83.0,
+    "single_print_time_hours": 5.4,
+    "single_plate_count": 1,
+}
+
+
+def render_slicer_import():
+    """Fill the model inputs from an uploaded sliced file, once per file."""
+    uploaded = st.file_uploader(
+        "📂 Import from slicer (optional)",
+        type=["gcode", "gco", "3mf"],
+        help="Reads filament weight, print time and plates from a sliced .gcode "
+        "or .gcode.3mf file (PrusaSlicer, OrcaSlicer, Bambu Studio, Cura)",
+        key="slicer_upload",
+    )
+    if uploaded is None or st.session_state.get("slicer_upload_id") == uploaded.file_id:
+        return
+    st.session_state["slicer_upload_id"] = uploaded.file_id
+    try:
+        model = read_slicer_file(uploaded)
+    except READ_ERRORS as exc:
+        st.error(f"❌ Could not read slicer estimates: {exc}")
+        return
+    st.session_state.update({
+        "single_model_name": model.name,
+        "single_filament_grams": round(model.filament_grams, 2),
+        "single_print_time_hours": round(model.print_time_hours, 2),
+        "single_plate_count": model.plate_count,
+    })
+    st.success(
+        f"✅ Imported {model.name}: {model.filament_grams:.1f} g, "
+        f"{model.print_time_hours:.2f} h, {model.plate_count} plate(s)"
+    )
+
+
+@timed_fragment("Single Model")
 def render_single_model_tab(env_settings: EnvironmentSettings):
     """Render the single model analysis interface."""
     
@@ -241,12 +381,16 @@ def render_single_model_tab(env_settings: EnvironmentSettings):
         - Downloadable cost report
         """)
 
+    for key, value in SINGLE_MODEL_DEFAULTS.items():
+        st.session_state.setdefault(key, value)
+    render_slicer_import()
+
     # Model identification
     col1, col2 = st.columns([2, 1])
     with col1:
         model_name = st.text_input(
             "Model name",
-            value="",
+            key="single_model_name",
             placeholder="e.g., MH-6 Little Bird Helicopter",
             help="Give this model a memorable name",
         )
@@ -268,8 +412,8 @@ def render_single_model_tab(env_settings: EnvironmentSettings):
         filament_grams = st.number_input(
             "Filament (g)",
             min_value=0.0,
-            value=83.0,
             step=1.0,
+            key="single_filament_grams",
             help="Total filament weight from slicer",
         )
     
@@ -277,8 +421,8 @@ def render_single_model_tab(env_settings: EnvironmentSettings):
         print_time_hours = st.number_input(
             "Print time (h)",
             min_value=0.0,
-            value=5.4,
             step=0.1,
+            key="single_print_time_hours",
             help="Total print duration from slicer",
         )
     
@@ -286,8 +430,8 @@ def render_single_model_tab(env_settings: EnvironmentSettings):
         plate_count = st.number_input(
             "Plates",
             min_value=1,
-            value=1,
             step=1,
+            key="single_plate_count",
             help="Number of build plates needed",
         )
     
@@ -527,6 +671,358 @@ def render_single_model_tab(env_settings: EnvironmentSettings):
 # ---------------------------------------------------------------------
 # Portfolio tab
 # ---------------------------------------------------------------------
+@st.cache_resource
+def get_result_cache() -> ResultCache:
+    """Process-wide cache of evaluated portfolios, shared across sessions."""
+    return ResultCache(max_entries=16, ttl_seconds=3600.0)
+
+
+@st.cache_resource
+def get_result_store() -> ResultStore:
+    """On-disk store of evaluated models that outlives sessions and restarts."""
+    return ResultStore(DEFAULT_STORE_PATH)
+
+
+def upload_digest(uploaded) -> str:
+    """Content hash of an upload, computed once per uploaded file."""
+    digests = st.session_state.setdefault("upload_digests", {})
+    if uploaded.file_id not in digests:
+        digests.clear()
+        digests[uploaded.file_id] = content_digest(uploaded.getvalue())
+    return digests[uploaded.file_id]
+
+
+def read_uploaded_portfolio(uploaded) -> tuple[pd.DataFrame, pd.DataFrame] | None:
+    """Parse and validate an uploaded portfolio, reporting problems inline.
+
+    Returns the valid rows and the cells that were rejected.
+    """
+    try:
+        df = read_portfolio(uploaded)
+    except ValueError as exc:
+        st.error(f"❌ {exc}")
+        return None
+    except Exception as exc:
+        st.error(f"❌ Could not read {file_format(uploaded).upper()} file: {exc}")
+        return None
+    valid, rejects = validate_portfolio(df)
+    if len(valid) == 0:
+        st.error("❌ No rows could be costed; every row has a missing or invalid value")
+        render_rejects(rejects)
+        return None
+    return valid, rejects
+
+
+def render_rejects(rejects: pd.DataFrame):
+    """List cells that could not be read, with the full list as a download."""
+    if len(rejects) == 0:
+        return
+    rows = rejects["Row"].nunique()
+    with st.expander(f"⚠️ Skipped {rows:,} row(s) with {len(rejects):,} invalid cell(s)"):
+        st.dataframe(rejects.head(MAX_CHANGE_ROWS), use_container_width=True, hide_index=True)
+        if len(rejects) > MAX_CHANGE_ROWS:
+            st.caption(f"Showing the first {MAX_CHANGE_ROWS:,}; download for the full list")
+        st.download_button(
+            "📥 Download Rejected Cells",
+            data=report_bytes(rejects, "csv"),
+            file_name="portfolio_rejects.csv",
+            mime="text/csv",
+        )
+
+
+def results_index(results: PortfolioResults, digest: str) -> CatalogIndex:
+    """Query index over the shown results, kept in session state.
+
+    Re-costing the same upload keeps the model-name index, which is the
+    slow part to build.
+    """
+    state = st.session_state.get("catalog_index")
+    if state is None or state["index"].results is not results:
+        if state is not None and state["digest"] == digest:
+            index = state["index"].with_results(results)
+        else:
+            index = CatalogIndex(results)
+        state = {"digest": digest, "index": index}
+        st.session_state["catalog_index"] = state
+    return state["index"]
+
+
+@timed_fragment("Results table")
+def render_results_table(results: PortfolioResults, digest: str):
+    """Filterable, sortable results table that only builds the visible page."""
+    col1, col2, col3, col4, col5 = st.columns([2, 2, 1, 1, 1])
+    statuses = col1.multiselect("Status", STATUS_LABELS, key="results_status")
+    name = col2.text_input("Model name", key="results_search")
+    match = col3.selectbox("Match", NAME_MATCHES, key="results_match")
+    min_margin = col4.number_input("Min margin (%)", value=None, key="results_min_margin")
+    max_margin = col5.number_input("Max margin (%)", value=None, key="results_max_margin")
+
+    query = CatalogQuery()
+    bounds = []
+    with st.expander("🔎 More filters"):
+        for field, column in RANGE_FIELDS.items():
+            if column == "Margin (%)":
+                continue
+            col1, col2 = st.columns(2)
+            low = col1.number_input(f"Min {column}", value=None, key=f"results_min_{field}")
+            high = col2.number_input(f"Max {column}", value=None, key=f"results_max_{field}")
+            if low is not None or high is not None:
+                query = query.where(column, low, high)
+            bounds.append((low, high))
+    if name and match == "Starts with":
+        query = query.starting_with(name)
+
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    sort_by = col1.selectbox(
+        "Sort by", results.columns, index=None, placeholder="Upload order", key="results_sort"
+    )
+    descending = col2.toggle("Descending", key="results_descending")
+    page_size = col3.selectbox("Rows per page", PAGE_SIZES, index=1, key="results_page_size")
+
+    # Any change to the filters, sort or page size starts again from page 1
+    view = (
+        tuple(statuses), name, match, min_margin, max_margin, tuple(bounds),
+        sort_by, descending, page_size,
+    )
+    if st.session_state.get("results_view") != view:
+        st.session_state["results_view"] = view
+        st.session_state["results_page"] = 1
+    page_number = col4.number_input("Page", min_value=1, step=1, key="results_page")
+
+    index = results_index(results, digest)
+    building = name and not index.names_ready
+    with st.spinner("Indexing model names...") if building else nullcontext():
+        start = time.perf_counter()
+        page = page_results(
+            results,
+            statuses=statuses,
+            min_margin=min_margin,
+            max_margin=max_margin,
+            search=name if match == "Contains" else "",
+            sort_by=sort_by,
+            descending=descending,
+            page=int(page_number) - 1,
+            page_size=page_size,
+            query=query,
+            index=index,
+        )
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+    with stage("render", len(page.rows)):
+        styles = pd.DataFrame("", index=page.frame.index, columns=page.frame.columns)
+        styles["Status"] = STATUS_STYLES[page.status_codes]
+        st.dataframe(
+            page.frame.style.apply(lambda _: styles, axis=None),
+            use_container_width=True,
+            hide_index=True,
+        )
+    if page.matches:
+        first = page.page * page_size + 1
+        st.caption(
+            f"Showing {first:,}–{first + len(page.rows) - 1:,} of {page.matches:,} "
+            f"matching models (page {page.page + 1:,} of {page.pages:,}; "
+            f"{len(results):,} in total; found in {elapsed_ms:.1f} ms)"
+        )
+    else:
+        st.caption(f"No models match the filters ({len(results):,} in total)")
+
+
+def uploaded_quantities(
+    uploaded, digest: str, env_settings: EnvironmentSettings
+) -> tuple[pd.DataFrame, CostQuantities] | None:
+    """Input columns and cost quantities of an upload, parsed once per file."""
+    state = st.session_state.get("repricing")
+    if state is None or state["digest"] != digest:
+        parsed = read_uploaded_portfolio(uploaded)
+        if parsed is None:
+            return None
+        df, rejects = parsed
+        state = {
+            "digest": digest,
+            "frame": df,
+            "rejects": rejects,
+            "quantities": precompute_quantities(env_settings, df),
+        }
+        st.session_state["repricing"] = state
+    return state["frame"], state["quantities"]
+
+
+def reprice_uploaded_portfolio(
+    uploaded, digest: str, env_settings: EnvironmentSettings, healthy_floor: float
+) -> PortfolioResults | None:
+    """Re-cost an upload from quantities kept in session state."""
+    parsed = uploaded_quantities(uploaded, digest, env_settings)
+    if parsed is None:
+        return None
+    df, quantities = parsed
+
+    # The previous breakdown is only referenced by the last rerun's
+    # results, so its buffers are overwritten rather than reallocated
+    state = st.session_state["repricing"]
+    start = time.perf_counter()
+    quantities, results = reprice_portfolio(
+        env_settings, quantities, df, healthy_floor, out=state.get("breakdown")
+    )
+    state["quantities"] = quantities
+    state["breakdown"] = results.breakdown
+    elapsed_ms = (time.perf_counter() - start) * 1000.0
+    st.caption(f"⚡ Re-priced {len(results):,} models in {elapsed_ms:.1f} ms")
+    return results
+
+
+def render_change_summary(snapshot: PortfolioSnapshot):
+    """What changed since the previous upload, if it was diffed against one."""
+    diff = snapshot.diff
+    if diff is None:
+        return
+    with st.expander(f"🔄 What changed: {diff.summary()}", expanded=diff.has_changes):
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Added", f"{len(diff.added):,}")
+        col2.metric("Changed", f"{len(diff.changed):,}")
+        col3.metric("Removed", f"{len(diff.removed):,}")
+        col4.metric("Unchanged", f"{diff.unchanged:,}")
+
+        previous, current = snapshot.previous_totals, snapshot.totals
+        col1, col2 = st.columns(2)
+        col1.metric(
+            "Total Portfolio Profit",
+            f"${current.total_profit:,.2f}",
+            delta=f"{current.total_profit - previous.total_profit:+,.2f}",
+        )
+        col2.metric(
+            "Losing Money",
+            current.status_counts["Losing money"],
+            delta=current.status_counts["Losing money"] - previous.status_counts["Losing money"],
+            delta_color="inverse",
+        )
+        if len(snapshot.changes):
+            st.dataframe(snapshot.changes, use_container_width=True, hide_index=True)
+            if max(len(diff.added), len(diff.changed), len(diff.removed)) > MAX_CHANGE_ROWS:
+                st.caption(f"Showing up to {MAX_CHANGE_ROWS} rows of each kind of change")
+
+
+def render_uncertainty_section(
+    uploaded, digest: str, env_settings: EnvironmentSettings, healthy_floor: float
+):
+    """Monte Carlo ranges for slicer estimate error and failed prints."""
+    with st.expander("🎲 Uncertainty (Monte Carlo)"):
+        st.caption(
+            "Slicer estimates are rarely exact and some prints fail. Simulate "
+            "the likely range of cost, profit and margin for every model."
+        )
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            kind = st.selectbox("Error distribution", DISTRIBUTION_KINDS, index=1)
+            samples = st.number_input(
+                "Samples", min_value=100, max_value=100_000, value=10_000, step=1_000
+            )
+        with col2:
+            time_spread = st.number_input(
+                "Print time error (±%)", min_value=0.0, value=10.0, step=1.0
+            )
+            filament_spread = st.number_input(
+                "Filament error (±%)", min_value=0.0, value=5.0, step=1.0
+            )
+        with col3:
+            failure_rate = st.number_input(
+                "Failure rate (%)", min_value=0.0, max_value=95.0, value=5.0, step=1.0
+            )
+            failure_waste = st.number_input(
+                "Wasted per failure (%)",
+                min_value=0.0,
+                max_value=100.0,
+                value=50.0,
+                step=5.0,
+                help="Share of filament and print time lost when a print fails",
+            )
+
+        config = MonteCarloConfig(
+            filament=Distribution(kind, filament_spread / 100.0),
+            print_time=Distribution(kind, time_spread / 100.0),
+            failure_rate=failure_rate / 100.0,
+            failure_waste_fraction=failure_waste / 100.0,
+            samples=int(samples),
+        )
+        sim_key = (digest, astuple(env_settings), healthy_floor, repr(config))
+        cached = st.session_state.get("monte_carlo")
+        if cached is None or cached[0] != sim_key:
+            if not st.button("🎲 Run simulation"):
+                return
+            parsed = uploaded_quantities(uploaded, digest, env_settings)
+            if parsed is None:
+                return
+            df, _ = parsed
+            with st.spinner(f"Simulating {len(df):,} models × {config.samples:,} samples..."):
+                result = simulate(env_settings, df, config, healthy_floor)
+                result.insert(0, "Model", df["model_name"].astype(str).to_numpy())
+            st.session_state["monte_carlo"] = (sim_key, result)
+        else:
+            result = cached[1]
+
+        st.dataframe(
+            result,
+            use_container_width=True,
+            height=300,
+            column_config={
+                col: st.column_config.ProgressColumn(col, min_value=0.0, max_value=1.0)
+                for col in result.columns
+                if col.startswith("p_")
+            },
+        )
+        st.download_button(
+            "📥 Download Simulation (CSV)",
+            data=result.to_csv(index=False).encode("utf-8"),
+            file_name="portfolio_uncertainty.csv",
+            mime="text/csv",
+        )
+
+
+def solved_results(
+    results: PortfolioResults,
+    env_settings: EnvironmentSettings,
+    healthy_floor: float,
+    target_margin: float | None,
+) -> PortfolioResults:
+    """Results with price and cost thresholds, solved once per results and target."""
+    key = (astuple(env_settings), healthy_floor, target_margin)
+    state = st.session_state.get("solved_results")
+    if state is None or state["source"] is not results or state["key"] != key:
+        solved = solve_thresholds(env_settings, results, healthy_floor, target_margin)
+        state = {"source": results, "key": key, "solved": solved}
+        st.session_state["solved_results"] = state
+    return state["solved"]
+
+
+def export_report(results: PortfolioResults, fmt: str) -> io.BytesIO:
+    """Report file for download, written chunk by chunk when it is requested."""
+    buffer = io.BytesIO()
+    write_report(results, buffer, fmt)
+    buffer.seek(0)
+    return buffer
+
+
+def ranking_frame(ranking, value_label: str) -> pd.DataFrame:
+    return pd.DataFrame({"Model": ranking.names, value_label: ranking.values})
+
+
+@st.cache_data
+def portfolio_template() -> tuple[pd.DataFrame, bytes]:
+    """Example portfolio shown in the portfolio tab, with its CSV download."""
+    example_df = pd.DataFrame({
+        "model_name": ["Example Model A", "Example Model B", "Example Model C"],
+        "reference_url": [
+            "https://makerworld.com/model-a",
+            "https://makerworld.com/model-b",
+            "",
+        ],
+        "filament_grams": [83.0, 376.0, 150.0],
+        "print_time_hours": [5.4, 16.9, 8.2],
+        "plate_count": [1, 1, 2],
+        "sale_price": [40.0, 60.0, 45.0],
+    })
+    return example_df, example_df.to_csv(index=False).encode("utf-8")
+
+
+@timed_fragment("Portfolio Analysis")
 def render_portfolio_tab(env_settings: EnvironmentSettings):
     """Render the portfolio analysis interface."""
     
@@ -554,24 +1050,11 @@ def render_portfolio_tab(env_settings: EnvironmentSettings):
     # Template download
     st.markdown("#### 📄 Step 1: Get Template")
     
-    example_df = pd.DataFrame({
-        "model_name": ["Example Model A", "Example Model B", "Example Model C"],
-        "reference_url": [
-            "https://makerworld.com/model-a",
-            "https://makerworld.com/model-b",
-            "",
-        ],
-        "filament_grams": [83.0, 376.0, 150.0],
-        "print_time_hours": [5.4, 16.9, 8.2],
-        "plate_count": [1, 1, 2],
-        "sale_price": [40.0, 60.0, 45.0],
-    })
-    
+    example_df, template_csv = portfolio_template()
     col1, col2 = st.columns([2, 1])
     with col1:
         st.dataframe(example_df, use_container_width=True)
     with col2:
-        template_csv = example_df.to_csv(index=False).encode("utf-8")
         st.download_button(
             "📥 Download Template",
             data=template_csv,
@@ -584,77 +1067,99 @@ def render_portfolio_tab(env_settings: EnvironmentSettings):
     st.markdown("#### 📤 Step 2: Upload Your Portfolio")
     
     uploaded = st.file_uploader(
-        "Upload your portfolio CSV",
-        type=["csv"],
-        help="Upload a CSV file matching the template format",
+        "Upload your portfolio (CSV, Parquet or Feather)",
+        type=["csv", "parquet", "feather", "arrow"],
+        help="Upload a file with the template columns; Parquet and Feather "
+        "load much faster than CSV for large catalogs",
+        key="portfolio_upload",
     )
 
+    # The upload widget only reruns this tab; rerun the app when it changes so
+    # the Sensitivity and Fleet tabs pick up the new file
+    upload_id = None if uploaded is None else uploaded.file_id
+    if st.session_state.setdefault("portfolio_upload_id", upload_id) != upload_id:
+        st.session_state["portfolio_upload_id"] = upload_id
+        st.rerun()
+
     if uploaded is None:
-        st.info("👆 Upload a CSV file to analyze your portfolio")
+        st.info("👆 Upload a portfolio file to analyze it")
         return
 
-    # Process uploaded file
-    try:
-        df = pd.read_csv(uploaded)
-    except Exception as exc:
-        st.error(f"❌ Could not read CSV: {exc}")
-        return
+    healthy_floor = float(st.session_state["healthy_margin_floor_percent"])
+    digest = upload_digest(uploaded)
+    col1, col2 = st.columns(2)
+    instant_repricing = col1.toggle(
+        "⚡ Instant re-pricing",
+        value=False,
+        help="Extract per-model quantities once per upload so sidebar changes "
+        "re-cost the portfolio without re-reading the file",
+    )
+    use_store = col2.toggle(
+        "🗄️ Save results to disk",
+        value=False,
+        key="use_result_store",
+        disabled=instant_repricing,
+        help=f"Keep evaluated models in {DEFAULT_STORE_PATH} so they survive restarts. "
+        "Slower than recomputing; useful when the store is also queried from the CLI.",
+    )
 
-    # Validate required columns
-    required_cols = {
-        "model_name",
-        "filament_grams",
-        "print_time_hours",
-        "plate_count",
-        "sale_price",
-    }
-    missing = required_cols - set(df.columns)
-    if missing:
-        st.error(f"❌ Missing required columns: {', '.join(sorted(missing))}")
-        return
+    if instant_repricing:
+        results = reprice_uploaded_portfolio(
+            uploaded, digest, env_settings, healthy_floor
+        )
+        if results is None:
+            return
+        totals = PortfolioTotals.from_results(results)
+        render_rejects(st.session_state["repricing"]["rejects"])
+    else:
+        # Calculate costs for all models, reusing cached results when the
+        # upload and every relevant setting are unchanged. The cache is shared
+        # by all sessions, so it holds results only; "what changed" is
+        # worked out against this session's previous upload.
+        cache = get_result_cache()
+        store = get_result_store() if use_store else None
+        cache_key = portfolio_cache_key(digest, env_settings, healthy_floor)
+        current = st.session_state.get("portfolio_snapshot")
+        if current is not None and current[0] == cache_key:
+            _, snapshot, rejects = current
+        else:
+            previous = current[1] if current is not None else None
+            cached = cache.get(cache_key)
+            if cached is None:
+                parsed = read_uploaded_portfolio(uploaded)
+                if parsed is None:
+                    return
+                df, rejects = parsed
+                # Only rows that differ from the previous upload are re-costed,
+                # and those are looked up in the result store first if it is on
+                with st.spinner("Analyzing portfolio..."):
+                    snapshot = update_portfolio(
+                        previous,
+                        env_settings,
+                        df,
+                        healthy_floor,
+                        evaluate=evaluate_portfolio if store is None else store.evaluate_portfolio,
+                    )
+                cache.put(cache_key, (snapshot.results, snapshot.totals, rejects))
+            else:
+                results, totals, rejects = cached
+                snapshot = compare_snapshot(
+                    previous, results, totals, (astuple(env_settings), healthy_floor)
+                )
+            st.session_state["portfolio_snapshot"] = (cache_key, snapshot, rejects)
+        results, totals = snapshot.results, snapshot.totals
 
-    # Calculate costs for all models
-    healthy_floor = float(st.session_state["healthy_margin_floor_percent"])
-    
-    with st.spinner("Analyzing portfolio..."):
-        results = []
-        for _, row in df.iterrows():
-            model = ModelInput(
-                model_name=str(row.get("model_name", "")) or None,
-                reference_url=str(row.get("reference_url", "")) or None,
-                filament_grams=float(row["filament_grams"]),
-                print_time_hours=float(row["print_time_hours"]),
-                plate_count=int(row["plate_count"]),
-                sale_price=float(row["sale_price"]),
-                target_margin_percent=None,
+        st.caption(
+            f"🗄️ Result cache: {cache.hits} hits / {cache.misses} misses "
+            f"({len(cache)}/{cache.max_entries} entries)"
+            + (
+                f" · Result store: {store.hits:,} hits / {store.misses:,} misses"
+                if store is not None
+                else ""
             )
-            breakdown = calculate_costs(env_settings, model)
-            break_even_price, healthy_price = calculate_break_even_and_health(
-                breakdown.total_cost, healthy_floor
-            )
-            verdict = classify_model(model.sale_price, breakdown.total_cost, healthy_price)
-            profit_per_hour = (
-                breakdown.profit / model.print_time_hours
-                if model.print_time_hours > 0
-                else 0.0
-            )
-
-            results.append({
-                "Model": model.model_name,
-                "URL": model.reference_url or "",
-                "Filament (g)": model.filament_grams,
-                "Time (h)": model.print_time_hours,
-                "Plates": model.plate_count,
-                "Sale ($)": model.sale_price,
-                "Cost ($)": breakdown.total_cost,
-                "Profit ($)": breakdown.profit,
-                "Margin (%)": breakdown.profit_margin_percent,
-                "$/hour": profit_per_hour,
-                "Remote": "✅" if breakdown.remote_friendly else "❌",
-                "Status": verdict,
-            })
-
-    results_df = pd.DataFrame(results)
+        )
+        render_rejects(rejects)
+        render_change_summary(snapshot)
 
     st.markdown("---")
     st.markdown("#### 📈 Step 3: Review Results")
@@ -662,12 +1167,12 @@ def render_portfolio_tab(env_settings: EnvironmentSettings):
     # Portfolio summary metrics
     st.markdown("##### Portfolio Overview")
     
-    total_models = len(results_df)
-    losing = (results_df["Status"] == "Losing money").sum()
-    low_margin = (results_df["Status"] == "Low margin").sum()
-    healthy = (results_df["Status"] == "Healthy").sum()
-    avg_margin = results_df["Margin (%)"].mean()
-    total_profit = results_df["Profit ($)"].sum()
+    total_models = totals.rows
+    losing = totals.status_counts["Losing money"]
+    low_margin = totals.status_counts["Low margin"]
+    healthy = totals.status_counts["Healthy"]
+    avg_margin = totals.average_margin
+    total_profit = totals.total_profit
     
     col1, col2, col3, col4, col5 = st.columns(5)
     col1.metric("Total Models", total_models)
@@ -681,64 +1186,438 @@ def render_portfolio_tab(env_settings: EnvironmentSettings):
     # Status distribution
     if total_models > 0:
         st.markdown("##### Status Distribution")
-        status_counts = results_df["Status"].value_counts()
+        status_counts = pd.Series(
+            {status: count for status, count in totals.status_counts.items() if count}
+        )
         st.bar_chart(status_counts, height=200)
 
     st.markdown("---")
     st.markdown("##### Detailed Results")
-    
-    # Color-code the dataframe
-    def highlight_status(row):
-        color = get_status_color(row["Status"])
-        return [f'background-color: {color}20' if col == "Status" else '' for col in row.index]
-    
-    styled_df = results_df.style.apply(highlight_status, axis=1)
-    st.dataframe(styled_df, use_container_width=True, height=400)
+    col1, col2 = st.columns([2, 1])
+    show_thresholds = col1.toggle(
+        "🧮 Solve price and cost thresholds",
+        key="show_thresholds",
+        help="Add the price for the target margin, the highest filament price and "
+        "labour rate at which each model stays Healthy, and the longest print time "
+        "before it loses money. Also added to the exported report.",
+    )
+    target_margin = col2.number_input(
+        "Target margin (%)",
+        min_value=0.0,
+        max_value=99.0,
+        value=None,
+        placeholder=f"{healthy_floor:g} (healthy)",
+        disabled=not show_thresholds,
+        key="threshold_target_margin",
+    )
+    if show_thresholds:
+        results = solved_results(results, env_settings, healthy_floor, target_margin)
+    render_results_table(results, digest)
 
     # Insights
     with st.expander("💡 Portfolio Insights"):
-        insights = []
-        
+        insights = PortfolioInsights.from_results(results)
+
         if losing > 0:
-            losing_models = results_df[results_df["Status"] == "Losing money"]["Model"].tolist()
-            insights.append(f"⚠️ **{losing} model(s) losing money:** {', '.join(losing_models)}")
-        
+            worst = ", ".join(insights.worst_losing.names)
+            more = losing - len(insights.worst_losing)
+            st.markdown(
+                f"⚠️ **{losing} model(s) losing money:** {worst}"
+                + (f" and {more:,} more" if more > 0 else "")
+            )
+
         if low_margin > 0:
-            insights.append(f"💭 **{low_margin} model(s) have low margins** - consider repricing")
-        
-        best_margin = results_df.loc[results_df["Margin (%)"].idxmax()]
-        insights.append(f"🏆 **Best margin:** {best_margin['Model']} at {best_margin['Margin (%)']:.1f}%")
-        
-        best_hourly = results_df.loc[results_df["$/hour"].idxmax()]
-        insights.append(f"⚡ **Best $/hour:** {best_hourly['Model']} at ${best_hourly['$/hour']:.2f}/hour")
-        
-        remote_count = (results_df["Remote"] == "✅").sum()
-        insights.append(f"🤖 **{remote_count}/{total_models} models** can run remotely")
-        
-        for insight in insights:
-            st.markdown(insight)
+            st.markdown(f"💭 **{low_margin} model(s) have low margins** - consider repricing")
+
+        if len(insights.best_margin):
+            name, value = insights.best_margin.items()[0]
+            st.markdown(f"🏆 **Best margin:** {name} at {value:.1f}%")
+
+        if len(insights.best_hourly):
+            name, value = insights.best_hourly.items()[0]
+            st.markdown(f"⚡ **Best $/hour:** {name} at ${value:.2f}/hour")
+
+        st.markdown(f"🤖 **{insights.remote_count}/{total_models} models** can run remotely")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("**Top margins**")
+            st.dataframe(ranking_frame(insights.best_margin, "Margin (%)"), hide_index=True)
+            st.markdown("**Top $/hour**")
+            st.dataframe(ranking_frame(insights.best_hourly, "$/hour"), hide_index=True)
+            st.markdown("**By status**")
+            st.dataframe(insights.status_frame(), hide_index=True)
+        with col2:
+            st.markdown("**Bottom margins**")
+            st.dataframe(ranking_frame(insights.worst_margin, "Margin (%)"), hide_index=True)
+            st.markdown("**By plate count**")
+            st.dataframe(insights.by_plates.to_frame("Plates"), hide_index=True)
+            st.markdown("**By remote-friendliness**")
+            st.dataframe(
+                insights.by_remote.to_frame("Remote", {0: "❌", 1: "✅"}), hide_index=True
+            )
+
+    render_uncertainty_section(uploaded, digest, env_settings, healthy_floor)
 
     # Export
     st.markdown("---")
     st.markdown("#### 💾 Step 4: Export Report")
     
-    # Prepare detailed export
-    export_df = pd.DataFrame(results)
-    csv_bytes = export_df.to_csv(index=False).encode("utf-8")
-    
     col1, col2 = st.columns([2, 1])
+    with col1:
+        export_format = st.radio(
+            "Format",
+            ["csv", "parquet", "feather", "xlsx"],
+            format_func=str.upper,
+            horizontal=True,
+            key="export_format",
+        )
     with col2:
         st.download_button(
-            "📥 Download Full Report (CSV)",
-            data=csv_bytes,
-            file_name="portfolio_cost_report.csv",
-            mime="text/csv",
+            f"📥 Download Full Report ({export_format.upper()})",
+            data=lambda: export_report(results, export_format),
+            file_name=f"portfolio_cost_report.{export_format}",
+            mime=FORMAT_MIME_TYPES[export_format],
             use_container_width=True,
         )
 
 
+# ---------------------------------------------------------------------
+# Sensitivity tab
+# ---------------------------------------------------------------------
+SWEEP_FIELD_LABELS = {
+    "filament_price_per_kg": "Filament price ($/kg)",
+    "electricity_price_per_kwh": "Electricity rate ($/kWh)",
+    "printer_power_watts": "Printer power (W)",
+    "labour_rate_per_hour": "Labour rate ($/hour)",
+    "prep_time_minutes": "Prep time (min)",
+    "cleanup_time_minutes": "Cleanup time (min)",
+    "plate_change_time_minutes": "Plate change time (min)",
+    "remote_check_minutes_per_hour": "Remote monitoring (min/hour)",
+    "automated_plate_capacity": "Automation capacity (plates)",
+}
+
+SWEEP_METRICS = {
+    "Total profit ($)": "total_profit",
+    "Average margin (%)": "average_margin",
+    "Losing money (models)": "losing_count",
+    "Low margin (models)": "low_margin_count",
+    "Healthy (models)": "healthy_count",
+    "Profitable (models)": "profitable_count",
+}
+
+
+def sweep_range_inputs(field_name: str, current: float, key: str) -> np.ndarray:
+    """Min/max/steps inputs for one swept setting."""
+    upper_default = float(current) * 2 if current else 1.0
+    col1, col2, col3 = st.columns(3)
+    low = col1.number_input(
+        "Min", min_value=0.0, value=float(current) / 2, key=f"{key}_min"
+    )
+    high = col2.number_input(
+        "Max", min_value=0.0, value=upper_default, key=f"{key}_max"
+    )
+    steps = col3.number_input(
+        "Steps", min_value=2, max_value=200, value=25, key=f"{key}_steps"
+    )
+    values = np.linspace(low, high, int(steps))
+    if field_name == "automated_plate_capacity":
+        values = np.unique(np.maximum(np.round(values), 1))
+    return values
+
+
+@timed_fragment("Sensitivity")
+def render_sensitivity_tab(env_settings: EnvironmentSettings):
+    """Render profit/status heatmaps over a grid of two settings."""
+
+    st.markdown("### 🌡️ Sensitivity Analysis")
+    st.caption(
+        "See how the uploaded portfolio responds when two settings vary together. "
+        "Other settings keep their sidebar values."
+    )
+
+    uploaded = st.session_state.get("portfolio_upload")
+    if uploaded is None:
+        st.info("👈 Upload a portfolio in the **Portfolio Analysis** tab first")
+        return
+
+    parsed = uploaded_quantities(uploaded, upload_digest(uploaded), env_settings)
+    if parsed is None:
+        return
+    _, quantities = parsed
+
+    fields = list(SWEEP_FIELD_LABELS)
+    col1, col2 = st.columns(2)
+    with col1:
+        x_field = st.selectbox(
+            "X axis", fields, index=0, format_func=SWEEP_FIELD_LABELS.get, key="sweep_x_field"
+        )
+        x_values = sweep_range_inputs(x_field, getattr(env_settings, x_field), "sweep_x")
+    with col2:
+        y_field = st.selectbox(
+            "Y axis", fields, index=1, format_func=SWEEP_FIELD_LABELS.get, key="sweep_y_field"
+        )
+        y_values = sweep_range_inputs(y_field, getattr(env_settings, y_field), "sweep_y")
+
+    if x_field == y_field:
+        st.warning("Pick two different settings to sweep")
+        return
+
+    metric_label = st.selectbox("Metric", list(SWEEP_METRICS), key="sweep_metric")
+    healthy_floor = float(st.session_state["healthy_margin_floor_percent"])
+
+    sweep_key = (
+        upload_digest(uploaded),
+        astuple(env_settings),
+        healthy_floor,
+        x_field,
+        tuple(x_values),
+        y_field,
+        tuple(y_values),
+    )
+    cached = st.session_state.get("sweep_result")
+    if cached is None or cached[0] != sweep_key:
+        with st.spinner(f"Evaluating {len(x_values) * len(y_values):,} scenarios..."):
+            start = time.perf_counter()
+            result = sweep(
+                env_settings,
+                quantities.with_plate_policy(env_settings),
+                {x_field: x_values, y_field: y_values},
+                healthy_floor,
+            )
+            elapsed = time.perf_counter() - start
+        st.session_state["sweep_result"] = (sweep_key, result, elapsed)
+    else:
+        _, result, elapsed = cached
+
+    surface = result.to_frame()
+    metric = SWEEP_METRICS[metric_label]
+    chart = alt.Chart(surface).mark_rect().encode(
+        x=alt.X(
+            f"{x_field}:O",
+            title=SWEEP_FIELD_LABELS[x_field],
+            axis=alt.Axis(format=".3~f"),
+        ),
+        y=alt.Y(
+            f"{y_field}:O",
+            title=SWEEP_FIELD_LABELS[y_field],
+            axis=alt.Axis(format=".3~f"),
+            sort="descending",
+        ),
+        color=alt.Color(f"{metric}:Q", title=metric_label),
+        tooltip=[x_field, y_field, metric],
+    )
+    st.altair_chart(chart, use_container_width=True)
+    st.caption(
+        f"{len(surface):,} scenarios × {len(quantities):,} models in {elapsed:.2f}s"
+    )
+
+    st.download_button(
+        "📥 Download Sweep (CSV)",
+        data=surface.to_csv(index=False).encode("utf-8"),
+        file_name="sensitivity_sweep.csv",
+        mime="text/csv",
+    )
+
+
+# ---------------------------------------------------------------------
+# Fleet tab
+# ---------------------------------------------------------------------
+FLEET_PREVIEW_ROWS = 1_000
+
+
+def default_fleet_profiles(env_settings: EnvironmentSettings) -> pd.DataFrame:
+    """Starting profile table: the sidebar settings plus an automated variant."""
+    current = {
+        **asdict(env_settings),
+        "healthy_margin_floor_percent": float(
+            st.session_state["healthy_margin_floor_percent"]
+        ),
+    }
+    automated = {**current, "has_automation": True}
+    return pd.DataFrame(
+        [{"profile": "Sidebar", **current}, {"profile": "Automated", **automated}]
+    )
+
+
+def fleet_profiles_from_table(table: pd.DataFrame) -> dict | None:
+    """Named profiles from the edited table, reporting bad rows inline."""
+    profiles = {}
+    for row in table.dropna(subset=["profile"]).to_dict("records"):
+        name = str(row.pop("profile")).strip()
+        if not name:
+            continue
+        if name in profiles:
+            st.error(f"❌ Profile names must be unique: {name}")
+            return None
+        if any(pd.isna(value) for value in row.values()):
+            st.error(f"❌ Profile {name} has empty settings")
+            return None
+        row["has_automation"] = bool(row["has_automation"])
+        row["automated_plate_capacity"] = int(row["automated_plate_capacity"])
+        profiles[name] = environment_from_settings(row)
+    if not profiles:
+        st.info("Add at least one profile")
+        return None
+    return profiles
+
+
+@timed_fragment("Fleet")
+def render_fleet_tab(env_settings: EnvironmentSettings):
+    """Render the best printer/site profile for every model."""
+
+    st.markdown("### 🏭 Fleet")
+    st.caption(
+        "Define printers and sites as named profiles; every model is costed on "
+        "every profile and assigned to the cheapest one."
+    )
+
+    uploaded = st.session_state.get("portfolio_upload")
+    if uploaded is None:
+        st.info("👈 Upload a portfolio in the **Portfolio Analysis** tab first")
+        return
+
+    parsed = uploaded_quantities(uploaded, upload_digest(uploaded), env_settings)
+    if parsed is None:
+        return
+    df, quantities = parsed
+
+    if "fleet_profiles" not in st.session_state:
+        st.session_state["fleet_profiles"] = default_fleet_profiles(env_settings)
+    table = st.data_editor(
+        st.session_state["fleet_profiles"],
+        num_rows="dynamic",
+        use_container_width=True,
+        hide_index=True,
+        key="fleet_profile_editor",
+    )
+    profiles = fleet_profiles_from_table(table)
+    if profiles is None:
+        return
+
+    fleet_key = (
+        upload_digest(uploaded),
+        tuple((name, astuple(env), floor) for name, (env, floor) in profiles.items()),
+    )
+    cached = st.session_state.get("fleet_result")
+    if cached is None or cached[0] != fleet_key:
+        start = time.perf_counter()
+        result = evaluate_fleet(profiles, quantities)
+        totals = result.totals()
+        elapsed = time.perf_counter() - start
+        st.session_state["fleet_result"] = (fleet_key, result, totals, elapsed)
+    else:
+        _, result, totals, elapsed = cached
+
+    col1, col2 = st.columns(2)
+    col1.metric("Profit with best assignment", f"${totals.best_total_profit:,.2f}")
+    best_single = int(np.argmax(totals.total_profit))
+    col2.metric(
+        f"Best single profile ({totals.profile_names[best_single]})",
+        f"${totals.total_profit[best_single]:,.2f}",
+    )
+
+    summary = totals.to_frame()
+    st.dataframe(summary, use_container_width=True, hide_index=True)
+    st.bar_chart(summary.set_index("Profile")["Best for (models)"], height=200)
+
+    assignments = result.to_frame(df["model_name"].astype(str), matrix=True)
+    st.markdown("##### Best profile per model")
+    st.dataframe(
+        assignments.head(FLEET_PREVIEW_ROWS), use_container_width=True, hide_index=True
+    )
+    st.caption(
+        f"{len(profiles)} profiles × {len(result):,} models in {elapsed:.2f}s"
+        + (f" · showing the first {FLEET_PREVIEW_ROWS:,}" if len(result) > FLEET_PREVIEW_ROWS else "")
+    )
+    st.download_button(
+        "📥 Download Assignments (CSV)",
+        data=report_bytes(assignments, "csv"),
+        file_name="fleet_assignments.csv",
+        mime="text/csv",
+    )
+
+    render_farm_schedule(df, quantities, env_settings, upload_digest(uploaded))
+
+
+def render_farm_schedule(
+    df: pd.DataFrame,
+    quantities: CostQuantities,
+    env_settings: EnvironmentSettings,
+    digest: str,
+):
+    """Queue every model once on a farm of sidebar-configured printers."""
+    st.markdown("---")
+    st.markdown("##### 🗓️ Farm schedule")
+    st.caption(
+        "Spread the portfolio over identical printers with the sidebar settings. "
+        "Operators reload a printer's plate stacker only while on shift, so "
+        "plates from consecutive jobs share visits."
+    )
+    col1, col2, col3 = st.columns(3)
+    printers = col1.number_input("Printers", min_value=1, value=10, step=1, key="farm_printers")
+    shift_hours = col2.slider(
+        "Operator hours per day", 1.0, 24.0, 24.0, 0.5, key="farm_shift_hours"
+    )
+    horizon = col3.number_input(
+        "Horizon (h)", min_value=0.0, value=None, placeholder="None", key="farm_horizon"
+    )
+    config = FarmConfig(
+        printers=int(printers), shift_hours=float(shift_hours), horizon_hours=horizon
+    )
+    farm_key = (digest, astuple(env_settings), astuple(config))
+    cached = st.session_state.get("farm_schedule")
+    if cached is None or cached[0] != farm_key:
+        if not st.button("Schedule", key="farm_run"):
+            return
+        with st.spinner("Scheduling..."):
+            schedule = schedule_farm(env_settings, quantities, config)
+        st.session_state["farm_schedule"] = (farm_key, schedule)
+    else:
+        _, schedule = cached
+
+    totals = schedule.summary()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric(
+        "Makespan",
+        f"{totals['makespan_hours']:,.1f} h",
+        help=f"Lower bound: {totals['lower_bound_hours']:,.1f} h",
+    )
+    saved_changes = totals["naive_plate_changes"] - totals["plate_changes"]
+    col2.metric(
+        "Plate changes",
+        f"{totals['plate_changes']:,}",
+        f"-{saved_changes:,} vs per job" if saved_changes else None,
+        delta_color="inverse",
+    )
+    col3.metric(
+        "Labour",
+        f"${totals['labour_cost']:,.2f}",
+        f"-${totals['labour_saving']:,.2f} vs per job" if saved_changes else None,
+        delta_color="inverse",
+    )
+    col4.metric("Waiting for operator", f"{totals['idle_hours']:,.1f} h")
+    if config.horizon_hours is not None:
+        st.caption(f"{totals['late_jobs']:,} jobs still printing after {horizon:g} h")
+
+    printer_table = schedule.printer_frame()
+    st.bar_chart(printer_table.set_index("Printer")["Busy until (h)"], height=200)
+    st.dataframe(printer_table, use_container_width=True, hide_index=True)
+    jobs = schedule.to_frame(df["model_name"].astype(str))
+    st.caption(
+        f"{totals['jobs']:,} jobs on {totals['printers']} printers in {totals['seconds']:.2f}s"
+    )
+    st.download_button(
+        "📥 Download Schedule (CSV)",
+        data=report_bytes(jobs, "csv"),
+        file_name="farm_schedule.csv",
+        mime="text/csv",
+    )
+
+
 def main():
     """Main application entry point."""
+    start = time.perf_counter()
     init_session_defaults()
     env_settings = sidebar_env_settings()
 
@@ -752,18 +1631,29 @@ def main():
     st.markdown("---")
 
     # Tabs
-    tab_single, tab_portfolio = st.tabs(["📋 Single Model", "📊 Portfolio Analysis"])
+    tab_single, tab_portfolio, tab_sensitivity, tab_fleet = st.tabs(
+        ["📋 Single Model", "📊 Portfolio Analysis", "🌡️ Sensitivity", "🏭 Fleet"]
+    )
 
     with tab_single:
         render_single_model_tab(env_settings)
 
     with tab_portfolio:
         render_portfolio_tab(env_settings)
+
+    with tab_sensitivity:
+        render_sensitivity_tab(env_settings)
+
+    with tab_fleet:
+        render_fleet_tab(env_settings)
     
     # Footer
     st.markdown("---")
     st.caption("💡 Tip: Adjust settings in the sidebar to match your specific costs and workflow.")
 
+    record_rerun("Full app", start)
+    render_timings_panel()
+
 
 if __name__ == "__main__":
     main()
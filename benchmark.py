@@ -0,0 +1,338 @@
+# benchmark.py - Timing suite over synthetic portfolios
+
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from cost_model import (
+    DEFAULT_SETTINGS,
+    EnvironmentSettings,
+    ModelInput,
+    calculate_break_even_and_health,
+    calculate_costs,
+    calculate_costs_batch,
+    classify_batch,
+    classify_model,
+)
+from portfolio import (
+    PortfolioInsights,
+    PortfolioResults,
+    iter_portfolio_chunks,
+    write_report,
+)
+
+
+BENCHMARK_SIZES = {
+    "1k": 1_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+}
+DEFAULT_SIZES = ("1k", "100k", "1m")
+
+STAGES = (
+    "csv_ingest",
+    "parquet_ingest",
+    "scalar",
+    "batch",
+    "classify",
+    "aggregate",
+    "export",
+)
+
+# The scalar loop is timed on at most this many rows and reported per row
+SCALAR_MAX_ROWS = 100_000
+
+# A stage regresses when it is this much slower than the baseline
+DEFAULT_THRESHOLD = 0.10
+
+
+def generate_portfolio(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic portfolio with realistic, reproducible columns.
+
+    Filament weight is lognormal (median ~90 g, long tail of big prints),
+    print time follows weight at roughly 12-25 g/h, most models fit on one
+    plate and sale prices are a noisy markup over a typical cost, so every
+    status band is represented.
+    """
+    rng = np.random.default_rng(seed)
+    filament_grams = np.clip(rng.lognormal(np.log(90.0), 0.9, rows), 2.0, 3_000.0)
+    grams_per_hour = rng.uniform(12.0, 25.0, rows)
+    print_time_hours = np.clip(
+        filament_grams / grams_per_hour * rng.lognormal(0.0, 0.2, rows), 0.1, 200.0
+    )
+    plate_count = np.minimum(rng.geometric(0.65, rows), 12)
+    typical_cost = (
+        filament_grams * 0.025
+        + print_time_hours * 0.08
+        + plate_count * 2.5
+        + 10.0
+    )
+    sale_price = typical_cost * rng.lognormal(np.log(1.4), 0.35, rows)
+    target_margin = np.where(rng.random(rows) < 0.3, rng.choice([20.0, 30.0, 40.0], rows), np.nan)
+
+    return pd.DataFrame({
+        "model_name": [f"Model {i:08d}" for i in range(rows)],
+        "reference_url": "",
+        "filament_grams": filament_grams.round(1),
+        "print_time_hours": print_time_hours.round(2),
+        "plate_count": plate_count,
+        "sale_price": sale_price.round(2),
+        "target_margin_percent": target_margin,
+    })
+
+
+@dataclass
+class BenchmarkTiming:
+    size: str
+    stage: str
+    rows: int
+    seconds: list[float]
+
+    @property
+    def best(self) -> float:
+        return min(self.seconds)
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.seconds)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.best if self.best > 0 else float("inf")
+
+    def to_dict(self) -> dict:
+        return {
+            **asdict(self),
+            "best": self.best,
+            "median": self.median,
+            "rows_per_second": self.rows_per_second,
+        }
+
+
+@dataclass
+class BenchmarkReport:
+    timings: list[BenchmarkTiming]
+    metadata: dict = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {
+            "metadata": self.metadata,
+            "timings": [timing.to_dict() for timing in self.timings],
+        }
+
+    def save(self, path) -> None:
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(self.to_dict(), fh, indent=2)
+            fh.write("\n")
+
+    @classmethod
+    def load(cls, path) -> "BenchmarkReport":
+        with open(path, encoding="utf-8") as fh:
+            data = json.load(fh)
+        timings = [
+            BenchmarkTiming(t["size"], t["stage"], t["rows"], t["seconds"])
+            for t in data["timings"]
+        ]
+        return cls(timings=timings, metadata=data.get("metadata", {}))
+
+
+def _time(func, repeat: int) -> list[float]:
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def _scalar_loop(env: EnvironmentSettings, df: pd.DataFrame, healthy_floor: float) -> list[str]:
+    statuses = []
+    for row in df.itertuples(index=False):
+        target = row.target_margin_percent
+        model = ModelInput(
+            model_name=row.model_name,
+            reference_url=row.reference_url,
+            filament_grams=row.filament_grams,
+            print_time_hours=row.print_time_hours,
+            plate_count=row.plate_count,
+            sale_price=row.sale_price,
+            target_margin_percent=None if target != target else target,
+        )
+        breakdown = calculate_costs(env, model)
+        _, healthy_price = calculate_break_even_and_health(breakdown.total_cost, healthy_floor)
+        statuses.append(classify_model(model.sale_price, breakdown.total_cost, healthy_price))
+    return statuses
+
+
+def benchmark_size(
+    label: str,
+    rows: int,
+    env: EnvironmentSettings,
+    healthy_floor: float,
+    repeat: int = 3,
+    seed: int = 0,
+    workdir: str | None = None,
+) -> list[BenchmarkTiming]:
+    """Time each pipeline stage on one synthetic portfolio size.
+
+    Each stage runs ``repeat`` times on the output of the previous stage,
+    so the numbers isolate that stage rather than the whole pipeline.
+    """
+    df = generate_portfolio(rows, seed)
+    timings = []
+
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        csv_path = os.path.join(tmp, "portfolio.csv")
+        parquet_path = os.path.join(tmp, "portfolio.parquet")
+        report_path = os.path.join(tmp, "report.csv")
+        df.to_csv(csv_path, index=False)
+        df.to_parquet(parquet_path, index=False)
+
+        for stage, path in (("csv_ingest", csv_path), ("parquet_ingest", parquet_path)):
+            def ingest(path=path):
+                for _ in iter_portfolio_chunks(path):
+                    pass
+
+            timings.append(BenchmarkTiming(label, stage, rows, _time(ingest, repeat)))
+
+        scalar_df = df.iloc[:SCALAR_MAX_ROWS]
+        timings.append(BenchmarkTiming(
+            label,
+            "scalar",
+            len(scalar_df),
+            _time(lambda: _scalar_loop(env, scalar_df, healthy_floor), repeat),
+        ))
+
+        timings.append(BenchmarkTiming(
+            label, "batch", rows, _time(lambda: calculate_costs_batch(env, df), repeat)
+        ))
+        breakdown = calculate_costs_batch(env, df)
+
+        sale_price = df["sale_price"].to_numpy(dtype=np.float64)
+        timings.append(BenchmarkTiming(
+            label,
+            "classify",
+            rows,
+            _time(lambda: classify_batch(sale_price, breakdown.total_cost, healthy_floor), repeat),
+        ))
+        results = PortfolioResults.classify(df, breakdown, healthy_floor)
+
+        timings.append(BenchmarkTiming(
+            label,
+            "aggregate",
+            rows,
+            _time(lambda: PortfolioInsights.from_results(results), repeat),
+        ))
+
+        timings.append(BenchmarkTiming(
+            label, "export", rows, _time(lambda: write_report(results, report_path), repeat)
+        ))
+
+    return timings
+
+
+def run_benchmarks(
+    sizes=DEFAULT_SIZES,
+    repeat: int = 3,
+    seed: int = 0,
+    env: EnvironmentSettings | None = None,
+    healthy_floor: float | None = None,
+    progress=None,
+) -> BenchmarkReport:
+    """Run every stage for each size label in ``sizes`` (keys of ``BENCHMARK_SIZES``)."""
+    unknown = [size for size in sizes if size not in BENCHMARK_SIZES]
+    if unknown:
+        raise ValueError(f"Unknown benchmark sizes: {', '.join(unknown)}")
+    if env is None:
+        env = EnvironmentSettings(**{
+            k: v for k, v in DEFAULT_SETTINGS.items() if k != "healthy_margin_floor_percent"
+        })
+    if healthy_floor is None:
+        healthy_floor = DEFAULT_SETTINGS["healthy_margin_floor_percent"]
+
+    timings = []
+    for size in sizes:
+        size_timings = benchmark_size(
+            size, BENCHMARK_SIZES[size], env, healthy_floor, repeat=repeat, seed=seed
+        )
+        timings.extend(size_timings)
+        if progress is not None:
+            for timing in size_timings:
+                progress(timing)
+
+    metadata = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "repeat": repeat,
+        "seed": seed,
+    }
+    return BenchmarkReport(timings=timings, metadata=metadata)
+
+
+@dataclass
+class StageComparison:
+    size: str
+    stage: str
+    baseline: float
+    current: float
+
+    @property
+    def change(self) -> float:
+        """Relative change in per-row time (positive = slower)."""
+        return self.current / self.baseline - 1.0 if self.baseline > 0 else 0.0
+
+
+def compare_reports(
+    baseline: BenchmarkReport, current: BenchmarkReport
+) -> list[StageComparison]:
+    """Pair up stages present in both reports, compared on best time per row.
+
+    Per-row time keeps the comparison valid if ``SCALAR_MAX_ROWS`` changes
+    between runs.
+    """
+    baseline_by_key = {(t.size, t.stage): t for t in baseline.timings}
+    comparisons = []
+    for timing in current.timings:
+        reference = baseline_by_key.get((timing.size, timing.stage))
+        if reference is None:
+            continue
+        comparisons.append(StageComparison(
+            timing.size,
+            timing.stage,
+            baseline=reference.best / max(reference.rows, 1),
+            current=timing.best / max(timing.rows, 1),
+        ))
+    return comparisons
+
+
+def format_comparison(
+    comparisons: list[StageComparison], threshold: float = DEFAULT_THRESHOLD
+) -> str:
+    lines = [f"{'size':<6} {'stage':<11} {'baseline':>12} {'current':>12} {'change':>8}"]
+    for c in comparisons:
+        flag = "  REGRESSION" if c.change > threshold else ""
+        lines.append(
+            f"{c.size:<6} {c.stage:<11} {c.baseline * 1e9:>10.1f}ns "
+            f"{c.current * 1e9:>10.1f}ns {c.change:>+8.1%}{flag}"
+        )
+    return "\n".join(lines)
+
+
+def format_timing(timing: BenchmarkTiming) -> str:
+    return (
+        f"{timing.size:<6} {timing.stage:<11} {timing.rows:>11,} rows "
+        f"best {timing.best * 1000:>10.2f} ms  {timing.rows_per_second:>14,.0f} rows/sec"
+    )
@@ -0,0 +1,447 @@
+# catalog_index.py - In-memory index over evaluated results for range and name queries
+
+import bisect
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from cost_model import STATUS_LABELS
+
+# Report columns that can be range-queried, by their short query names
+RANGE_FIELDS = {
+    "filament": "Filament (g)",
+    "time": "Time (h)",
+    "plates": "Plates",
+    "sale": "Sale ($)",
+    "cost": "Cost ($)",
+    "profit": "Profit ($)",
+    "margin": "Margin (%)",
+    "per_hour": "$/hour",
+}
+RANGE_COLUMNS = tuple(RANGE_FIELDS.values())
+
+_MAX_CODE_POINT = 0x10FFFF
+# Characters renumbered per block while building the trigram postings
+_BUILD_BLOCK = 1 << 22
+# Candidate rows below which names are checked instead of intersecting postings
+_CHECK_ROWS = 2_048
+_CONDITION = re.compile(r"^\s*(\w+)\s*(<=|>=|<|>|=)\s*(\S+)\s*$")
+
+
+@dataclass(frozen=True)
+class Range:
+    """Bounds on one report column; ``None`` leaves that side open.
+
+    Rows without a value never match a range.
+    """
+    column: str
+    low: float | None = None
+    high: float | None = None
+    include_low: bool = True
+    include_high: bool = True
+
+    def mask(self, values: np.ndarray) -> np.ndarray:
+        keep = ~np.isnan(values)
+        if self.low is not None:
+            keep &= values >= self.low if self.include_low else values > self.low
+        if self.high is not None:
+            keep &= values <= self.high if self.include_high else values < self.high
+        return keep
+
+
+def parse_condition(text: str) -> Range:
+    """A ``Range`` from ``margin>=5``, ``plates>2``, ``cost=10:20`` or ``plates=3``.
+
+    Field names are the keys of ``RANGE_FIELDS``; ``=lo:hi`` is an
+    inclusive range and either side may be left empty.
+    """
+    match = _CONDITION.match(text)
+    if match is None or match.group(1).lower() not in RANGE_FIELDS:
+        raise ValueError(
+            f"Cannot read condition {text!r}; use FIELD<op>VALUE with FIELD one of "
+            f"{', '.join(RANGE_FIELDS)} and op one of <, <=, >, >=, ="
+        )
+    name, op, value = match.groups()
+    column = RANGE_FIELDS[name.lower()]
+    try:
+        if op == "=" and ":" in value:
+            low, high = (float(v) if v else None for v in value.split(":", 1))
+            return Range(column, low, high)
+        number = float(value)
+    except ValueError:
+        raise ValueError(f"Cannot read {value!r} in {text!r} as a number") from None
+    if op == "=":
+        return Range(column, number, number)
+    if op.startswith(">"):
+        return Range(column, low=number, include_low=op == ">=")
+    return Range(column, high=number, include_high=op == "<=")
+
+
+@dataclass(frozen=True)
+class CatalogQuery:
+    """Conditions that every matching model meets.
+
+    Queries are immutable; ``where``, ``starting_with``, ``containing`` and
+    ``with_status`` return a narrower copy and ``a & b`` matches what both
+    match. Name conditions ignore case. ``statuses`` of ``None`` allows any.
+    """
+    ranges: tuple[Range, ...] = ()
+    prefixes: tuple[str, ...] = ()
+    substrings: tuple[str, ...] = ()
+    statuses: frozenset[str] | None = None
+
+    def where(self, column: str, low=None, high=None, **bounds) -> "CatalogQuery":
+        column = RANGE_FIELDS.get(column, column)
+        if column not in RANGE_COLUMNS:
+            raise KeyError(column)
+        return self & CatalogQuery(ranges=(Range(column, low, high, **bounds),))
+
+    def starting_with(self, prefix: str) -> "CatalogQuery":
+        return self & CatalogQuery(prefixes=(prefix.lower(),))
+
+    def containing(self, text: str) -> "CatalogQuery":
+        return self & CatalogQuery(substrings=(text.lower(),))
+
+    def with_status(self, *statuses: str) -> "CatalogQuery":
+        unknown = set(statuses) - set(STATUS_LABELS)
+        if unknown:
+            raise ValueError(f"Unknown status: {', '.join(sorted(unknown))}")
+        return self & CatalogQuery(statuses=frozenset(statuses))
+
+    def __and__(self, other: "CatalogQuery") -> "CatalogQuery":
+        if self.statuses is None or other.statuses is None:
+            statuses = other.statuses if self.statuses is None else self.statuses
+        else:
+            statuses = self.statuses & other.statuses
+        return CatalogQuery(
+            ranges=self.ranges + other.ranges,
+            prefixes=tuple(p for p in self.prefixes + other.prefixes if p),
+            substrings=tuple(s for s in self.substrings + other.substrings if s),
+            statuses=statuses,
+        )
+
+    @property
+    def status_codes(self) -> list[int] | None:
+        if self.statuses is None:
+            return None
+        return sorted(STATUS_LABELS.index(status) for status in self.statuses)
+
+    def mask(self, results) -> np.ndarray:
+        """Matching rows of ``results`` found by scanning every row."""
+        keep = np.ones(len(results), dtype=bool)
+        for condition in self.ranges:
+            keep &= condition.mask(results.report_column(condition.column).astype(np.float64))
+        if self.statuses is not None:
+            keep &= np.isin(results.status_codes, self.status_codes)
+        if self.prefixes or self.substrings:
+            keep &= _name_mask(_lower_names(results.model_names), self)
+        return keep
+
+
+def _lower_names(names: np.ndarray) -> np.ndarray:
+    # Object array: a fixed-width one would pad every name to the longest
+    return pd.Series(names, dtype=str).str.lower().to_numpy(dtype=object)
+
+
+def _starting_with(names: np.ndarray, prefix: str) -> np.ndarray:
+    return np.fromiter((name.startswith(prefix) for name in names), bool, len(names))
+
+
+def _containing(names: np.ndarray, text: str) -> np.ndarray:
+    return np.fromiter((text in name for name in names), bool, len(names))
+
+
+def _name_mask(names: np.ndarray, query: CatalogQuery) -> np.ndarray:
+    """Which of the lower-cased ``names`` meet the query's name conditions."""
+    keep = np.ones(len(names), dtype=bool)
+    for prefix in query.prefixes:
+        keep &= _starting_with(names, prefix)
+    for text in query.substrings:
+        keep &= _containing(names, text)
+    return keep
+
+
+def _code_points(names: np.ndarray) -> np.ndarray:
+    """Code points of ``names`` back to back, each followed by two 0s."""
+    text = "\0\0".join(names) + "\0\0"
+    return np.frombuffer(text.encode("utf-32-le", "surrogatepass"), dtype=np.uint32)
+
+
+class NameIndex:
+    """Prefix and substring lookups on model names, ignoring case.
+
+    Prefixes are found by bisecting the sorted names. For substrings every
+    three-character run of every name maps to the ascending rows holding
+    it, so a query only visits rows that hold all of its trigrams. Names
+    are padded with two characters so that a query of one or two
+    characters reads the contiguous run of trigrams starting with it.
+
+    Characters are renumbered densely so that a trigram and its row pack
+    into one int64 and the postings are built with a single plain sort.
+    """
+
+    def __init__(self, names: np.ndarray):
+        self.names = _lower_names(names)
+        self.order = np.argsort(self.names, kind="stable")
+        self.sorted_names = self.names[self.order].tolist()
+        self._build_alphabet()
+        self._build_postings()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _blocks(self):
+        """``(first row, code points, name lengths)`` of up to ``_BUILD_BLOCK`` characters."""
+        lengths = np.fromiter(map(len, self.names), np.int64, len(self.names))
+        ends = np.cumsum(lengths + 2)
+        start = 0
+        while start < len(self.names):
+            offset = ends[start - 1] if start else 0
+            stop = max(int(np.searchsorted(ends, offset + _BUILD_BLOCK, side="right")), start + 1)
+            yield start, _code_points(self.names[start:stop]), lengths[start:stop]
+            start = stop
+
+    def _build_alphabet(self) -> None:
+        present = np.zeros(_MAX_CODE_POINT + 1, dtype=bool)
+        for _, points, _ in self._blocks():
+            present[points] = True
+        # 0 pads; characters that no name holds map to it too
+        present[0] = False
+        self.char_ids = np.zeros(_MAX_CODE_POINT + 1, dtype=np.int64)
+        self.char_ids[present] = np.arange(1, 1 + int(present.sum()))
+        self.alphabet = 1 + int(present.sum())
+
+    def _build_postings(self) -> None:
+        size = self.alphabet
+        row_bits = max(len(self.names) - 1, 1).bit_length()
+        fits = size ** 3 < 1 << (63 - row_bits)
+        packed, rows = [], []
+        for start, points, lengths in self._blocks():
+            chars = self.char_ids[points]
+            grams = (chars[:-2] * size + chars[1:-1]) * size + chars[2:]
+            present = chars[:-2] != 0
+            grams = grams[present]
+            row = np.repeat(np.arange(start, start + len(lengths)), lengths + 2)[:-2][present]
+            if fits:
+                packed.append(grams << row_bits | row)
+            else:
+                packed.append(grams)
+                rows.append(row)
+        if not packed:
+            codes, postings = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        elif fits:
+            codes = np.concatenate(packed)
+            codes.sort()
+            # A trigram seen twice in one name is listed once
+            codes = codes[np.r_[True, codes[1:] != codes[:-1]]]
+            postings = codes & ((1 << row_bits) - 1)
+            codes >>= row_bits
+        else:
+            # Very large alphabets: sort the rows along with their trigrams
+            codes = np.concatenate(packed)
+            order = np.argsort(codes, kind="stable")
+            codes, postings = codes[order], np.concatenate(rows)[order]
+            keep = np.r_[True, (codes[1:] != codes[:-1]) | (postings[1:] != postings[:-1])]
+            codes, postings = codes[keep], postings[keep]
+        self.postings = postings.astype(np.int32 if len(self.names) < 1 << 31 else np.int64)
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else []
+        self.trigrams = codes[starts]
+        self.offsets = np.r_[starts, len(codes)].astype(np.int64)
+
+    def prefix_bounds(self, prefix: str) -> tuple[int, int]:
+        """Positions in ``sorted_names`` of the names starting with ``prefix``."""
+        low = bisect.bisect_left(self.sorted_names, prefix)
+        high = bisect.bisect_left(self.sorted_names, prefix + "\U0010ffff", low)
+        return low, high
+
+    def starting_with(self, prefix: str) -> np.ndarray:
+        """Rows whose name starts with ``prefix``, in name order."""
+        low, high = self.prefix_bounds(prefix)
+        return self.order[low:high]
+
+    def _posting_runs(self, text: str) -> list[tuple[int, int]]:
+        """Ranges of ``postings`` whose rows, intersected, may hold ``text``.
+
+        For texts of one or two characters there is a single range whose
+        rows, united, hold it exactly.
+        """
+        points = np.array([min(ord(c), _MAX_CODE_POINT) for c in text], dtype=np.int64)
+        chars = self.char_ids[points]
+        if (chars == 0).any():
+            return [(0, 0)]
+        size = self.alphabet
+        if len(chars) < 3:
+            low = 0
+            for char in chars:
+                low = low * size + int(char)
+            span = size ** (3 - len(chars))
+            first, last = np.searchsorted(self.trigrams, [low * span, (low + 1) * span])
+            return [(int(self.offsets[first]), int(self.offsets[last]))]
+        grams = np.unique((chars[:-2] * size + chars[1:-1]) * size + chars[2:])
+        found = np.searchsorted(self.trigrams, grams)
+        if (found == len(self.trigrams)).any() or (self.trigrams[found] != grams).any():
+            return [(0, 0)]
+        return [(int(self.offsets[i]), int(self.offsets[i + 1])) for i in found]
+
+    def estimate(self, text: str) -> int:
+        """An upper bound on the rows holding ``text``, without reading them."""
+        return min(stop - start for start, stop in self._posting_runs(text))
+
+    def containing(self, text: str) -> np.ndarray:
+        """Ascending rows whose name contains ``text``."""
+        runs = self._posting_runs(text)
+        if len(text) < 3:
+            start, stop = runs[0]
+            if stop - start < len(self) // 16:
+                return np.unique(self.postings[start:stop])
+            # Large runs: mark rows instead of sorting them
+            seen = np.zeros(len(self), dtype=bool)
+            seen[self.postings[start:stop]] = True
+            return np.flatnonzero(seen)
+        runs.sort(key=lambda run: run[1] - run[0])
+        rows = self.postings[runs[0][0]:runs[0][1]]
+        seen = np.zeros(len(self), dtype=bool)
+        for start, stop in runs[1:]:
+            # Once few rows are left, reading their names beats more postings
+            if len(rows) <= _CHECK_ROWS:
+                break
+            run = self.postings[start:stop]
+            seen[run] = True
+            rows = rows[seen[rows]]
+            seen[run] = False
+        # Sharing every trigram does not mean holding them in sequence
+        return rows[_containing(self.names[rows], text)]
+
+
+class _SortedColumn:
+    """One report column's values in ascending order, for bisecting ranges."""
+
+    def __init__(self, values: np.ndarray):
+        self.values = values
+        # NaN sorts last, so a range never reaches it
+        self.order = np.argsort(values, kind="stable")
+        self.sorted = values[self.order]
+        self.valid = len(values) - int(np.isnan(values).sum())
+
+    def bounds(self, condition: Range) -> tuple[int, int]:
+        """Positions in ``sorted`` of the values within ``condition``."""
+        low, high = 0, self.valid
+        if condition.low is not None:
+            side = "left" if condition.include_low else "right"
+            low = int(np.searchsorted(self.sorted[:high], condition.low, side=side))
+        if condition.high is not None:
+            side = "right" if condition.include_high else "left"
+            high = int(np.searchsorted(self.sorted[:high], condition.high, side=side))
+        return low, max(low, high)
+
+
+class CatalogIndex:
+    """Index over evaluated results answering ``CatalogQuery`` without scans.
+
+    Each condition's match count is read from its index first: numeric
+    ranges and prefixes by bisection, statuses by count and substrings by
+    trigram postings. Only the most selective condition's rows are read,
+    and the rest are checked against those rows alone. Column indexes are
+    built the first time a column is queried, and ``with_results`` carries
+    the name index over when only the costs changed.
+    """
+
+    def __init__(self, results, names: NameIndex | None = None):
+        self.results = results
+        self._names = names
+        self._columns: dict[str, _SortedColumn] = {}
+        self._status_rows: list[np.ndarray] | None = None
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def with_results(self, results) -> "CatalogIndex":
+        """An index over re-costed ``results`` for the same models, keeping the names."""
+        return CatalogIndex(results, names=self._names)
+
+    @property
+    def names_ready(self) -> bool:
+        return self._names is not None
+
+    @property
+    def names(self) -> NameIndex:
+        if self._names is None:
+            self._names = NameIndex(self.results.model_names)
+        return self._names
+
+    def column(self, name: str) -> _SortedColumn:
+        if name not in self._columns:
+            values = self.results.report_column(name).astype(np.float64)
+            self._columns[name] = _SortedColumn(values)
+        return self._columns[name]
+
+    def status_rows(self, code: int) -> np.ndarray:
+        if self._status_rows is None:
+            codes = self.results.status_codes
+            order = np.argsort(codes, kind="stable")
+            starts = np.searchsorted(codes[order], np.arange(len(STATUS_LABELS) + 1))
+            self._status_rows = [
+                order[start:stop] for start, stop in zip(starts[:-1], starts[1:])
+            ]
+        return self._status_rows[code]
+
+    def _candidates(self, query: CatalogQuery) -> list[tuple[int, object]]:
+        """``(match count or bound, reader)`` for every condition of ``query``.
+
+        Readers return the condition's rows, not necessarily in order.
+        """
+        candidates = []
+        for condition in query.ranges:
+            column = self.column(condition.column)
+            low, high = column.bounds(condition)
+            candidates.append((high - low, lambda c=column, a=low, b=high: c.order[a:b]))
+        for prefix in query.prefixes:
+            low, high = self.names.prefix_bounds(prefix)
+            candidates.append((high - low, lambda p=prefix: self.names.starting_with(p)))
+        for text in query.substrings:
+            candidates.append(
+                (self.names.estimate(text), lambda t=text: self.names.containing(t))
+            )
+        if query.statuses is not None:
+            codes = query.status_codes
+            candidates.append((
+                sum(len(self.status_rows(code)) for code in codes),
+                lambda: np.concatenate(
+                    [self.status_rows(code) for code in codes] + [np.empty(0, dtype=np.intp)]
+                ),
+            ))
+        return candidates
+
+    def select(self, query: CatalogQuery) -> np.ndarray:
+        """Ascending row positions of the models matching ``query``."""
+        candidates = self._candidates(query)
+        if not candidates:
+            return np.arange(len(self))
+        chosen = min(range(len(candidates)), key=lambda i: candidates[i][0])
+        rows = candidates[chosen][1]()
+        # The other conditions, in the order _candidates lists them
+        checks = [
+            lambda rows, c=condition: c.mask(self.column(c.column).values[rows])
+            for condition in query.ranges
+        ]
+        checks += [
+            lambda rows, p=prefix: _starting_with(self.names.names[rows], p)
+            for prefix in query.prefixes
+        ]
+        checks += [
+            lambda rows, t=text: _containing(self.names.names[rows], t)
+            for text in query.substrings
+        ]
+        if query.statuses is not None:
+            checks.append(
+                lambda rows: np.isin(self.results.status_codes[rows], query.status_codes)
+            )
+        for i, check in enumerate(checks):
+            if i != chosen and len(rows):
+                rows = rows[check(rows)]
+        return np.sort(rows)
+
+    def count(self, query: CatalogQuery) -> int:
+        return len(self.select(query))
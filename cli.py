@@ -0,0 +1,908 @@
+# cli.py - Headless entry point (python -m cost_model <command> ...)
+
+import argparse
+import asyncio
+import functools
+import math
+import os
+import sys
+import time
+from contextlib import nullcontext
+
+from benchmark import (
+    BENCHMARK_SIZES,
+    DEFAULT_SIZES,
+    DEFAULT_THRESHOLD,
+    BenchmarkReport,
+    compare_reports,
+    format_comparison,
+    format_timing,
+    run_benchmarks,
+)
+from catalog_index import RANGE_FIELDS, CatalogIndex, CatalogQuery, parse_condition
+from cost_model import STATUS_LABELS, precompute_quantities
+from farm_schedule import FarmConfig, schedule_farm
+from fleet import FleetTotals, evaluate_fleet, load_fleet
+from instrumentation import recording
+from monte_carlo import DISTRIBUTION_KINDS, Distribution, MonteCarloConfig, simulate
+from portfolio import (
+    DEFAULT_CHUNK_ROWS,
+    ReportWriter,
+    evaluate_portfolio,
+    evaluate_portfolio_file,
+    evaluate_portfolio_file_parallel,
+    iter_portfolio_chunks,
+    load_environment,
+    page_results,
+    read_portfolio,
+    report_stats,
+    solve_thresholds,
+    validate_portfolio,
+)
+from quote_service import (
+    DEFAULT_HOST,
+    DEFAULT_MAX_BATCH,
+    DEFAULT_PORT,
+    DEFAULT_PROFILE,
+    load_profiles,
+    load_test,
+    serve,
+)
+from result_store import DEFAULT_MAX_ROWS, ResultStore
+from slicer_import import find_slicer_files, portfolio_frame, read_slicer_files
+from watch_folder import (
+    DEFAULT_POLL_SECONDS,
+    DEFAULT_SETTLE_SECONDS,
+    DEFAULT_STATUS_SECONDS,
+    FolderWatch,
+    RollingCsv,
+    cost_sliced_file,
+    existing_files,
+    load_prices,
+    log_error,
+    log_row,
+    open_watcher,
+    write_status,
+)
+
+
+def with_thresholds(evaluate, target_margin: float | None):
+    """``evaluate`` followed by ``solve_thresholds`` on each chunk's results."""
+    def evaluate_and_solve(env, df, healthy_floor):
+        results = evaluate(env, df, healthy_floor)
+        return solve_thresholds(env, results, healthy_floor, target_margin)
+    return evaluate_and_solve
+
+
+def cmd_evaluate(args: argparse.Namespace) -> int:
+    env, healthy_floor = load_environment(args.env)
+    if args.healthy_margin is not None:
+        healthy_floor = args.healthy_margin
+    if args.solve and args.workers > 1:
+        raise ValueError("--solve runs in one process; use --workers 1")
+    solve = (
+        functools.partial(with_thresholds, target_margin=args.target_margin)
+        if args.solve
+        else lambda evaluate: evaluate
+    )
+    if args.store:
+        if args.workers > 1:
+            raise ValueError("--store reads through one process; use --workers 1")
+        with open_store(args) as store:
+            stats = evaluate_portfolio_file(
+                args.input,
+                args.output,
+                env,
+                healthy_floor,
+                chunk_rows=args.chunk_rows,
+                evaluate=solve(store.evaluate_portfolio),
+                rejects=args.rejects,
+            )
+        print(
+            f"Result store: {store.hits:,} hits / {store.misses:,} misses",
+            file=sys.stderr,
+        )
+    elif args.workers > 1:
+        stats = evaluate_portfolio_file_parallel(
+            args.input,
+            args.output,
+            env,
+            healthy_floor,
+            workers=args.workers,
+            chunk_rows=args.chunk_rows,
+            rejects=args.rejects,
+        )
+    else:
+        stats = evaluate_portfolio_file(
+            args.input,
+            args.output,
+            env,
+            healthy_floor,
+            chunk_rows=args.chunk_rows,
+            evaluate=solve(evaluate_portfolio),
+            rejects=args.rejects,
+        )
+    report_stats(stats)
+    return 0
+
+
+def cmd_fleet(args: argparse.Namespace) -> int:
+    profiles = load_fleet(args.profiles)
+    env = next(iter(profiles.values()))[0]
+    totals = FleetTotals.empty(tuple(profiles))
+    start = time.perf_counter()
+    with ReportWriter(args.output) as writer:
+        for chunk in iter_valid_chunks(args.input, args.chunk_rows, args.rejects):
+            result = evaluate_fleet(profiles, precompute_quantities(env, chunk))
+            writer.write(result.to_frame(chunk["model_name"].astype(str), matrix=args.matrix))
+            totals = totals.merge(result.totals())
+    seconds = time.perf_counter() - start
+
+    summary = totals.to_frame()
+    if args.summary:
+        with ReportWriter(args.summary) as writer:
+            writer.write(summary)
+    else:
+        print(summary.to_string(index=False), file=sys.stderr)
+    print(
+        f"Evaluated {totals.rows:,} models x {len(profiles)} profiles in {seconds:.2f}s | "
+        f"Profit with best assignment: ${totals.best_total_profit:,.2f}",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def cmd_schedule(args: argparse.Namespace) -> int:
+    env, _ = load_environment(args.env)
+    config = FarmConfig(
+        printers=args.printers,
+        shift_hours=args.shift_hours,
+        horizon_hours=args.horizon,
+        makespan_slack=args.makespan_slack / 100.0,
+        time_limit_seconds=args.time_limit,
+    )
+    df = read_valid_portfolio(args.input, args.rejects)
+    schedule = schedule_farm(env, precompute_quantities(env, df), config)
+    with ReportWriter(args.output) as writer:
+        writer.write(schedule.to_frame(df["model_name"].astype(str)))
+    printers = schedule.printer_frame()
+    if args.summary:
+        with ReportWriter(args.summary) as writer:
+            writer.write(printers)
+
+    totals = schedule.summary()
+    late = f" | {totals['late_jobs']:,} jobs past the horizon" if args.horizon else ""
+    print(
+        f"Scheduled {totals['jobs']:,} jobs on {totals['printers']} printers in "
+        f"{totals['seconds']:.2f}s | Makespan: {totals['makespan_hours']:,.1f}h "
+        f"(lower bound {totals['lower_bound_hours']:,.1f}h){late}\n"
+        f"Operator visits: {totals['operator_visits']:,} | Plate changes: "
+        f"{totals['plate_changes']:,} (naive {totals['naive_plate_changes']:,}) | "
+        f"Waiting for operator: {totals['idle_hours']:,.1f} printer-hours\n"
+        f"Labour: ${totals['labour_cost']:,.2f} (naive ${totals['naive_labour_cost']:,.2f}, "
+        f"saves ${totals['labour_saving']:,.2f})",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def cmd_import(args: argparse.Namespace) -> int:
+    paths = []
+    for source in args.sources:
+        paths.extend(find_slicer_files(source) if os.path.isdir(source) else [source])
+    if not paths:
+        raise ValueError("No .gcode or .3mf files found")
+    start = time.perf_counter()
+    models, errors = read_slicer_files(paths, workers=args.workers)
+    frame = portfolio_frame(models, sale_price=args.sale_price, per_plate=args.per_plate)
+    with ReportWriter(args.output) as writer:
+        writer.write(frame)
+    print(
+        f"Imported {len(models):,} of {len(paths):,} files "
+        f"({len(frame):,} rows) in {time.perf_counter() - start:.2f}s",
+        file=sys.stderr,
+    )
+    for path, reason in errors.itertuples(index=False):
+        print(f"Skipped {path}: {reason}", file=sys.stderr)
+    return 0
+
+
+def cmd_store_query(args: argparse.Namespace) -> int:
+    env = healthy_floor = None
+    if args.env is not None or args.healthy_margin is not None:
+        env, healthy_floor = load_environment(args.env)
+        if args.healthy_margin is not None:
+            healthy_floor = args.healthy_margin
+    with ResultStore(args.store) as store:
+        matches = store.query(
+            model_name=args.model,
+            status=args.status,
+            min_margin=args.min_margin,
+            max_margin=args.max_margin,
+            env_settings=env,
+            healthy_floor=healthy_floor,
+            limit=args.limit,
+        )
+    if args.output:
+        with ReportWriter(args.output) as writer:
+            writer.write(matches)
+    else:
+        matches.to_csv(sys.stdout, index=False)
+    print(f"{len(matches):,} stored results match", file=sys.stderr)
+    return 0
+
+
+# Sort keys of the query command: the range fields plus name and status
+QUERY_SORT_FIELDS = {**RANGE_FIELDS, "model": "Model", "status": "Status"}
+
+
+def cmd_query(args: argparse.Namespace) -> int:
+    env, healthy_floor = load_environment(args.env)
+    if args.healthy_margin is not None:
+        healthy_floor = args.healthy_margin
+    query = CatalogQuery(ranges=tuple(parse_condition(text) for text in args.where))
+    for prefix in args.prefix:
+        query = query.starting_with(prefix)
+    for text in args.contains:
+        query = query.containing(text)
+    if args.status:
+        query = query.with_status(*args.status)
+
+    start = time.perf_counter()
+    df = read_valid_portfolio(args.input, args.rejects)
+    results = evaluate_portfolio(env, df, healthy_floor)
+    index = CatalogIndex(results)
+    # The first query builds the indexes it needs; time the lookup alone
+    index.select(query)
+    loaded = time.perf_counter()
+    page = page_results(
+        results,
+        sort_by=QUERY_SORT_FIELDS[args.sort] if args.sort else None,
+        descending=args.descending,
+        page_size=args.limit or max(len(results), 1),
+        query=query,
+        index=index,
+    )
+    queried = time.perf_counter()
+
+    if args.output:
+        with ReportWriter(args.output) as writer:
+            writer.write(page.frame)
+    else:
+        page.frame.to_csv(sys.stdout, index=False)
+    print(
+        f"{page.matches:,} of {len(results):,} models match; query took "
+        f"{(queried - loaded) * 1000:.1f} ms after {loaded - start:.2f}s to cost and index",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def cmd_simulate(args: argparse.Namespace) -> int:
+    env, healthy_floor = load_environment(args.env)
+    if args.healthy_margin is not None:
+        healthy_floor = args.healthy_margin
+    config = MonteCarloConfig(
+        filament=Distribution(
+            args.filament_dist, args.filament_spread, args.filament_bias
+        ),
+        print_time=Distribution(args.time_dist, args.time_spread, args.time_bias),
+        failure_rate=args.failure_rate,
+        failure_waste_fraction=args.failure_waste,
+        samples=args.samples,
+        seed=args.seed,
+    )
+
+    start = time.perf_counter()
+    with ReportWriter(args.output) as writer:
+        for chunk in iter_valid_chunks(args.input, args.chunk_rows, args.rejects):
+            result = simulate(env, chunk, config, healthy_floor)
+            result.insert(0, "Model", chunk["model_name"].astype(str))
+            writer.write(result)
+    rows = writer.rows
+    seconds = time.perf_counter() - start
+    print(
+        f"Simulated {rows:,} models x {config.samples:,} samples in {seconds:.2f}s",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def cmd_bench(args: argparse.Namespace) -> int:
+    env, healthy_floor = load_environment(args.env)
+    report = run_benchmarks(
+        sizes=args.sizes.split(","),
+        repeat=args.repeat,
+        seed=args.seed,
+        env=env,
+        healthy_floor=healthy_floor,
+        progress=lambda timing: print(format_timing(timing), file=sys.stderr),
+    )
+    report.save(args.output)
+    print(f"Wrote {args.output}", file=sys.stderr)
+    return 0
+
+
+def cmd_bench_compare(args: argparse.Namespace) -> int:
+    comparisons = compare_reports(
+        BenchmarkReport.load(args.baseline), BenchmarkReport.load(args.current)
+    )
+    if not comparisons:
+        raise ValueError("The reports have no size/stage pairs in common")
+    print(format_comparison(comparisons, args.threshold))
+    regressions = [c for c in comparisons if c.change > args.threshold]
+    if regressions:
+        print(
+            f"{len(regressions)} stage(s) slower than baseline by more than "
+            f"{args.threshold:.0%}",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+def cmd_watch(args: argparse.Namespace) -> int:
+    env, healthy_floor = load_environment(args.env)
+    if args.healthy_margin is not None:
+        healthy_floor = args.healthy_margin
+    if args.output is None and args.store is None:
+        raise ValueError("Give --output and/or --store for the results")
+    prices = load_prices(args.prices) if args.prices else {}
+    default_price = None if math.isnan(args.sale_price) else args.sale_price
+    if not prices and default_price is None:
+        raise ValueError("Give --sale-price and/or --prices")
+    if not os.path.isdir(args.directory):
+        raise ValueError(f"Not a directory: {args.directory}")
+
+    sinks = [lambda row, frame: log_row(row)]
+    if args.output:
+        output = RollingCsv(args.output, max_rows=args.rotate_rows)
+        sinks.append(lambda row, frame: output.write(row))
+    store = open_store(args) if args.store else None
+    if store is not None:
+        sinks.append(lambda row, frame: store.evaluate_portfolio(env, frame, healthy_floor))
+
+    watcher = open_watcher(args.directory, polling=args.poll, interval=args.poll_seconds)
+    watch = FolderWatch(
+        watcher,
+        functools.partial(
+            cost_sliced_file,
+            env_settings=env,
+            healthy_floor=healthy_floor,
+            prices=prices,
+            default_price=default_price,
+        ),
+        sinks,
+        workers=args.workers,
+        settle_seconds=args.settle,
+        on_error=log_error,
+    )
+    if args.include_existing:
+        watch.add(existing_files(args.directory))
+    status = functools.partial(write_status, path=args.status) if args.status else None
+    print(
+        f"Watching {args.directory} ({type(watcher).__name__}); Ctrl+C to stop",
+        file=sys.stderr,
+    )
+    try:
+        stats = watch.run(status=status, status_seconds=args.status_seconds)
+    except KeyboardInterrupt:
+        stats = watch.stats
+    finally:
+        if store is not None:
+            store.close()
+    print(f"Processed {stats.processed:,} files, skipped {stats.failed:,}", file=sys.stderr)
+    return 0
+
+
+def cmd_serve(args: argparse.Namespace) -> int:
+    profiles = load_profiles(args.profiles)
+
+    def ready(server):
+        address = ", ".join(
+            f"http://{sock.getsockname()[0]}:{sock.getsockname()[1]}" for sock in server.sockets
+        )
+        print(f"Quote service on {address} (profiles: {', '.join(profiles)})", file=sys.stderr)
+
+    try:
+        asyncio.run(serve(
+            profiles,
+            args.host,
+            args.port,
+            max_batch=args.max_batch,
+            max_wait=args.max_wait_ms / 1000.0,
+            ready=ready,
+        ))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def cmd_loadtest(args: argparse.Namespace) -> int:
+    report = asyncio.run(load_test(
+        args.host,
+        args.port,
+        requests=args.requests,
+        concurrency=args.concurrency,
+        profile=args.profile,
+        batch_size=args.batch_size,
+    ))
+    print(report.summary())
+    return 1 if report.errors else 0
+
+
+def add_common_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--env", help="JSON file with environment settings")
+    parser.add_argument(
+        "--healthy-margin",
+        type=float,
+        help="Healthy margin floor in percent (overrides the env file)",
+    )
+    parser.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=DEFAULT_CHUNK_ROWS,
+        help=f"Rows per chunk held in memory (default {DEFAULT_CHUNK_ROWS:,})",
+    )
+
+
+def add_store_limits(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--store-max-rows",
+        type=int,
+        default=DEFAULT_MAX_ROWS,
+        help=f"Evict the oldest stored rows beyond this many (default {DEFAULT_MAX_ROWS:,})",
+    )
+    parser.add_argument(
+        "--store-max-age-days", type=float, help="Evict stored rows older than this"
+    )
+
+
+def open_store(args: argparse.Namespace) -> ResultStore:
+    return ResultStore(
+        args.store, max_rows=args.store_max_rows, max_age_days=args.store_max_age_days
+    )
+
+
+def add_rejects_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--rejects",
+        help="File to list cells that could not be read (row, column, value, reason)",
+    )
+
+
+def report_skipped(rows: int) -> None:
+    if rows:
+        print(f"Skipped {rows:,} rows with invalid cells", file=sys.stderr)
+
+
+def iter_valid_chunks(source, chunk_rows: int, rejects=None):
+    """Yield the valid rows of each chunk of a portfolio file.
+
+    Bad cells are written to ``rejects`` if given, and the number of skipped
+    rows is printed once the file has been read.
+    """
+    rows_read = skipped = 0
+    reject_writer = ReportWriter(rejects) if rejects is not None else nullcontext()
+    with reject_writer:
+        for chunk in iter_portfolio_chunks(source, chunk_rows):
+            valid, bad_cells = validate_portfolio(chunk, first_row=rows_read + 1)
+            rows_read += len(chunk)
+            skipped += len(chunk) - len(valid)
+            if rejects is not None and len(bad_cells):
+                reject_writer.write(bad_cells)
+            if len(valid):
+                yield valid
+    report_skipped(skipped)
+
+
+def read_valid_portfolio(source, rejects=None):
+    """Read a whole portfolio file and drop the rows with invalid cells."""
+    df, bad_cells = validate_portfolio(read_portfolio(source))
+    if rejects is not None:
+        with ReportWriter(rejects) as writer:
+            if len(bad_cells):
+                writer.write(bad_cells)
+    report_skipped(bad_cells["Row"].nunique())
+    return df
+
+
+def add_timings_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--timings",
+        help="Append per-stage wall time and rows as JSON lines to this file ('-' for stdout)",
+    )
+
+
+def write_timings(recorder, destination: str, **fields) -> None:
+    if destination == "-":
+        recorder.write_jsonl(sys.stdout, **fields)
+        return
+    with open(destination, "a", encoding="utf-8") as out:
+        recorder.write_jsonl(out, **fields)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m cost_model",
+        description="3D print cost evaluator (headless mode)",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    evaluate = commands.add_parser(
+        "evaluate", help="Cost a portfolio file and write the full report"
+    )
+    evaluate.add_argument(
+        "input", help="Portfolio CSV, Parquet or Feather file (template columns)"
+    )
+    evaluate.add_argument(
+        "output", help="Report to write; the suffix picks CSV, Parquet, Feather or XLSX"
+    )
+    add_common_arguments(evaluate)
+    evaluate.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes; a CSV file is split into byte-range shards (default 1)",
+    )
+    add_rejects_argument(evaluate)
+    evaluate.add_argument(
+        "--store",
+        help="SQLite result store to read through; only unseen rows are costed",
+    )
+    add_store_limits(evaluate)
+    evaluate.add_argument(
+        "--solve",
+        action="store_true",
+        help="Add the price for --target-margin, the highest filament price and labour "
+        "rate that keep each model Healthy and the longest print time before it loses money",
+    )
+    evaluate.add_argument(
+        "--target-margin",
+        type=float,
+        help="Margin in percent for the --solve target price (default: the healthy margin)",
+    )
+    add_timings_argument(evaluate)
+    evaluate.set_defaults(func=cmd_evaluate)
+
+    fleet_cmd = commands.add_parser(
+        "fleet", help="Cost a portfolio on every printer/site profile and pick the best"
+    )
+    fleet_cmd.add_argument("input", help="Portfolio CSV, Parquet or Feather file")
+    fleet_cmd.add_argument(
+        "output", help="Best profile per model (CSV, Parquet, Feather or XLSX)"
+    )
+    fleet_cmd.add_argument(
+        "--profiles",
+        required=True,
+        help="JSON file mapping profile names to environment settings",
+    )
+    fleet_cmd.add_argument(
+        "--matrix",
+        action="store_true",
+        help="Also write every profile's profit for each model",
+    )
+    fleet_cmd.add_argument(
+        "--summary", help="File for per-profile totals (default: print them)"
+    )
+    fleet_cmd.add_argument(
+        "--chunk-rows",
+        type=int,
+        default=DEFAULT_CHUNK_ROWS,
+        help=f"Rows per chunk held in memory (default {DEFAULT_CHUNK_ROWS:,})",
+    )
+    add_rejects_argument(fleet_cmd)
+    add_timings_argument(fleet_cmd)
+    fleet_cmd.set_defaults(func=cmd_fleet)
+
+    schedule_cmd = commands.add_parser(
+        "schedule", help="Queue a portfolio's jobs on a printer farm"
+    )
+    schedule_cmd.add_argument("input", help="Portfolio CSV, Parquet or Feather file")
+    schedule_cmd.add_argument(
+        "output", help="Printer, queue position and times per job (CSV, Parquet, Feather or XLSX)"
+    )
+    schedule_cmd.add_argument("--env", help="JSON file with environment settings")
+    schedule_cmd.add_argument("--printers", type=int, default=10)
+    schedule_cmd.add_argument(
+        "--shift-hours",
+        type=float,
+        default=24.0,
+        help="Hours an operator is on duty each day, from time 0 (default 24)",
+    )
+    schedule_cmd.add_argument(
+        "--horizon", type=float, help="Report jobs still printing after this many hours"
+    )
+    schedule_cmd.add_argument(
+        "--makespan-slack",
+        type=float,
+        default=1.0,
+        help="Percent the makespan may grow to save plate changes (default 1)",
+    )
+    schedule_cmd.add_argument(
+        "--time-limit",
+        type=float,
+        default=2.0,
+        help="Seconds for the makespan search (default 2)",
+    )
+    schedule_cmd.add_argument("--summary", help="File for per-printer totals")
+    add_rejects_argument(schedule_cmd)
+    add_timings_argument(schedule_cmd)
+    schedule_cmd.set_defaults(func=cmd_schedule)
+
+    import_cmd = commands.add_parser(
+        "import", help="Build a portfolio from sliced .gcode / .gcode.3mf files"
+    )
+    import_cmd.add_argument(
+        "sources", nargs="+", help="Sliced files, or directories searched recursively"
+    )
+    import_cmd.add_argument(
+        "output", help="Portfolio file to write (CSV, Parquet or Feather)"
+    )
+    import_cmd.add_argument(
+        "--sale-price",
+        type=float,
+        default=math.nan,
+        help="Sale price for every model (default: left blank to fill in)",
+    )
+    import_cmd.add_argument(
+        "--per-plate",
+        action="store_true",
+        help="One row per plate of multi-plate projects instead of one per file",
+    )
+    import_cmd.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Processes reading files in parallel (default: one per CPU)",
+    )
+    import_cmd.set_defaults(func=cmd_import)
+
+    store_query = commands.add_parser(
+        "store-query", help="Look up results saved in a result store"
+    )
+    store_query.add_argument("store", help="SQLite result store")
+    store_query.add_argument(
+        "--output", help="File to write matches to (default: CSV on stdout)"
+    )
+    store_query.add_argument("--model", help="Exact model name")
+    store_query.add_argument("--status", choices=STATUS_LABELS)
+    store_query.add_argument("--min-margin", type=float, help="Lowest margin in percent")
+    store_query.add_argument("--max-margin", type=float, help="Highest margin in percent")
+    store_query.add_argument("--limit", type=int)
+    store_query.add_argument(
+        "--env", help="Only results for these environment settings (JSON file)"
+    )
+    store_query.add_argument(
+        "--healthy-margin",
+        type=float,
+        help="Healthy margin floor of the settings to match (overrides the env file)",
+    )
+    store_query.set_defaults(func=cmd_store_query)
+
+    query_cmd = commands.add_parser(
+        "query", help="Cost a portfolio and list the models matching range and name filters"
+    )
+    query_cmd.add_argument("input", help="Portfolio CSV, Parquet or Feather file")
+    query_cmd.add_argument(
+        "--output", help="File to write matches to (default: CSV on stdout)"
+    )
+    query_cmd.add_argument(
+        "--where",
+        action="append",
+        default=[],
+        metavar="CONDITION",
+        help="Range on a result column, e.g. 'margin=5:15' or 'plates>2'; fields: "
+        f"{', '.join(RANGE_FIELDS)}. Repeat to combine",
+    )
+    query_cmd.add_argument(
+        "--prefix", action="append", default=[], help="Model name starts with (any case)"
+    )
+    query_cmd.add_argument(
+        "--contains", action="append", default=[], help="Model name contains (any case)"
+    )
+    query_cmd.add_argument(
+        "--status", action="append", choices=STATUS_LABELS, help="Repeat to allow several"
+    )
+    query_cmd.add_argument("--sort", choices=QUERY_SORT_FIELDS, help="Column to order by")
+    query_cmd.add_argument("--descending", action="store_true")
+    query_cmd.add_argument("--limit", type=int, help="Most matches to list")
+    query_cmd.add_argument("--env", help="JSON file with environment settings")
+    query_cmd.add_argument(
+        "--healthy-margin",
+        type=float,
+        help="Healthy margin floor in percent (overrides the env file)",
+    )
+    add_rejects_argument(query_cmd)
+    query_cmd.set_defaults(func=cmd_query)
+
+    simulate_cmd = commands.add_parser(
+        "simulate", help="Monte Carlo cost/profit ranges for each model"
+    )
+    simulate_cmd.add_argument("input", help="Portfolio CSV, Parquet or Feather file")
+    simulate_cmd.add_argument(
+        "output", help="Percentile/probability report (CSV, Parquet, Feather or XLSX)"
+    )
+    add_common_arguments(simulate_cmd)
+    simulate_cmd.add_argument("--samples", type=int, default=10_000)
+    simulate_cmd.add_argument("--seed", type=int, default=0)
+    for name, spread in (("filament", 0.05), ("time", 0.10)):
+        simulate_cmd.add_argument(
+            f"--{name}-dist", choices=DISTRIBUTION_KINDS, default="normal"
+        )
+        simulate_cmd.add_argument(
+            f"--{name}-spread",
+            type=float,
+            default=spread,
+            help=f"Relative spread of the {name} estimate (default {spread})",
+        )
+        simulate_cmd.add_argument(
+            f"--{name}-bias",
+            type=float,
+            default=0.0,
+            help=f"Mean relative error of the {name} estimate",
+        )
+    simulate_cmd.add_argument(
+        "--failure-rate",
+        type=float,
+        default=0.0,
+        help="Probability a print attempt fails",
+    )
+    simulate_cmd.add_argument(
+        "--failure-waste",
+        type=float,
+        default=0.5,
+        help="Share of filament and time consumed by a failed attempt (default 0.5)",
+    )
+    add_rejects_argument(simulate_cmd)
+    add_timings_argument(simulate_cmd)
+    simulate_cmd.set_defaults(func=cmd_simulate)
+
+    bench = commands.add_parser(
+        "bench", help="Time each pipeline stage on synthetic portfolios"
+    )
+    bench.add_argument("output", help="JSON file to write the timings to")
+    bench.add_argument(
+        "--sizes",
+        default=",".join(DEFAULT_SIZES),
+        help=f"Comma-separated sizes from {', '.join(BENCHMARK_SIZES)} "
+        f"(default {','.join(DEFAULT_SIZES)})",
+    )
+    bench.add_argument("--repeat", type=int, default=3, help="Runs per stage (default 3)")
+    bench.add_argument("--seed", type=int, default=0)
+    bench.add_argument("--env", help="JSON file with environment settings")
+    bench.set_defaults(func=cmd_bench)
+
+    bench_compare = commands.add_parser(
+        "bench-compare", help="Compare two benchmark files and flag regressions"
+    )
+    bench_compare.add_argument("baseline", help="Stored baseline JSON")
+    bench_compare.add_argument("current", help="JSON from the run under test")
+    bench_compare.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=f"Allowed slowdown per row before a stage is flagged (default {DEFAULT_THRESHOLD})",
+    )
+    bench_compare.set_defaults(func=cmd_bench_compare)
+
+    watch_cmd = commands.add_parser(
+        "watch", help="Cost sliced files as they are dropped into a directory"
+    )
+    watch_cmd.add_argument("directory", help="Directory to watch for .gcode / .3mf files")
+    watch_cmd.add_argument("--env", help="JSON file with environment settings")
+    watch_cmd.add_argument(
+        "--healthy-margin",
+        type=float,
+        help="Healthy margin floor in percent (overrides the env file)",
+    )
+    watch_cmd.add_argument("--output", help="CSV to append one result row per file to")
+    watch_cmd.add_argument(
+        "--rotate-rows",
+        type=int,
+        help="Start a new output file after this many rows (old ones get a timestamp)",
+    )
+    watch_cmd.add_argument("--store", help="SQLite result store to save results to")
+    add_store_limits(watch_cmd)
+    watch_cmd.add_argument(
+        "--prices", help="CSV of model_name,sale_price; file names are matched to models"
+    )
+    watch_cmd.add_argument(
+        "--sale-price",
+        type=float,
+        default=math.nan,
+        help="Sale price for models missing from --prices",
+    )
+    watch_cmd.add_argument(
+        "--workers", type=int, default=2, help="Files costed at once (default 2)"
+    )
+    watch_cmd.add_argument(
+        "--settle",
+        type=float,
+        default=DEFAULT_SETTLE_SECONDS,
+        help=f"Seconds without changes before a file is read (default {DEFAULT_SETTLE_SECONDS:g})",
+    )
+    watch_cmd.add_argument(
+        "--poll", action="store_true", help="Scan the directory instead of using inotify"
+    )
+    watch_cmd.add_argument(
+        "--poll-seconds",
+        type=float,
+        default=DEFAULT_POLL_SECONDS,
+        help=f"Seconds between scans with --poll (default {DEFAULT_POLL_SECONDS:g})",
+    )
+    watch_cmd.add_argument(
+        "--include-existing",
+        action="store_true",
+        help="Also cost files already in the directory at start-up",
+    )
+    watch_cmd.add_argument(
+        "--status",
+        help="JSON file rewritten with processed/failed counts, backlog and latency",
+    )
+    watch_cmd.add_argument(
+        "--status-seconds",
+        type=float,
+        default=DEFAULT_STATUS_SECONDS,
+        help=f"Seconds between status updates (default {DEFAULT_STATUS_SECONDS:g})",
+    )
+    watch_cmd.set_defaults(func=cmd_watch)
+
+    serve_cmd = commands.add_parser("serve", help="Run the local HTTP/JSON quote service")
+    serve_cmd.add_argument("--host", default=DEFAULT_HOST)
+    serve_cmd.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_cmd.add_argument(
+        "--profiles",
+        help="JSON file mapping profile names to environment settings",
+    )
+    serve_cmd.add_argument(
+        "--max-batch",
+        type=int,
+        default=DEFAULT_MAX_BATCH,
+        help=f"Largest micro-batch of coalesced single quotes (default {DEFAULT_MAX_BATCH})",
+    )
+    serve_cmd.add_argument(
+        "--max-wait-ms",
+        type=float,
+        default=0.0,
+        help="Extra time a single quote may wait for others to batch with (default 0)",
+    )
+    serve_cmd.set_defaults(func=cmd_serve)
+
+    loadtest = commands.add_parser(
+        "loadtest", help="Measure quote service latency and throughput"
+    )
+    loadtest.add_argument("--host", default=DEFAULT_HOST)
+    loadtest.add_argument("--port", type=int, default=DEFAULT_PORT)
+    loadtest.add_argument("--requests", type=int, default=10_000)
+    loadtest.add_argument(
+        "--concurrency", type=int, default=64, help="Open connections (default 64)"
+    )
+    loadtest.add_argument("--profile", default=DEFAULT_PROFILE)
+    loadtest.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="Models per request; above 1 uses /quote/batch (default 1)",
+    )
+    loadtest.set_defaults(func=cmd_loadtest)
+
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        if getattr(args, "timings", None) is None:
+            return args.func(args)
+        with recording() as recorder:
+            status = args.func(args)
+        write_timings(recorder, args.timings, command=args.command)
+        return status
+    except (OSError, ValueError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,4 +1,24 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, fields, replace
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import count
+
+
+DEFAULT_SETTINGS = {
+    "filament_price_per_kg": 25.0,
+    "electricity_price_per_kwh": 0.30,
+    "printer_power_watts": 250.0,
+    "labour_rate_per_hour": 30.0,
+    "prep_time_minutes": 10.0,
+    "cleanup_time_minutes": 10.0,
+    "plate_change_time_minutes": 5.0,
+    "remote_check_minutes_per_hour": 2.0,
+    "has_automation": False,
+    "automated_plate_capacity": 4,
+    "healthy_margin_floor_percent": 20.0,
+}
 
 
 @dataclass
@@ -50,6 +70,7 @@ def clamp_non_negative(value: float) -> float:
 
 
 def calculate_costs(env: EnvironmentSettings, model: ModelInput) -> CostBreakdown:
+    count("calculate_costs")
     # Normalise obvious non-negatives
     filament_grams = clamp_non_negative(model.filament_grams)
     print_time_hours = clamp_non_negative(model.print_time_hours)
@@ -120,3 +141,491 @@ def calculate_costs(env: EnvironmentSettings, model: ModelInput) -> CostBreakdow
         remote_friendly=remote_friendly,
         recommended_sale_price_for_target_margin=recommended_price,
     )
+
+
+# ---------------------------------------------------------------------
+# Classification
+# ---------------------------------------------------------------------
+STATUS_LABELS = ("Losing money", "Low margin", "Healthy", "Profitable")
+STATUS_LOSING, STATUS_LOW_MARGIN, STATUS_HEALTHY, STATUS_PROFITABLE = range(4)
+
+
+def calculate_break_even_and_health(
+    total_cost: float, healthy_margin_floor_percent: float
+) -> tuple[float, float | None]:
+    """Calculate break-even price and healthy margin price."""
+    break_even_price = total_cost
+    if 0 < healthy_margin_floor_percent < 100:
+        m = healthy_margin_floor_percent / 100.0
+        healthy_price = total_cost / (1.0 - m)
+    else:
+        healthy_price = None
+    return break_even_price, healthy_price
+
+
+def classify_model(
+    sale_price: float, total_cost: float, healthy_price: float | None
+) -> str:
+    """Categorize a model's profitability."""
+    if sale_price < total_cost:
+        return "Losing money"
+    if healthy_price is None:
+        return "Profitable"
+    if sale_price < healthy_price:
+        return "Low margin"
+    return "Healthy"
+
+
+# ---------------------------------------------------------------------
+# Batch (columnar) evaluation
+# ---------------------------------------------------------------------
+BATCH_INPUT_COLUMNS = ("filament_grams", "print_time_hours", "plate_count", "sale_price")
+
+
+def _column(frame_or_arrays, name: str) -> np.ndarray:
+    if name not in frame_or_arrays:
+        raise KeyError(f"Missing input column: {name}")
+    return np.asarray(frame_or_arrays[name], dtype=np.float64)
+
+
+def normalise_plate_counts(plate_count) -> np.ndarray:
+    """Vectorized ``max(int(plate_count), 0)``."""
+    plate_count = np.trunc(np.asarray(plate_count, dtype=np.float64))
+    return np.maximum(plate_count.astype(np.int64), 0)
+
+
+def extra_plate_changes_batch(
+    env: EnvironmentSettings, plate_count: np.ndarray
+) -> np.ndarray:
+    """Plate changes that need a human, following the automation branch."""
+    if not env.has_automation:
+        return np.maximum(plate_count - 1, 0)
+    capacity = env.automated_plate_capacity
+    return np.where(plate_count <= capacity, 0, np.maximum(plate_count - capacity, 0))
+
+
+def remote_friendly_batch(
+    env: EnvironmentSettings, plate_count: np.ndarray
+) -> np.ndarray:
+    return (plate_count == 1) | (
+        env.has_automation & (plate_count <= env.automated_plate_capacity)
+    )
+
+
+COST_FIELDS = tuple(f.name for f in fields(CostBreakdown))
+OPTIONAL_COST_FIELDS = (
+    "profit_margin_percent",
+    "recommended_sale_price_for_target_margin",
+)
+FLOAT_COST_FIELDS = tuple(name for name in COST_FIELDS if name != "remote_friendly")
+_FLOAT_FIELD_ROWS = {name: i for i, name in enumerate(FLOAT_COST_FIELDS)}
+
+
+class CostBreakdownRow:
+    """Read-only view of one model in a ``CostBreakdownBatch``.
+
+    Attribute access mirrors ``CostBreakdown``; values are read from the
+    batch arrays on demand.
+    """
+    __slots__ = ("_batch", "_index")
+
+    def __init__(self, batch: "CostBreakdownBatch", index: int):
+        self._batch = batch
+        self._index = index
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._batch, name)[self._index]
+
+    def __repr__(self) -> str:
+        return f"CostBreakdownRow({self.to_breakdown()!r})"
+
+    def to_breakdown(self) -> CostBreakdown:
+        """Materialise as a ``CostBreakdown`` (``NaN`` optionals become ``None``)."""
+        values = {}
+        for name in COST_FIELDS:
+            value = getattr(self, name)
+            if name == "remote_friendly":
+                values[name] = bool(value)
+            elif name in OPTIONAL_COST_FIELDS and np.isnan(value):
+                values[name] = None
+            else:
+                values[name] = float(value)
+        return CostBreakdown(**values)
+
+
+class CostBreakdownBatch:
+    """Struct-of-arrays counterpart of ``CostBreakdown`` for many models.
+
+    Float fields share one C-ordered ``(fields, models)`` array, so each field
+    is a contiguous view and ``to_frame`` wraps the block without copying.
+    Optional fields hold ``NaN`` where ``CostBreakdown`` would hold ``None``.
+    """
+
+    def __init__(self, values: np.ndarray, remote_friendly: np.ndarray, index=None):
+        if values.shape[0] != len(FLOAT_COST_FIELDS):
+            raise ValueError("values must have one row per float CostBreakdown field")
+        self.values = values
+        self.remote_friendly = remote_friendly
+        self.index = index
+
+    @classmethod
+    def empty(cls, n: int, index=None) -> "CostBreakdownBatch":
+        return cls(
+            np.empty((len(FLOAT_COST_FIELDS), n), dtype=np.float64),
+            np.zeros(n, dtype=bool),
+            index,
+        )
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        row = _FLOAT_FIELD_ROWS.get(name)
+        if row is None:
+            raise AttributeError(name)
+        return self.values[row]
+
+    def __len__(self) -> int:
+        return self.values.shape[1]
+
+    def __getitem__(self, i: int) -> CostBreakdownRow:
+        if not -len(self) <= i < len(self):
+            raise IndexError(i)
+        return CostBreakdownRow(self, i % len(self))
+
+    def __iter__(self):
+        return (CostBreakdownRow(self, i) for i in range(len(self)))
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame with one column per ``CostBreakdown`` field, sharing memory."""
+        df = pd.DataFrame(
+            self.values.T, columns=FLOAT_COST_FIELDS, index=self.index, copy=False
+        )
+        df.insert(
+            COST_FIELDS.index("remote_friendly"), "remote_friendly", self.remote_friendly
+        )
+        return df
+
+
+def _margin_percent(profit: np.ndarray, sale_price: np.ndarray, out: np.ndarray) -> None:
+    """``(profit / sale_price) * 100`` where the sale price is positive, else NaN."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        np.divide(profit, sale_price, out=out)
+    out *= 100.0
+    np.copyto(out, np.nan, where=~(sale_price > 0))
+
+
+def calculate_costs_batch(
+    env: EnvironmentSettings, frame_or_arrays
+) -> CostBreakdownBatch:
+    """Vectorized ``calculate_costs`` over a DataFrame or mapping of arrays.
+
+    Inputs use the ``ModelInput`` field names. Each field is written straight
+    into its row of the batch, applying the operations of ``calculate_costs``
+    in the same order so the results are bit-for-bit identical.
+    """
+    raw_plates = _column(frame_or_arrays, "plate_count")
+    n = len(raw_plates)
+    batch = CostBreakdownBatch.empty(n, getattr(frame_or_arrays, "index", None))
+    out = batch.values
+
+    # Normalise obvious non-negatives
+    filament_grams = np.maximum(_column(frame_or_arrays, "filament_grams"), 0.0)
+    print_time_hours = np.maximum(_column(frame_or_arrays, "print_time_hours"), 0.0)
+    plate_count = normalise_plate_counts(raw_plates)
+    sale_price = _column(frame_or_arrays, "sale_price")
+
+    # Material
+    filament_kg = np.divide(filament_grams, 1000.0, out=batch.filament_kg)
+    material_cost = np.multiply(
+        filament_kg, env.filament_price_per_kg, out=batch.material_cost
+    )
+
+    # Energy
+    printer_power_kw = env.printer_power_watts / 1000.0
+    batch.printer_power_kw[:] = printer_power_kw
+    energy_cost = np.multiply(print_time_hours, printer_power_kw, out=batch.energy_cost)
+    energy_cost *= env.electricity_price_per_kwh
+
+    # Human time
+    base_human_minutes = env.prep_time_minutes + env.cleanup_time_minutes
+    batch.base_human_minutes[:] = base_human_minutes
+
+    extra_plate_changes = extra_plate_changes_batch(env, plate_count)
+    plate_change_minutes = np.multiply(
+        extra_plate_changes,
+        env.plate_change_time_minutes,
+        out=batch.plate_change_minutes,
+    )
+
+    remote_check_minutes = np.multiply(
+        env.remote_check_minutes_per_hour,
+        print_time_hours,
+        out=batch.remote_check_minutes,
+    )
+
+    total_human_minutes = np.add(
+        base_human_minutes, plate_change_minutes, out=batch.total_human_minutes
+    )
+    total_human_minutes += remote_check_minutes
+    total_human_hours = np.divide(total_human_minutes, 60.0, out=batch.total_human_hours)
+    labour_cost = np.multiply(
+        total_human_hours, env.labour_rate_per_hour, out=batch.labour_cost
+    )
+
+    total_cost = np.add(material_cost, energy_cost, out=batch.total_cost)
+    total_cost += labour_cost
+    profit = np.subtract(sale_price, total_cost, out=batch.profit)
+
+    _margin_percent(profit, sale_price, out=batch.profit_margin_percent)
+
+    # Remote-friendly flag
+    batch.remote_friendly = remote_friendly_batch(env, plate_count)
+
+    # Optional recommended sale price
+    recommended = out[_FLOAT_FIELD_ROWS["recommended_sale_price_for_target_margin"]]
+    recommended[:] = np.nan
+    if "target_margin_percent" in frame_or_arrays:
+        target_margin = _column(frame_or_arrays, "target_margin_percent") / 100.0
+        valid = (target_margin >= 0) & (target_margin < 1)
+        np.divide(total_cost, 1.0 - target_margin, out=recommended, where=valid)
+
+    return batch
+
+
+def classify_batch(
+    sale_price: np.ndarray, total_cost: np.ndarray, healthy_margin_floor_percent: float
+) -> np.ndarray:
+    """Vectorized ``classify_model``; returns indices into ``STATUS_LABELS``.
+
+    Inputs broadcast, so ``(models, 1)`` prices can be classified against
+    ``(models, profiles)`` costs.
+    """
+    sale_price = np.asarray(sale_price, dtype=np.float64)
+    total_cost = np.asarray(total_cost, dtype=np.float64)
+    _, healthy_price = calculate_break_even_and_health(
+        total_cost, healthy_margin_floor_percent
+    )
+    # Branch-free: HEALTHY - (sale < healthy) gives HEALTHY/LOW_MARGIN, and
+    # multiplying by "not losing" zeroes losing rows (STATUS_LOSING == 0).
+    if healthy_price is None:
+        shape = np.broadcast_shapes(sale_price.shape, total_cost.shape)
+        codes = np.full(shape, STATUS_PROFITABLE, dtype=np.int8)
+    else:
+        codes = np.less(sale_price, healthy_price).astype(np.int8)
+        np.subtract(STATUS_HEALTHY, codes, out=codes)
+    np.multiply(codes, ~np.less(sale_price, total_cost), out=codes)
+    return codes
+
+
+def status_labels(codes: np.ndarray) -> np.ndarray:
+    """Map status codes from ``classify_batch`` to their label strings."""
+    return np.asarray(STATUS_LABELS, dtype=object)[codes]
+
+
+# ---------------------------------------------------------------------
+# Linear re-pricing
+# ---------------------------------------------------------------------
+QUANTITY_COLUMNS = ("filament_kg", "print_time_hours", "extra_plate_changes", "jobs")
+
+
+@dataclass
+class CostQuantities:
+    """Per-model quantities that do not depend on environment prices.
+
+    ``matrix`` holds one row per model with the ``QUANTITY_COLUMNS`` and is
+    column-major so each quantity is contiguous; total cost is
+    ``matrix @ cost_coefficients(env)``. Only the plate-change
+    column depends on the automation settings, recorded in ``plate_policy``.
+    """
+    matrix: np.ndarray
+    plate_count: np.ndarray
+    sale_price: np.ndarray
+    plate_policy: tuple[bool, int]
+
+    def __len__(self) -> int:
+        return len(self.sale_price)
+
+    def with_plate_policy(self, env: EnvironmentSettings) -> "CostQuantities":
+        """Return quantities valid for ``env``, rebuilding only the plate column."""
+        policy = _plate_policy(env)
+        if policy == self.plate_policy:
+            return self
+        matrix = self.matrix.copy(order="F")
+        matrix[:, 2] = extra_plate_changes_batch(env, self.plate_count)
+        return CostQuantities(matrix, self.plate_count, self.sale_price, policy)
+
+
+def _plate_policy(env: EnvironmentSettings) -> tuple[bool, int]:
+    return bool(env.has_automation), int(env.automated_plate_capacity)
+
+
+def precompute_quantities(env: EnvironmentSettings, frame_or_arrays) -> CostQuantities:
+    """Extract the per-model quantity matrix once per portfolio."""
+    plate_count = normalise_plate_counts(_column(frame_or_arrays, "plate_count"))
+    matrix = np.empty((len(plate_count), len(QUANTITY_COLUMNS)), order="F")
+    matrix[:, 0] = np.maximum(_column(frame_or_arrays, "filament_grams"), 0.0) / 1000.0
+    matrix[:, 1] = np.maximum(_column(frame_or_arrays, "print_time_hours"), 0.0)
+    matrix[:, 2] = extra_plate_changes_batch(env, plate_count)
+    matrix[:, 3] = 1.0
+    return CostQuantities(
+        matrix=matrix,
+        plate_count=plate_count,
+        sale_price=_column(frame_or_arrays, "sale_price"),
+        plate_policy=_plate_policy(env),
+    )
+
+
+def cost_coefficients(env: EnvironmentSettings) -> np.ndarray:
+    """Total cost per unit of each quantity column under ``env``.
+
+    Settings may be arrays (one value per scenario), in which case the
+    result has shape ``(len(QUANTITY_COLUMNS), n_scenarios)``.
+    """
+    labour_per_minute = env.labour_rate_per_hour / 60.0
+    return np.stack(np.broadcast_arrays(
+        env.filament_price_per_kg,
+        env.printer_power_watts / 1000.0 * env.electricity_price_per_kwh
+        + env.remote_check_minutes_per_hour * labour_per_minute,
+        env.plate_change_time_minutes * labour_per_minute,
+        (env.prep_time_minutes + env.cleanup_time_minutes) * labour_per_minute,
+    )).astype(np.float64)
+
+
+def breakdown_from_quantities(
+    env: EnvironmentSettings,
+    quantities: CostQuantities,
+    out: CostBreakdownBatch | None = None,
+) -> CostBreakdownBatch:
+    """Full ``CostBreakdownBatch`` from precomputed quantities.
+
+    ``total_cost`` comes from ``reprice``; the component fields are scaled
+    quantity columns, so nothing is re-read from the portfolio. Pass the
+    previous result as ``out`` to overwrite it instead of allocating.
+    """
+    batch = out if out is not None and len(out) == len(quantities) else None
+    if batch is None:
+        batch = CostBreakdownBatch.empty(len(quantities))
+    filament_kg, print_time_hours, extra_plate_changes, _ = quantities.matrix.T
+
+    batch.filament_kg[:] = filament_kg
+    np.multiply(filament_kg, env.filament_price_per_kg, out=batch.material_cost)
+    printer_power_kw = env.printer_power_watts / 1000.0
+    batch.printer_power_kw[:] = printer_power_kw
+    np.multiply(print_time_hours, printer_power_kw, out=batch.energy_cost)
+    batch.energy_cost *= env.electricity_price_per_kwh
+
+    batch.base_human_minutes[:] = env.prep_time_minutes + env.cleanup_time_minutes
+    np.multiply(
+        extra_plate_changes,
+        env.plate_change_time_minutes,
+        out=batch.plate_change_minutes,
+    )
+    np.multiply(
+        env.remote_check_minutes_per_hour,
+        print_time_hours,
+        out=batch.remote_check_minutes,
+    )
+    total_human_minutes = batch.total_human_minutes
+    np.add(batch.base_human_minutes, batch.plate_change_minutes, out=total_human_minutes)
+    total_human_minutes += batch.remote_check_minutes
+    np.divide(total_human_minutes, 60.0, out=batch.total_human_hours)
+    np.multiply(
+        batch.total_human_hours, env.labour_rate_per_hour, out=batch.labour_cost
+    )
+
+    reprice(env, quantities, out=batch.total_cost)
+    sale_price = quantities.sale_price
+    np.subtract(sale_price, batch.total_cost, out=batch.profit)
+    _margin_percent(batch.profit, sale_price, out=batch.profit_margin_percent)
+
+    batch.remote_friendly = remote_friendly_batch(env, quantities.plate_count)
+    batch.recommended_sale_price_for_target_margin[:] = np.nan
+    return batch
+
+
+def reprice(
+    env: EnvironmentSettings, quantities: CostQuantities, out: np.ndarray | None = None
+) -> np.ndarray:
+    """Total cost of every model under ``env`` as one matrix-vector product.
+
+    Matches ``calculate_costs(...).total_cost`` up to floating-point rounding.
+    ``quantities`` must already match ``env``'s plate policy (see
+    ``CostQuantities.with_plate_policy``).
+    """
+    if quantities.plate_policy != _plate_policy(env):
+        raise ValueError("Quantities were computed for a different automation setup")
+    return np.matmul(quantities.matrix, cost_coefficients(env), out=out)
+
+
+# ---------------------------------------------------------------------
+# Inverse pricing
+# ---------------------------------------------------------------------
+# Settings that total cost is affine in (each one with the others fixed)
+LINEAR_SETTINGS = tuple(
+    f.name for f in fields(EnvironmentSettings) if f.type is float
+)
+
+
+def margin_price(total_cost, margin_percent: float) -> np.ndarray:
+    """Lowest sale price that earns ``margin_percent``; NaN unless 0 <= margin < 100."""
+    total_cost = np.asarray(total_cost, dtype=np.float64)
+    if not 0 <= margin_percent < 100:
+        return np.full(total_cost.shape, np.nan)
+    return total_cost / (1.0 - margin_percent / 100.0)
+
+
+def cost_budget(sale_price, margin_percent: float) -> np.ndarray:
+    """Highest total cost at which ``sale_price`` still earns ``margin_percent``."""
+    return np.asarray(sale_price, dtype=np.float64) * (1.0 - margin_percent / 100.0)
+
+
+def _largest_within(budget: np.ndarray, fixed: np.ndarray, slope: np.ndarray) -> np.ndarray:
+    """Largest ``x >= 0`` with ``fixed + slope * x <= budget``.
+
+    ``inf`` when cost does not grow with ``x`` and is within budget, NaN
+    when even ``x = 0`` is over budget.
+    """
+    fixed, slope = np.broadcast_arrays(fixed, slope)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        largest = np.where(slope > 0, (budget - fixed) / slope, np.inf)
+    largest[~(fixed <= budget)] = np.nan
+    return largest
+
+
+def max_setting(
+    env: EnvironmentSettings, quantities: CostQuantities, setting: str, budget
+) -> np.ndarray:
+    """Largest value of one setting that keeps each model's cost within ``budget``.
+
+    Total cost is affine in every ``LINEAR_SETTINGS`` entry, so its value
+    with the setting at 0 and its slope per unit come from two evaluations
+    of ``cost_coefficients`` and the quantity matrix.
+    """
+    if setting not in LINEAR_SETTINGS:
+        raise ValueError(
+            f"Cost is not linear in {setting!r}; use one of {', '.join(LINEAR_SETTINGS)}"
+        )
+    at_zero = cost_coefficients(replace(env, **{setting: 0.0}))
+    per_unit = cost_coefficients(replace(env, **{setting: 1.0})) - at_zero
+    return _largest_within(
+        budget, quantities.matrix @ at_zero, quantities.matrix @ per_unit
+    )
+
+
+def max_quantity(
+    env: EnvironmentSettings, quantities: CostQuantities, column: str, budget
+) -> np.ndarray:
+    """Largest value of one ``QUANTITY_COLUMNS`` entry per model within ``budget``.
+
+    E.g. ``"print_time_hours"`` gives the longest print each model can take.
+    """
+    j = QUANTITY_COLUMNS.index(column)
+    coefficients = cost_coefficients(env)
+    fixed = quantities.matrix @ coefficients - quantities.matrix[:, j] * coefficients[j]
+    return _largest_within(budget, fixed, coefficients[j])
+
+
+if __name__ == "__main__":
+    from cli import main
+
+    raise SystemExit(main())
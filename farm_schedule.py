@@ -0,0 +1,412 @@
+# farm_schedule.py - Queue a portfolio's jobs on a printer farm
+
+import heapq
+import itertools
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from cost_model import CostQuantities, EnvironmentSettings
+from instrumentation import stage
+
+
+@dataclass
+class FarmConfig:
+    """Farm layout and search budget.
+
+    Operators are on duty for ``shift_hours`` at the start of every 24 hours
+    (24 = always staffed). Times are hours from the start of the first
+    shift. Jobs still printing at ``horizon_hours`` are reported as late.
+    Reordering queues to save plate changes may lengthen the makespan by
+    up to ``makespan_slack`` (0.01 = 1%).
+    """
+    printers: int = 10
+    shift_hours: float = 24.0
+    horizon_hours: float | None = None
+    makespan_slack: float = 0.01
+    time_limit_seconds: float = 2.0
+
+    def __post_init__(self):
+        if self.printers < 1:
+            raise ValueError("A farm needs at least one printer")
+        if not 0 < self.shift_hours <= 24:
+            raise ValueError("Shift hours must be between 0 and 24")
+
+
+class _Printer:
+    """One printer's queue and where it stands after the last queued job.
+
+    The stacker holds ``capacity`` plates (one without automation). Each
+    operator visit loads the next plates in the queue; a visit that loads
+    no job's first plate is a plate change; the others are covered by that
+    job's prep time.
+    """
+    __slots__ = ("jobs", "end", "slots", "has_start", "visits", "changes", "idle")
+
+    def __init__(self):
+        self.jobs = []
+        self.end = 0.0
+        self.slots = 0
+        self.has_start = True
+        self.visits = 0
+        self.changes = 0
+        self.idle = 0.0
+
+    def copy(self, jobs: bool = True) -> "_Printer":
+        other = _Printer.__new__(_Printer)
+        other.jobs = self.jobs.copy() if jobs else []
+        other.end = self.end
+        other.slots = self.slots
+        other.has_start = self.has_start
+        other.visits = self.visits
+        other.changes = self.changes
+        other.idle = self.idle
+        return other
+
+
+class _Farm:
+    """Per-job plates and plate times plus the rules for running a queue."""
+
+    def __init__(self, env: EnvironmentSettings, quantities: CostQuantities, config: FarmConfig):
+        plates = np.maximum(quantities.plate_count, 1)
+        self.job_hours = quantities.matrix[:, 1]
+        self.plates = plates.tolist()
+        self.plate_hours = (self.job_hours / plates).tolist()
+        self.capacity = max(int(env.automated_plate_capacity), 1) if env.has_automation else 1
+        self.visit_hours = env.plate_change_time_minutes / 60.0
+        self.shift_hours = config.shift_hours
+
+    def on_shift(self, t: float) -> float:
+        """The earliest time from ``t`` at which an operator is on duty."""
+        if self.shift_hours >= 24:
+            return t
+        day = t // 24
+        return t if t - day * 24 < self.shift_hours else (day + 1) * 24
+
+    def append(self, printer: _Printer, job: int) -> float:
+        """Queue ``job`` on ``printer``; returns the job's start time."""
+        printer.jobs.append(job)
+        plates = self.plates[job]
+        plate_hours = self.plate_hours[job]
+        # The first plates share the last visit's load when it has room
+        shared = min(printer.slots, plates)
+        if shared:
+            start = printer.end
+            if not printer.has_start:
+                printer.has_start = True
+                printer.changes -= 1
+            printer.end += shared * plate_hours
+            printer.slots -= shared
+            plates -= shared
+        first = not shared
+        while plates:
+            visit = self.on_shift(printer.end)
+            printer.idle += visit - printer.end
+            loaded = min(self.capacity, plates)
+            if first:
+                start = visit + self.visit_hours
+            printer.end = visit + self.visit_hours + loaded * plate_hours
+            printer.slots = self.capacity - loaded
+            printer.has_start = first
+            printer.visits += 1
+            printer.changes += not first
+            first = False
+            plates -= loaded
+        return start
+
+    def run(self, jobs) -> _Printer:
+        printer = _Printer()
+        for job in jobs:
+            self.append(printer, job)
+        return printer
+
+    def resequence(self, jobs: list[int]) -> list[int]:
+        """Reorder a queue so jobs longer than the stacker start on a fresh load.
+
+        A job of ``p`` plates that starts ``offset`` plates into a load needs
+        an extra plate change when ``offset + p % capacity`` reaches the
+        capacity. Long jobs are placed best-fit on the running offset, and
+        short jobs fill the load up so the offset returns to zero.
+        """
+        capacity = self.capacity
+        long_jobs = [[] for _ in range(capacity)]
+        short_jobs = [[] for _ in range(capacity + 1)]
+        for job in reversed(jobs):
+            plates = self.plates[job]
+            if plates > capacity:
+                long_jobs[plates % capacity].append(job)
+            else:
+                short_jobs[plates].append(job)
+        remaining = sum(map(len, long_jobs))
+        order = []
+        offset = 0
+        while remaining:
+            fits = next((r for r in range(capacity - 1 - offset, -1, -1) if long_jobs[r]), None)
+            if fits is not None:
+                order.append(long_jobs[fits].pop())
+                remaining -= 1
+                offset += fits
+                continue
+            need = capacity - offset
+            filler = next((s for s in range(need, 0, -1) if short_jobs[s]), None)
+            if filler is None:
+                filler = next((s for s in range(need + 1, capacity) if short_jobs[s]), None)
+            if filler is not None:
+                order.append(short_jobs[filler].pop())
+                offset = (offset + filler) % capacity
+                continue
+            residue = next(r for r in range(capacity) if long_jobs[r])
+            order.append(long_jobs[residue].pop())
+            remaining -= 1
+            offset = (offset + residue) % capacity
+        # Smallest last, so the final job is the least likely to spill
+        for plates in range(capacity, 0, -1):
+            order.extend(reversed(short_jobs[plates]))
+        return order
+
+
+def _assign_longest_first(farm: _Farm, printers: list[_Printer], window: int = 8) -> None:
+    """List scheduling: longest job next, on the printer that frees up first.
+
+    With limited shifts the job comes from the ``window`` longest left,
+    picking the one that leaves the printer waiting least for an operator.
+    """
+    heap = [(0.0, i) for i in range(len(printers))]
+    order = np.argsort(-farm.job_hours, kind="stable").tolist()
+    if farm.shift_hours >= 24:
+        window = 1
+    pending = order[:window]
+    upcoming = iter(order[window:])
+    while pending:
+        _, i = heapq.heappop(heap)
+        printer = printers[i]
+        best = 0
+        if len(pending) > 1:
+            waits = []
+            for job in pending:
+                trial = printer.copy(jobs=False)
+                farm.append(trial, job)
+                waits.append(0.0 if trial.slots else farm.on_shift(trial.end) - trial.end)
+            best = int(np.argmin(waits))
+        farm.append(printer, pending.pop(best))
+        pending.extend(itertools.islice(upcoming, 1))
+        heapq.heappush(heap, (printer.end, i))
+
+
+def _improves(new: tuple[_Printer, _Printer], old: tuple[_Printer, _Printer]) -> bool:
+    """Lower finishing time for the pair first, then fewer plate changes."""
+    new_end, old_end = max(p.end for p in new), max(p.end for p in old)
+    if new_end < old_end - 1e-9:
+        return True
+    return new_end <= old_end + 1e-9 and sum(p.changes for p in new) < sum(
+        p.changes for p in old
+    )
+
+
+def _rebalance(farm: _Farm, printers: list[_Printer], deadline: float, tries: int = 8) -> None:
+    """Local search on the makespan.
+
+    Repeatedly moves a job off the printer that finishes last, or swaps one
+    of its jobs for a shorter one, onto the printers that finish first.
+    Candidates are the jobs closest to half the gap, so a move evens the
+    pair out.
+    """
+    hours = farm.job_hours
+    while time.perf_counter() < deadline:
+        ends = np.array([p.end for p in printers])
+        late = int(np.argmax(ends))
+        source = printers[late]
+        moved = False
+        for early in np.argsort(ends)[:3].tolist():
+            if early == late:
+                break
+            target = printers[early]
+            half_gap = (source.end - target.end) / 2
+            candidates = np.argsort(np.abs(hours[source.jobs] - half_gap))[:tries].tolist()
+            for pos in candidates:
+                rest = source.jobs[:pos] + source.jobs[pos + 1:]
+                grown = target.copy()
+                farm.append(grown, source.jobs[pos])
+                shrunk = farm.run(rest)
+                if _improves((shrunk, grown), (source, target)):
+                    printers[late], printers[early] = shrunk, grown
+                    moved = True
+                    break
+            if moved:
+                break
+            by_hours = np.argsort(hours[target.jobs], kind="stable")
+            sorted_hours = hours[target.jobs][by_hours]
+            for pos in candidates:
+                job = source.jobs[pos]
+                slot = np.searchsorted(sorted_hours, hours[job] - half_gap)
+                if slot == len(sorted_hours) or sorted_hours[slot] >= hours[job]:
+                    continue
+                other = int(by_hours[slot])
+                source_jobs, target_jobs = source.jobs.copy(), target.jobs.copy()
+                source_jobs[pos], target_jobs[other] = target_jobs[other], job
+                pair = (farm.run(source_jobs), farm.run(target_jobs))
+                if _improves(pair, (source, target)):
+                    printers[late], printers[early] = pair
+                    moved = True
+                    break
+            if moved:
+                break
+        if not moved:
+            return
+
+
+@dataclass
+class FarmSchedule:
+    """Which printer runs each job, when, and the operator work it takes.
+
+    ``plate_changes`` counts operator visits that reload a stacker without
+    starting a job; ``naive_plate_changes`` is what ``calculate_costs``
+    charges with every job alone on a printer. Prep, cleanup and remote
+    checks are the same either way.
+    """
+    printer: np.ndarray
+    position: np.ndarray
+    start_hours: np.ndarray
+    end_hours: np.ndarray
+    printer_end_hours: np.ndarray
+    visits: np.ndarray
+    plate_changes: np.ndarray
+    idle_hours: np.ndarray
+    naive_plate_changes: float
+    plate_change_cost: float
+    naive_labour_cost: float
+    lower_bound_hours: float
+    horizon_hours: float | None = None
+    seconds: float = 0.0
+
+    def __len__(self) -> int:
+        return len(self.printer)
+
+    @property
+    def makespan_hours(self) -> float:
+        return float(self.printer_end_hours.max(initial=0.0))
+
+    @property
+    def labour_cost(self) -> float:
+        saved = self.naive_plate_changes - int(self.plate_changes.sum())
+        return self.naive_labour_cost - saved * self.plate_change_cost
+
+    @property
+    def late_jobs(self) -> int:
+        if self.horizon_hours is None:
+            return 0
+        return int(np.count_nonzero(self.end_hours > self.horizon_hours))
+
+    def summary(self) -> dict:
+        return {
+            "jobs": len(self),
+            "printers": len(self.printer_end_hours),
+            "makespan_hours": self.makespan_hours,
+            "lower_bound_hours": self.lower_bound_hours,
+            "operator_visits": int(self.visits.sum()),
+            "plate_changes": int(self.plate_changes.sum()),
+            "naive_plate_changes": int(self.naive_plate_changes),
+            "labour_cost": self.labour_cost,
+            "naive_labour_cost": self.naive_labour_cost,
+            "labour_saving": self.naive_labour_cost - self.labour_cost,
+            "idle_hours": float(self.idle_hours.sum()),
+            "late_jobs": self.late_jobs,
+            "seconds": self.seconds,
+        }
+
+    def to_frame(self, model_names) -> pd.DataFrame:
+        """One row per job in printer and queue order."""
+        df = pd.DataFrame({
+            "Model": np.asarray(model_names, dtype=object),
+            "Printer": self.printer + 1,
+            "Queue": self.position + 1,
+            "Start (h)": self.start_hours,
+            "End (h)": self.end_hours,
+        })
+        return df.sort_values(["Printer", "Queue"], kind="stable", ignore_index=True)
+
+    def printer_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            "Printer": np.arange(1, len(self.printer_end_hours) + 1),
+            "Jobs": np.bincount(self.printer, minlength=len(self.printer_end_hours)),
+            "Busy until (h)": self.printer_end_hours,
+            "Operator visits": self.visits,
+            "Plate changes": self.plate_changes,
+            "Waiting for operator (h)": self.idle_hours,
+        })
+
+
+def schedule_farm(
+    env: EnvironmentSettings, quantities: CostQuantities, config: FarmConfig
+) -> FarmSchedule:
+    """Assign every job to one of ``config.printers`` identical printers.
+
+    Longest-first list scheduling gives the starting point; a time-limited
+    local search then shortens the makespan, and each printer's queue is
+    reordered to cut plate changes where that keeps it within
+    ``config.makespan_slack`` of the makespan.
+    """
+    with stage("schedule", len(quantities)):
+        return _schedule(env, quantities.with_plate_policy(env), config)
+
+
+def _schedule(
+    env: EnvironmentSettings, quantities: CostQuantities, config: FarmConfig
+) -> FarmSchedule:
+    start = time.perf_counter()
+    farm = _Farm(env, quantities, config)
+    printers = [_Printer() for _ in range(config.printers)]
+    _assign_longest_first(farm, printers)
+    _rebalance(farm, printers, start + config.time_limit_seconds)
+
+    latest = max(p.end for p in printers) * (1.0 + config.makespan_slack) + 1e-9
+    if farm.capacity > 1:
+        for i, printer in enumerate(printers):
+            candidate = farm.run(farm.resequence(printer.jobs))
+            if candidate.changes < printer.changes and candidate.end <= latest:
+                printers[i] = candidate
+
+    n = len(quantities)
+    assigned = np.empty(n, dtype=np.int64)
+    position = np.empty(n, dtype=np.int64)
+    start_hours = np.empty(n)
+    end_hours = np.empty(n)
+    for i, printer in enumerate(printers):
+        replay = _Printer()
+        for pos, job in enumerate(printer.jobs):
+            start_hours[job] = farm.append(replay, job)
+            end_hours[job] = replay.end
+            assigned[job] = i
+            position[job] = pos
+
+    labour_per_minute = env.labour_rate_per_hour / 60.0
+    labour = quantities.matrix @ np.array([
+        0.0,
+        env.remote_check_minutes_per_hour * labour_per_minute,
+        env.plate_change_time_minutes * labour_per_minute,
+        (env.prep_time_minutes + env.cleanup_time_minutes) * labour_per_minute,
+    ])
+    # Every plate is loaded by some visit, and a visit loads at most a stacker
+    visits = -(-int(np.maximum(quantities.plate_count, 1).sum()) // farm.capacity)
+    work = farm.job_hours.sum() + visits * farm.visit_hours
+    return FarmSchedule(
+        printer=assigned,
+        position=position,
+        start_hours=start_hours,
+        end_hours=end_hours,
+        printer_end_hours=np.array([p.end for p in printers]),
+        visits=np.array([p.visits for p in printers], dtype=np.int64),
+        plate_changes=np.array([p.changes for p in printers], dtype=np.int64),
+        idle_hours=np.array([p.idle for p in printers]),
+        naive_plate_changes=float(quantities.matrix[:, 2].sum()),
+        plate_change_cost=env.plate_change_time_minutes * labour_per_minute,
+        naive_labour_cost=float(labour.sum()),
+        lower_bound_hours=float(max(
+            work / config.printers,
+            farm.job_hours.max(initial=0.0) + farm.visit_hours if n else 0.0,
+        )),
+        horizon_hours=config.horizon_hours,
+        seconds=time.perf_counter() - start,
+    )
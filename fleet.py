@@ -0,0 +1,198 @@
+# fleet.py - Evaluate a portfolio against many named environment profiles
+
+import json
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from cost_model import (
+    STATUS_LABELS,
+    CostQuantities,
+    EnvironmentSettings,
+    classify_batch,
+    cost_coefficients,
+)
+from portfolio import environment_from_settings
+
+
+Profile = tuple[EnvironmentSettings, float]
+
+
+def load_fleet(path: str) -> dict[str, Profile]:
+    """Named printer/site profiles from a JSON object of settings objects.
+
+    Each profile overrides the app defaults, like ``--env`` files do.
+    """
+    with open(path, encoding="utf-8") as fh:
+        raw = json.load(fh)
+    if not isinstance(raw, dict) or not raw:
+        raise ValueError("Fleet file must map profile names to settings")
+    return {str(name): environment_from_settings(settings) for name, settings in raw.items()}
+
+
+@dataclass
+class FleetTotals:
+    """Per-profile totals, additive across portfolio chunks.
+
+    ``total_profit`` and ``status_counts`` assume every model is printed on
+    that profile; ``assigned`` counts the models for which it is the best.
+    """
+    profile_names: tuple[str, ...]
+    assigned: np.ndarray
+    total_profit: np.ndarray
+    status_counts: np.ndarray
+    best_total_profit: float = 0.0
+    rows: int = 0
+
+    @classmethod
+    def empty(cls, profile_names) -> "FleetTotals":
+        n = len(profile_names)
+        return cls(
+            tuple(profile_names),
+            np.zeros(n, dtype=np.int64),
+            np.zeros(n),
+            np.zeros((n, len(STATUS_LABELS)), dtype=np.int64),
+        )
+
+    def merge(self, other: "FleetTotals") -> "FleetTotals":
+        if other.profile_names != self.profile_names:
+            raise ValueError("Cannot merge totals for different fleets")
+        return FleetTotals(
+            self.profile_names,
+            self.assigned + other.assigned,
+            self.total_profit + other.total_profit,
+            self.status_counts + other.status_counts,
+            self.best_total_profit + other.best_total_profit,
+            self.rows + other.rows,
+        )
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per profile, best-assignment count first."""
+        df = pd.DataFrame({
+            "Profile": self.profile_names,
+            "Best for (models)": self.assigned,
+            "Total profit ($)": self.total_profit,
+        })
+        for i, status in enumerate(STATUS_LABELS):
+            df[status] = self.status_counts[:, i]
+        return df
+
+
+@dataclass
+class FleetResult:
+    """Cost of every model under every profile.
+
+    ``total_cost`` has one row per model and one column per profile, so a
+    model's costs across the fleet are contiguous. Sale prices do not depend
+    on the profile, so the cheapest profile (``best``) is also the most
+    profitable one.
+    """
+    profile_names: tuple[str, ...]
+    healthy_floors: np.ndarray
+    sale_price: np.ndarray
+    total_cost: np.ndarray
+    best: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.sale_price)
+
+    @property
+    def profit(self) -> np.ndarray:
+        return self.sale_price[:, None] - self.total_cost
+
+    @property
+    def best_cost(self) -> np.ndarray:
+        return np.take_along_axis(self.total_cost, self.best[:, None], axis=1)[:, 0]
+
+    def status_codes(self) -> np.ndarray:
+        """``(models, profiles)`` indices into ``STATUS_LABELS``."""
+        codes = np.empty(self.total_cost.shape, dtype=np.int8)
+        sale_price = self.sale_price[:, None]
+        for floor in np.unique(self.healthy_floors):
+            cols = np.flatnonzero(self.healthy_floors == floor)
+            codes[:, cols] = classify_batch(sale_price, self.total_cost[:, cols], floor)
+        return codes
+
+    def totals(self) -> FleetTotals:
+        codes = self.status_codes()
+        counts = np.stack([
+            np.count_nonzero(codes == code, axis=0) for code in range(len(STATUS_LABELS))
+        ], axis=1)
+        return FleetTotals(
+            profile_names=self.profile_names,
+            assigned=np.bincount(self.best, minlength=len(self.profile_names)),
+            total_profit=self.sale_price.sum() - self.total_cost.sum(axis=0),
+            status_counts=counts,
+            best_total_profit=float(self.sale_price.sum() - self.best_cost.sum()),
+            rows=len(self),
+        )
+
+    def to_frame(self, model_names, matrix: bool = False) -> pd.DataFrame:
+        """Best assignment per model, plus every profile's profit if ``matrix``.
+
+        ``Next best`` is the second-cheapest profile and ``Saving ($)`` how
+        much the best one saves over it.
+        """
+        names = np.asarray(self.profile_names, dtype=object)
+        cost = self.best_cost
+        profit = self.sale_price - cost
+        if len(self.profile_names) > 1:
+            runner_up = np.argpartition(self.total_cost, 1, axis=1)[:, :2]
+            ties = runner_up[:, 0] != self.best
+            next_best = np.where(ties, runner_up[:, 0], runner_up[:, 1])
+            next_cost = np.take_along_axis(self.total_cost, next_best[:, None], axis=1)[:, 0]
+            next_names = names[next_best]
+        else:
+            next_cost = np.full(len(self), np.nan)
+            next_names = np.full(len(self), "", dtype=object)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            margin = np.where(self.sale_price > 0, profit / self.sale_price * 100.0, np.nan)
+
+        df = pd.DataFrame({
+            "Model": np.asarray(model_names, dtype=object),
+            "Sale ($)": self.sale_price,
+            "Best profile": names[self.best],
+            "Cost ($)": cost,
+            "Profit ($)": profit,
+            "Margin (%)": margin,
+            "Next best": next_names,
+            "Saving ($)": next_cost - cost,
+        })
+        if matrix:
+            profits = pd.DataFrame(
+                self.profit, columns=[f"Profit: {name}" for name in self.profile_names]
+            )
+            df = pd.concat([df, profits], axis=1)
+        return df
+
+
+def evaluate_fleet(profiles: dict[str, Profile], quantities: CostQuantities) -> FleetResult:
+    """Cost every model under every profile.
+
+    Profiles that share an automation setup share a plate-change column,
+    so each such group is one matrix product of the quantity matrix with
+    the group's stacked cost coefficients.
+    """
+    if not profiles:
+        raise ValueError("At least one profile is needed")
+    names = tuple(profiles)
+    envs = [env for env, _ in profiles.values()]
+    total_cost = np.empty((len(quantities), len(names)))
+
+    groups: dict[tuple[bool, int], list[int]] = {}
+    for i, env in enumerate(envs):
+        policy = (bool(env.has_automation), int(env.automated_plate_capacity))
+        groups.setdefault(policy, []).append(i)
+    for cols in groups.values():
+        group_quantities = quantities.with_plate_policy(envs[cols[0]])
+        coefficients = np.column_stack([cost_coefficients(envs[i]) for i in cols])
+        total_cost[:, cols] = group_quantities.matrix @ coefficients
+
+    return FleetResult(
+        profile_names=names,
+        healthy_floors=np.array([floor for _, floor in profiles.values()], dtype=np.float64),
+        sale_price=quantities.sale_price,
+        total_cost=total_cost,
+        best=np.argmin(total_cost, axis=1) if len(names) else np.empty(0, np.int64),
+    )
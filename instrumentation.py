@@ -0,0 +1,152 @@
+# instrumentation.py - Opt-in stage timings for portfolio analysis
+
+import json
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+
+import pandas as pd
+
+# Stages recorded by the portfolio path, in pipeline order
+STAGES = ("read", "validate", "cost", "classify", "aggregate", "render", "export")
+
+_recorder: ContextVar["Recorder | None"] = ContextVar("recorder", default=None)
+
+
+@dataclass
+class StageTiming:
+    stage: str
+    calls: int = 0
+    rows: int = 0
+    seconds: float = 0.0
+
+
+class Recorder:
+    """Wall time and rows per stage, plus plain call counters.
+
+    A stage entered while it is already running (e.g. aggregation calling
+    into another aggregation) is counted once, by the outermost call.
+    """
+
+    def __init__(self):
+        self.stages: dict[str, StageTiming] = {}
+        self.counters: dict[str, int] = {}
+        self._running: set[str] = set()
+
+    def add(self, name: str, seconds: float, rows: int = 0, calls: int = 1) -> None:
+        timing = self.stages.get(name)
+        if timing is None:
+            timing = self.stages[name] = StageTiming(name)
+        timing.calls += calls
+        timing.rows += rows
+        timing.seconds += seconds
+
+    def merge(self, other: "Recorder") -> None:
+        for timing in other.stages.values():
+            self.add(timing.stage, timing.seconds, timing.rows, timing.calls)
+        for name, calls in other.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + calls
+
+    def __bool__(self) -> bool:
+        return bool(self.stages or self.counters)
+
+    def records(self) -> list[dict]:
+        """Stages in pipeline order, then counters, as JSON-ready dicts."""
+        order = {name: i for i, name in enumerate(STAGES)}
+        stages = sorted(self.stages.values(), key=lambda t: order.get(t.stage, len(order)))
+        return [asdict(timing) for timing in stages] + [
+            {"counter": name, "calls": calls} for name, calls in self.counters.items()
+        ]
+
+    def write_jsonl(self, stream, **fields) -> None:
+        """One JSON object per line, each tagged with ``fields``."""
+        for record in self.records():
+            stream.write(json.dumps({**fields, **record}) + "\n")
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per stage and counter, for display."""
+        rows = [
+            {
+                "Stage": timing.stage,
+                "Calls": timing.calls,
+                "Rows": timing.rows,
+                "ms": timing.seconds * 1000.0,
+                "Rows/sec": timing.rows / timing.seconds if timing.seconds > 0 else None,
+            }
+            for timing in (StageTiming(**r) for r in self.records() if "stage" in r)
+        ]
+        rows += [
+            {"Stage": name, "Calls": calls, "Rows": None, "ms": None, "Rows/sec": None}
+            for name, calls in self.counters.items()
+        ]
+        return pd.DataFrame(rows, columns=["Stage", "Calls", "Rows", "ms", "Rows/sec"])
+
+
+@contextmanager
+def recording():
+    """Record stages run in this context; nested recordings also feed the outer one."""
+    recorder = Recorder()
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+        outer = _recorder.get()
+        if outer is not None:
+            outer.merge(recorder)
+
+
+class stage:
+    """Time a block as ``name``; a no-op unless a recording is active.
+
+    Set ``rows`` on the returned object when the row count is only known
+    inside the block.
+    """
+    __slots__ = ("name", "rows", "_recorder", "_start")
+
+    def __init__(self, name: str, rows: int = 0):
+        self.name = name
+        self.rows = rows
+        self._recorder = _recorder.get()
+
+    def __enter__(self) -> "stage":
+        recorder = self._recorder
+        if recorder is not None:
+            if self.name in recorder._running:
+                self._recorder = None
+            else:
+                recorder._running.add(self.name)
+                self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        recorder = self._recorder
+        if recorder is not None:
+            recorder._running.discard(self.name)
+            recorder.add(self.name, time.perf_counter() - self._start, self.rows)
+
+
+def staged(name: str, chunks):
+    """Yield from ``chunks``, timing how long each chunk takes to produce."""
+    chunks = iter(chunks)
+    while True:
+        recorder = _recorder.get()
+        start = time.perf_counter()
+        chunk = next(chunks, None)
+        if chunk is None:
+            return
+        if recorder is not None:
+            recorder.add(name, time.perf_counter() - start, len(chunk))
+        yield chunk
+
+
+def count(name: str, calls: int = 1) -> None:
+    """Bump a call counter; a no-op unless a recording is active."""
+    recorder = _recorder.get()
+    if recorder is not None:
+        recorder.counters[name] = recorder.counters.get(name, 0) + calls
+
+
+def current_recorder() -> Recorder | None:
+    return _recorder.get()
@@ -0,0 +1,156 @@
+# monte_carlo.py - Uncertainty in slicer estimates and failed prints
+
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from cost_model import (
+    STATUS_LABELS,
+    EnvironmentSettings,
+    cost_coefficients,
+    precompute_quantities,
+)
+
+
+DISTRIBUTION_KINDS = ("fixed", "normal", "lognormal", "uniform", "triangular")
+
+
+@dataclass
+class Distribution:
+    """Multiplicative error on a slicer estimate.
+
+    ``bias`` shifts the mean factor (0.05 = estimates run 5% low) and
+    ``spread`` is the relative spread: the standard deviation for normal and
+    lognormal, the half-width for uniform and triangular.
+    """
+    kind: str = "normal"
+    spread: float = 0.10
+    bias: float = 0.0
+
+    def __post_init__(self):
+        if self.kind not in DISTRIBUTION_KINDS:
+            raise ValueError(f"Unknown distribution: {self.kind}")
+
+    def sample(self, rng: np.random.Generator, shape) -> np.ndarray:
+        centre = 1.0 + self.bias
+        if self.kind == "fixed" or self.spread == 0:
+            return np.full(shape, centre)
+        if self.kind == "normal":
+            factors = rng.normal(centre, self.spread, shape)
+        elif self.kind == "lognormal":
+            sigma = self.spread
+            factors = rng.lognormal(np.log(centre) - sigma**2 / 2, sigma, shape)
+        elif self.kind == "uniform":
+            factors = rng.uniform(centre - self.spread, centre + self.spread, shape)
+        else:
+            factors = rng.triangular(
+                centre - self.spread, centre, centre + self.spread, shape
+            )
+        return np.maximum(factors, 0.0)
+
+
+@dataclass
+class MonteCarloConfig:
+    """Simulation settings.
+
+    Each failed attempt (probability ``failure_rate`` per attempt) wastes
+    ``failure_waste_fraction`` of the job's filament and print time and
+    repeats the prep and cleanup work before the reprint.
+    """
+    filament: Distribution = field(
+        default_factory=lambda: Distribution("normal", 0.05)
+    )
+    print_time: Distribution = field(
+        default_factory=lambda: Distribution("normal", 0.10)
+    )
+    failure_rate: float = 0.0
+    failure_waste_fraction: float = 0.5
+    samples: int = 10_000
+    seed: int | None = 0
+    chunk_cells: int = 4_000_000
+
+
+PERCENTILES = (10, 50, 90)
+
+
+def simulate(
+    env: EnvironmentSettings,
+    frame_or_arrays,
+    config: MonteCarloConfig,
+    healthy_floor: float,
+) -> pd.DataFrame:
+    """Per-model cost/profit/margin percentiles and status probabilities.
+
+    One set of ``config.samples`` error factors and failure counts is drawn
+    and shared by every model (common random numbers): per-model statistics
+    are exact marginals, but samples are not independent across models, so
+    do not sum them into portfolio totals. Models are processed in chunks of
+    ``config.chunk_cells // config.samples`` rows so memory stays bounded.
+    Profit and margin are monotone in cost, so their percentiles follow from
+    the cost percentiles, and a status probability is the share of samples
+    whose cost falls in that status band.
+    """
+    if not 0 <= config.failure_rate < 1:
+        raise ValueError("failure_rate must be in [0, 1)")
+
+    quantities = precompute_quantities(env, frame_or_arrays)
+    coefficients = cost_coefficients(env)
+    sale_price = quantities.sale_price
+    n_models = len(quantities)
+    rows_per_chunk = max(1, config.chunk_cells // config.samples)
+
+    rng = np.random.default_rng(config.seed)
+    if config.failure_rate > 0:
+        failures = rng.geometric(1.0 - config.failure_rate, config.samples) - 1.0
+    else:
+        failures = np.zeros(config.samples)
+    attempt_factor = 1.0 + failures * config.failure_waste_fraction
+    filament_factor = config.filament.sample(rng, config.samples) * attempt_factor
+    time_factor = config.print_time.sample(rng, config.samples) * attempt_factor
+    job_cost = (1.0 + failures) * coefficients[3]
+
+    healthy_factor = (
+        1.0 - healthy_floor / 100.0 if 0 < healthy_floor < 100 else None
+    )
+    cost_pct = np.empty((n_models, len(PERCENTILES)))
+    status_prob = np.zeros((n_models, len(STATUS_LABELS)))
+
+    for start in range(0, n_models, rows_per_chunk):
+        rows = slice(start, min(start + rows_per_chunk, n_models))
+        matrix = quantities.matrix[rows]
+
+        cost = np.multiply.outer(matrix[:, 0] * coefficients[0], filament_factor)
+        cost += np.multiply.outer(matrix[:, 1] * coefficients[1], time_factor)
+        cost += (matrix[:, 2] * coefficients[2])[:, None]
+        cost += job_cost
+
+        cost_pct[rows] = np.percentile(cost, PERCENTILES, axis=1).T
+
+        sale = sale_price[rows, None]
+        losing = np.count_nonzero(sale < cost, axis=1) / config.samples
+        status_prob[rows, 0] = losing
+        if healthy_factor is None:
+            status_prob[rows, 3] = 1.0 - losing
+        else:
+            healthy = np.count_nonzero(sale * healthy_factor >= cost, axis=1)
+            healthy = healthy / config.samples
+            status_prob[rows, 2] = healthy
+            status_prob[rows, 1] = 1.0 - losing - healthy
+
+    # Profit/margin fall as cost rises: P10 profit comes from P90 cost
+    profit_pct = sale_price[:, None] - cost_pct[:, ::-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        margin_pct = np.where(
+            sale_price[:, None] > 0, profit_pct / sale_price[:, None] * 100.0, np.nan
+        )
+
+    columns = {}
+    for metric, values in (
+        ("cost", cost_pct), ("profit", profit_pct), ("margin", margin_pct)
+    ):
+        for i, p in enumerate(PERCENTILES):
+            columns[f"{metric}_p{p}"] = values[:, i]
+    for i, status in enumerate(STATUS_LABELS):
+        columns[f"p_{status.lower().replace(' ', '_')}"] = status_prob[:, i]
+    return pd.DataFrame(columns, index=getattr(frame_or_arrays, "index", None))
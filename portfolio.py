@@ -0,0 +1,1244 @@
+# portfolio.py - Portfolio evaluation shared by the app and the CLI
+
+import csv
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field, fields, replace
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+import xlsxwriter
+
+from catalog_index import CatalogIndex, CatalogQuery
+from cost_model import (
+    DEFAULT_SETTINGS,
+    STATUS_LABELS,
+    CostBreakdownBatch,
+    STATUS_LOSING,
+    CostQuantities,
+    EnvironmentSettings,
+    breakdown_from_quantities,
+    calculate_costs_batch,
+    classify_batch,
+    cost_budget,
+    margin_price,
+    max_quantity,
+    max_setting,
+    precompute_quantities,
+    status_labels,
+)
+from instrumentation import current_recorder, recording, stage, staged
+
+
+REQUIRED_COLUMNS = (
+    "model_name",
+    "filament_grams",
+    "print_time_hours",
+    "plate_count",
+    "sale_price",
+)
+INPUT_COLUMNS = REQUIRED_COLUMNS + ("reference_url",)
+NUMERIC_COLUMNS = tuple(col for col in REQUIRED_COLUMNS if col != "model_name")
+REJECT_COLUMNS = ("Row", "Column", "Value", "Reason")
+
+DEFAULT_CHUNK_ROWS = 100_000
+
+# Models kept in each best/worst ranking of ``PortfolioInsights``
+DEFAULT_TOP_K = 5
+
+# File suffix -> portfolio/report format; anything else is read as CSV
+FILE_FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather",
+    ".ipc": "feather",
+    ".xlsx": "xlsx",
+}
+# Formats that can only be written, not read as a portfolio
+REPORT_ONLY_FORMATS = ("xlsx",)
+FORMAT_MIME_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "feather": "application/vnd.apache.arrow.file",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Rows per XLSX worksheet, including the header; longer reports continue
+# on further sheets
+XLSX_SHEET_ROWS = 1_048_576
+
+
+def environment_from_settings(settings: dict) -> tuple[EnvironmentSettings, float]:
+    """Build environment settings and the healthy margin floor from a mapping.
+
+    Keys mirror the sidebar settings; anything missing falls back to the
+    app defaults. Returns ``(env, healthy_margin_floor_percent)``.
+    """
+    settings = {**DEFAULT_SETTINGS, **settings}
+    env_fields = {f.name for f in fields(EnvironmentSettings)}
+    unknown = set(settings) - env_fields - {"healthy_margin_floor_percent"}
+    if unknown:
+        raise ValueError(f"Unknown environment settings: {', '.join(sorted(unknown))}")
+
+    env = EnvironmentSettings(**{k: v for k, v in settings.items() if k in env_fields})
+    return env, float(settings["healthy_margin_floor_percent"])
+
+
+def load_environment(path: str | None) -> tuple[EnvironmentSettings, float]:
+    """Load environment settings and the healthy margin floor from JSON."""
+    if path is None:
+        return environment_from_settings({})
+    with open(path, encoding="utf-8") as fh:
+        return environment_from_settings(json.load(fh))
+
+
+REPORT_COLUMNS = (
+    "Model",
+    "URL",
+    "Filament (g)",
+    "Time (h)",
+    "Plates",
+    "Sale ($)",
+    "Cost ($)",
+    "Profit ($)",
+    "Margin (%)",
+    "$/hour",
+    "Remote",
+    "Status",
+)
+# Report columns added by solve_thresholds
+THRESHOLD_COLUMNS = (
+    "Target price ($)",
+    "Max filament ($/kg)",
+    "Max labour ($/h)",
+    "Max print time (h)",
+)
+# Report columns copied from the inputs: column name and dtype
+_REPORT_INPUTS = {
+    "Filament (g)": ("filament_grams", np.float64),
+    "Time (h)": ("print_time_hours", np.float64),
+    "Plates": ("plate_count", int),
+    "Sale ($)": ("sale_price", np.float64),
+}
+
+# Rows per page of the results table
+DEFAULT_PAGE_SIZE = 50
+
+
+@dataclass
+class PortfolioResults:
+    """Columnar results of a portfolio evaluation.
+
+    ``inputs`` holds the uploaded columns, ``breakdown`` the cost fields and
+    ``status_codes`` indices into ``STATUS_LABELS``, all row-aligned.
+    ``thresholds`` holds one row per ``THRESHOLD_COLUMNS`` entry once
+    ``solve_thresholds`` has run. ``to_frame`` builds the report table shown
+    in the app and exported.
+    """
+    inputs: pd.DataFrame
+    breakdown: CostBreakdownBatch
+    status_codes: np.ndarray
+    thresholds: np.ndarray | None = None
+
+    @classmethod
+    def classify(
+        cls, inputs: pd.DataFrame, breakdown: CostBreakdownBatch, healthy_floor: float
+    ) -> "PortfolioResults":
+        with stage("classify", len(breakdown)):
+            status_codes = classify_batch(
+                inputs["sale_price"].to_numpy(dtype=np.float64),
+                breakdown.total_cost,
+                healthy_floor,
+            )
+        return cls(inputs.reset_index(drop=True), breakdown, status_codes)
+
+    def __len__(self) -> int:
+        return len(self.breakdown)
+
+    @property
+    def columns(self) -> tuple[str, ...]:
+        """Report columns, including the thresholds once solved."""
+        if self.thresholds is None:
+            return REPORT_COLUMNS
+        return REPORT_COLUMNS + THRESHOLD_COLUMNS
+
+    @property
+    def model_names(self) -> np.ndarray:
+        return self.inputs["model_name"].astype(str).to_numpy()
+
+    @property
+    def status(self) -> np.ndarray:
+        return status_labels(self.status_codes)
+
+    @property
+    def profit_per_hour(self) -> np.ndarray:
+        print_time_hours = self.inputs["print_time_hours"].to_numpy(dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(
+                print_time_hours > 0, self.breakdown.profit / print_time_hours, 0.0
+            )
+
+    def iter_frames(self, chunk_rows: int = DEFAULT_CHUNK_ROWS):
+        """Yield ``to_frame`` for consecutive row ranges of the results."""
+        for start in range(0, len(self), chunk_rows):
+            yield self.take(slice(start, start + chunk_rows)).to_frame()
+
+    def take(self, rows: np.ndarray) -> "PortfolioResults":
+        """Results for the row positions in ``rows``, in that order."""
+        breakdown = CostBreakdownBatch(
+            self.breakdown.values[:, rows], self.breakdown.remote_friendly[rows]
+        )
+        return PortfolioResults(
+            self.inputs.iloc[rows].reset_index(drop=True),
+            breakdown,
+            self.status_codes[rows],
+            None if self.thresholds is None else self.thresholds[:, rows],
+        )
+
+    def report_column(self, name: str) -> np.ndarray:
+        """One column of the report table, built from the result arrays."""
+        inputs = self.inputs
+        if name == "Model":
+            return self.model_names
+        if name == "URL":
+            if "reference_url" not in inputs:
+                return np.full(len(self), "")
+            return inputs["reference_url"].fillna("").astype(str).to_numpy()
+        if name in _REPORT_INPUTS:
+            column, dtype = _REPORT_INPUTS[name]
+            return inputs[column].to_numpy().astype(dtype)
+        if name == "Cost ($)":
+            return self.breakdown.total_cost
+        if name == "Profit ($)":
+            return self.breakdown.profit
+        if name == "Margin (%)":
+            return self.breakdown.profit_margin_percent
+        if name == "$/hour":
+            return self.profit_per_hour
+        if name == "Remote":
+            return np.where(self.breakdown.remote_friendly, "✅", "❌")
+        if name == "Status":
+            return self.status
+        if name in THRESHOLD_COLUMNS and self.thresholds is not None:
+            return self.thresholds[THRESHOLD_COLUMNS.index(name)]
+        raise KeyError(name)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Report columns shown in the portfolio tab and written by exports."""
+        with stage("render", len(self)):
+            return pd.DataFrame(
+                {name: self.report_column(name) for name in self.columns}, copy=False
+            )
+
+
+@dataclass
+class ResultsPage:
+    """One page of filtered, sorted results.
+
+    ``rows`` are positions in the full results and ``status_codes`` the
+    statuses of the page rows, for colouring without reading labels back.
+    """
+    frame: pd.DataFrame
+    rows: np.ndarray
+    status_codes: np.ndarray
+    matches: int
+    page: int
+    pages: int
+
+
+def page_results(
+    results: PortfolioResults,
+    statuses=None,
+    min_margin: float | None = None,
+    max_margin: float | None = None,
+    search: str = "",
+    sort_by: str | None = None,
+    descending: bool = False,
+    page: int = 0,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    query: CatalogQuery | None = None,
+    index: CatalogIndex | None = None,
+) -> ResultsPage:
+    """Filter and sort the results, building the report frame for one page only.
+
+    Filters combine: ``statuses`` are ``STATUS_LABELS``, the margin range is
+    inclusive (rows without a margin are dropped when it is set),
+    ``search`` is a case-insensitive substring of the model name and
+    ``query`` adds any further conditions. With an ``index`` over
+    ``results`` the filters are answered from it instead of scanning every
+    row. Sorting is stable, keeps rows without a value last and orders
+    ``Status`` from losing to profitable. ``page`` counts from 0 and is
+    clamped to the last page.
+    """
+    filters = CatalogQuery() if query is None else query
+    if statuses:
+        filters = filters.with_status(*statuses)
+    if min_margin is not None or max_margin is not None:
+        filters = filters.where("Margin (%)", min_margin, max_margin)
+    if search:
+        filters = filters.containing(search)
+    if index is not None:
+        matched = index.select(filters)
+    else:
+        matched = np.flatnonzero(filters.mask(results))
+
+    if sort_by is not None:
+        key = (
+            results.status_codes if sort_by == "Status" else results.report_column(sort_by)
+        )[matched]
+        if descending:
+            # Negated ranks keep ties in their original order
+            if key.dtype.kind != "f":
+                key = np.unique(key, return_inverse=True)[1]
+            key = -key
+        matched = matched[np.argsort(key, kind="stable")]
+
+    pages = max(1, -(-len(matched) // page_size))
+    page = min(max(page, 0), pages - 1)
+    rows = matched[page * page_size:(page + 1) * page_size]
+    subset = results.take(rows)
+    return ResultsPage(
+        frame=subset.to_frame(),
+        rows=rows,
+        status_codes=subset.status_codes,
+        matches=len(matched),
+        page=page,
+        pages=pages,
+    )
+
+
+def evaluate_portfolio(
+    env_settings: EnvironmentSettings, df: pd.DataFrame, healthy_floor: float
+) -> PortfolioResults:
+    """Cost and classify every row of a portfolio frame in one batch."""
+    with stage("cost", len(df)):
+        breakdown = calculate_costs_batch(env_settings, df)
+    return PortfolioResults.classify(df, breakdown, healthy_floor)
+
+
+def solve_thresholds(
+    env_settings: EnvironmentSettings,
+    results: PortfolioResults,
+    healthy_floor: float,
+    target_margin: float | None = None,
+) -> PortfolioResults:
+    """``results`` with the ``THRESHOLD_COLUMNS`` added to the report.
+
+    The target price is the lowest sale price earning ``target_margin``
+    (default: the healthy floor). The filament price and labour rate are the
+    highest at which each model is still Healthy at its sale price, and the
+    print time the longest before it loses money. Each is a closed-form
+    inversion of the linear cost model, so the whole portfolio is solved at
+    once. Values are NaN where no value works and inf where any does.
+    """
+    if target_margin is None:
+        target_margin = healthy_floor
+    with stage("cost", len(results)):
+        quantities = precompute_quantities(env_settings, results.inputs)
+        sale_price = quantities.sale_price
+        healthy = cost_budget(sale_price, healthy_floor if 0 < healthy_floor < 100 else 0.0)
+        thresholds = np.stack([
+            margin_price(results.breakdown.total_cost, target_margin),
+            max_setting(env_settings, quantities, "filament_price_per_kg", healthy),
+            max_setting(env_settings, quantities, "labour_rate_per_hour", healthy),
+            max_quantity(env_settings, quantities, "print_time_hours", sale_price),
+        ])
+    return replace(results, thresholds=thresholds)
+
+
+def reprice_portfolio(
+    env_settings: EnvironmentSettings,
+    quantities: CostQuantities,
+    df: pd.DataFrame,
+    healthy_floor: float,
+    out: CostBreakdownBatch | None = None,
+) -> tuple[CostQuantities, PortfolioResults]:
+    """Re-cost a portfolio from precomputed quantities.
+
+    Price and time settings only change the coefficient vector; automation
+    settings rebuild the plate-change column. Returns the quantities valid
+    for ``env_settings`` (to keep for the next call) and the results. A
+    previous breakdown passed as ``out`` is overwritten in place.
+    """
+    with stage("cost", len(df)):
+        quantities = quantities.with_plate_policy(env_settings)
+        breakdown = breakdown_from_quantities(env_settings, quantities, out=out)
+    return quantities, PortfolioResults.classify(df, breakdown, healthy_floor)
+
+
+def file_format(source) -> str:
+    """Format of a path or named file object, from its suffix."""
+    name = str(getattr(source, "name", source))
+    return FILE_FORMATS.get(os.path.splitext(name)[1].lower(), "csv")
+
+
+def _portfolio_format(source, fmt: str | None) -> str:
+    fmt = fmt or file_format(source)
+    if fmt in REPORT_ONLY_FORMATS:
+        raise ValueError(f"{fmt.upper()} is only supported for reports, not portfolios")
+    return fmt
+
+
+def _is_path(source) -> bool:
+    return isinstance(source, (str, os.PathLike))
+
+
+def _projected_columns(names) -> list[str]:
+    missing = set(REQUIRED_COLUMNS) - set(names)
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(sorted(missing))}")
+    return [col for col in INPUT_COLUMNS if col in names]
+
+
+def _read_arrow_table(source, fmt: str) -> pa.Table:
+    """Read only the portfolio columns of a Parquet or Feather file.
+
+    Files on disk are memory-mapped, so columns that are not projected are
+    never read; uploads are read from their in-memory buffer.
+    """
+    memory_map = _is_path(source)
+    if fmt == "parquet":
+        parquet_file = pq.ParquetFile(source, memory_map=memory_map)
+        columns = _projected_columns(parquet_file.schema_arrow.names)
+        return parquet_file.read(columns=columns)
+
+    if memory_map:
+        with pa.memory_map(os.fspath(source)) as mapped:
+            names = pa.ipc.open_file(mapped).schema.names
+    else:
+        names = pa.ipc.open_file(source).schema.names
+        source.seek(0)
+    return feather.read_table(
+        source, columns=_projected_columns(names), memory_map=memory_map
+    )
+
+
+def _arrow_to_frame(table: pa.Table | pa.RecordBatch) -> pd.DataFrame:
+    df = table.to_pandas()
+    df["model_name"] = df["model_name"].astype(str)
+    return df
+
+
+def read_portfolio(source, fmt: str | None = None) -> pd.DataFrame:
+    """Read the portfolio columns of a CSV, Parquet or Feather file.
+
+    ``fmt`` defaults to the format implied by the file name. Only
+    ``INPUT_COLUMNS`` are loaded; missing required columns raise
+    ``ValueError``.
+    """
+    fmt = _portfolio_format(source, fmt)
+    with stage("read") as timed:
+        if fmt == "csv":
+            df = pd.read_csv(
+                source,
+                usecols=lambda col: col in INPUT_COLUMNS,
+                dtype={"model_name": str, "reference_url": str},
+            )
+            df = df[_projected_columns(df.columns)]
+        else:
+            df = _arrow_to_frame(_read_arrow_table(source, fmt))
+        timed.rows = len(df)
+    return df
+
+
+def iter_portfolio_chunks(
+    source, chunk_rows: int = DEFAULT_CHUNK_ROWS, fmt: str | None = None
+):
+    """Yield the portfolio columns of a file ``chunk_rows`` rows at a time.
+
+    CSV is parsed incrementally; Parquet is read batch by batch and Feather
+    is memory-mapped and sliced, so only the current chunk is converted to
+    pandas.
+    """
+    return staged("read", _iter_portfolio_chunks(source, chunk_rows, fmt))
+
+
+def _iter_portfolio_chunks(source, chunk_rows: int, fmt: str | None):
+    fmt = _portfolio_format(source, fmt)
+    if fmt == "parquet":
+        parquet_file = pq.ParquetFile(source, memory_map=_is_path(source))
+        columns = _projected_columns(parquet_file.schema_arrow.names)
+        for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield _arrow_to_frame(batch)
+        return
+    if fmt == "feather":
+        table = _read_arrow_table(source, fmt)
+        for start in range(0, table.num_rows, chunk_rows):
+            yield _arrow_to_frame(table.slice(start, chunk_rows))
+        return
+
+    reader = pd.read_csv(
+        source,
+        usecols=lambda col: col in INPUT_COLUMNS,
+        chunksize=chunk_rows,
+        dtype={"model_name": str, "reference_url": str},
+    )
+    with reader:
+        for chunk in reader:
+            _projected_columns(chunk.columns)
+            yield chunk
+
+
+def _reject_frame(rows, column: str, values, reasons) -> pd.DataFrame:
+    return pd.DataFrame({
+        "Row": rows,
+        "Column": column,
+        "Value": values,
+        "Reason": reasons,
+    }, columns=list(REJECT_COLUMNS))
+
+
+def _empty_rejects() -> pd.DataFrame:
+    return _reject_frame(np.empty(0, dtype=np.int64), "", [], [])
+
+
+def validate_portfolio(
+    df: pd.DataFrame, first_row: int = 1
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Coerce the numeric columns and split off rows with unusable cells.
+
+    Each of ``NUMERIC_COLUMNS`` is converted in one pass; cells that are
+    blank, not a number or infinite are reported. Returns the valid rows
+    (re-indexed from 0) and one ``REJECT_COLUMNS`` row per bad cell, where
+    ``Row`` counts data rows from ``first_row``.
+    """
+    with stage("validate", len(df)):
+        return _validate_portfolio(df, first_row)
+
+
+def _validate_portfolio(df: pd.DataFrame, first_row: int) -> tuple[pd.DataFrame, pd.DataFrame]:
+    df = df.reset_index(drop=True)
+    invalid = np.zeros(len(df), dtype=bool)
+    coerced = {}
+    rejects = []
+    for col in NUMERIC_COLUMNS:
+        raw = df[col]
+        if pd.api.types.is_numeric_dtype(raw) and not pd.api.types.is_bool_dtype(raw):
+            values = raw.to_numpy(dtype=np.float64, na_value=np.nan)
+            blank = np.isnan(values)
+        else:
+            values = pd.to_numeric(raw, errors="coerce").to_numpy(
+                dtype=np.float64, na_value=np.nan
+            )
+            blank = raw.isna().to_numpy(dtype=bool, copy=True)
+            # Whitespace-only cells are blank too; only unparsed cells can be
+            unparsed = np.flatnonzero(np.isnan(values) & ~blank)
+            if len(unparsed):
+                stripped = raw.iloc[unparsed].astype(str).str.strip()
+                blank[unparsed] = stripped.eq("").to_numpy(dtype=bool)
+            coerced[col] = values
+        bad = ~np.isfinite(values)
+        if not bad.any():
+            continue
+        invalid |= bad
+        rows = np.flatnonzero(bad)
+        reasons = np.where(
+            blank[rows], "missing", np.where(np.isnan(values[rows]), "not a number", "not finite")
+        )
+        cells = raw.iloc[rows].astype(object).where(~blank[rows], "").astype(str)
+        rejects.append(_reject_frame(rows + first_row, col, cells.to_numpy(), reasons))
+
+    if coerced:
+        df = df.assign(**coerced)
+    if invalid.any():
+        df = df[~invalid].reset_index(drop=True)
+    if not rejects:
+        return df, _empty_rejects()
+    rejects = pd.concat(rejects, ignore_index=True)
+    return df, rejects.sort_values(["Row"], kind="stable", ignore_index=True)
+
+
+class ReportWriter:
+    """Append report chunks to a CSV, Parquet, Feather or XLSX file.
+
+    ``destination`` is a path or a binary file object; the Arrow schema is
+    fixed by the first chunk. XLSX rows are flushed to disk as they are
+    written, and a new worksheet is started when one is full.
+    """
+
+    def __init__(self, destination, fmt: str | None = None, sheet_rows: int = XLSX_SHEET_ROWS):
+        self.fmt = fmt or file_format(destination)
+        self.rows = 0
+        self._destination = destination
+        self._out = None
+        self._writer = None
+        self._schema = None
+        self._sheet = None
+        self._sheet_rows = sheet_rows
+        self._sheet_row = 0
+
+    def __enter__(self) -> "ReportWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _open_text(self):
+        if _is_path(self._destination):
+            return open(self._destination, "w", encoding="utf-8", newline="")
+        return io.TextIOWrapper(self._destination, encoding="utf-8", newline="")
+
+    def write(self, frame: pd.DataFrame) -> None:
+        with stage("export", len(frame)):
+            self._write(frame)
+        self.rows += len(frame)
+
+    def _write(self, frame: pd.DataFrame) -> None:
+        if self.fmt == "csv":
+            if self._out is None:
+                self._out = self._open_text()
+            frame.to_csv(self._out, header=self.rows == 0, index=False)
+        elif self.fmt == "xlsx":
+            self._write_xlsx(frame)
+        else:
+            table = pa.Table.from_pandas(frame, schema=self._schema, preserve_index=False)
+            if self._writer is None:
+                self._schema = table.schema
+                if self.fmt == "parquet":
+                    self._writer = pq.ParquetWriter(self._destination, self._schema)
+                else:
+                    self._writer = pa.ipc.new_file(self._destination, self._schema)
+            self._writer.write_table(table)
+
+    def _open_workbook(self):
+        # Infinite thresholds ("any value") are written as #DIV/0! cells
+        return xlsxwriter.Workbook(
+            self._destination,
+            {"constant_memory": True, "strings_to_urls": False, "nan_inf_to_errors": True},
+        )
+
+    def _write_xlsx(self, frame: pd.DataFrame) -> None:
+        if self._writer is None:
+            self._writer = self._open_workbook()
+        header = [str(col) for col in frame.columns]
+        # Blank cells for NaN; xlsxwriter cannot store it as a number
+        values = frame.astype(object).where(frame.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            if self._sheet is None or self._sheet_row == self._sheet_rows:
+                self._sheet = self._writer.add_worksheet()
+                self._sheet.write_row(0, 0, header)
+                self._sheet_row = 1
+            self._sheet.write_row(self._sheet_row, 0, row)
+            self._sheet_row += 1
+
+    def close(self) -> None:
+        if self.fmt == "xlsx":
+            workbook = self._writer or self._open_workbook()
+            workbook.close()
+        elif self.fmt == "csv":
+            out = self._out or self._open_text()
+            if _is_path(self._destination):
+                out.close()
+            else:
+                # Leave the caller's binary file open
+                out.flush()
+                out.detach()
+        elif self._writer is not None:
+            self._writer.close()
+        self._out = self._writer = self._sheet = None
+
+
+def write_report(
+    results: "PortfolioResults",
+    destination,
+    fmt: str | None = None,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+) -> int:
+    """Write the report for ``results`` ``chunk_rows`` rows at a time.
+
+    Only one chunk of the report table exists at once. Returns the number
+    of rows written.
+    """
+    with ReportWriter(destination, fmt) as writer:
+        for frame in results.iter_frames(chunk_rows):
+            writer.write(frame)
+    return writer.rows
+
+
+def report_bytes(frame: pd.DataFrame, fmt: str) -> bytes:
+    """Serialise a report frame for download."""
+    if fmt == "csv":
+        return frame.to_csv(index=False).encode("utf-8")
+    buffer = io.BytesIO()
+    with ReportWriter(buffer, fmt) as writer:
+        writer.write(frame)
+    return buffer.getvalue()
+
+
+@dataclass
+class PortfolioTotals:
+    """Headline totals shown in the portfolio overview.
+
+    Totals from separate chunks or shards combine with ``merge``; ``remove``
+    takes rows back out when a portfolio is updated incrementally.
+    """
+    rows: int = 0
+    status_counts: dict[str, int] = field(
+        default_factory=lambda: dict.fromkeys(STATUS_LABELS, 0)
+    )
+    margin_sum: float = 0.0
+    margin_count: int = 0
+    total_profit: float = 0.0
+
+    @classmethod
+    def from_results(
+        cls, results: PortfolioResults, rows: np.ndarray | None = None
+    ) -> "PortfolioTotals":
+        """Totals over all results, or over the row positions in ``rows``."""
+        with stage("aggregate", len(results) if rows is None else len(rows)):
+            return cls._from_results(results, rows)
+
+    @classmethod
+    def _from_results(
+        cls, results: PortfolioResults, rows: np.ndarray | None
+    ) -> "PortfolioTotals":
+        status_codes = results.status_codes
+        margins = results.breakdown.profit_margin_percent
+        profit = results.breakdown.profit
+        if rows is not None:
+            status_codes, margins, profit = status_codes[rows], margins[rows], profit[rows]
+        counts = np.bincount(status_codes, minlength=len(STATUS_LABELS))
+        return cls(
+            rows=len(status_codes),
+            status_counts=dict(zip(STATUS_LABELS, counts.tolist())),
+            margin_sum=float(np.nansum(margins)),
+            margin_count=int(np.count_nonzero(~np.isnan(margins))),
+            total_profit=float(np.nansum(profit)),
+        )
+
+    def merge(self, other: "PortfolioTotals") -> "PortfolioTotals":
+        status_counts = dict(self.status_counts)
+        for status, count in other.status_counts.items():
+            status_counts[status] = status_counts.get(status, 0) + count
+        return PortfolioTotals(
+            rows=self.rows + other.rows,
+            status_counts=status_counts,
+            margin_sum=self.margin_sum + other.margin_sum,
+            margin_count=self.margin_count + other.margin_count,
+            total_profit=self.total_profit + other.total_profit,
+        )
+
+    def remove(self, other: "PortfolioTotals") -> "PortfolioTotals":
+        """Inverse of ``merge``: drop rows whose totals are ``other``."""
+        status_counts = dict(self.status_counts)
+        for status, count in other.status_counts.items():
+            status_counts[status] = status_counts.get(status, 0) - count
+        return PortfolioTotals(
+            rows=self.rows - other.rows,
+            status_counts=status_counts,
+            margin_sum=self.margin_sum - other.margin_sum,
+            margin_count=self.margin_count - other.margin_count,
+            total_profit=self.total_profit - other.total_profit,
+        )
+
+    @property
+    def average_margin(self) -> float:
+        return self.margin_sum / self.margin_count if self.margin_count else float("nan")
+
+
+def top_k_indices(
+    values: np.ndarray, k: int, largest: bool = True, where: np.ndarray | None = None
+) -> np.ndarray:
+    """Positions of the ``k`` largest (or smallest) non-NaN values, best first.
+
+    Uses partial selection, so the cost is linear in ``len(values)``.
+    ``where`` restricts the candidates.
+    """
+    valid = ~np.isnan(values)
+    if where is not None:
+        valid &= where
+    candidates = np.flatnonzero(valid)
+    keyed = -values[candidates] if largest else values[candidates]
+    if len(candidates) > k:
+        part = np.argpartition(keyed, k - 1)[:k] if k > 0 else np.empty(0, np.int64)
+        candidates, keyed = candidates[part], keyed[part]
+    return candidates[np.lexsort((candidates, keyed))]
+
+
+@dataclass
+class Ranking:
+    """The best ``k`` models by one metric, best first."""
+    k: int
+    largest: bool
+    values: np.ndarray
+    names: np.ndarray
+
+    @classmethod
+    def select(
+        cls, values: np.ndarray, names, k: int, largest: bool, where=None
+    ) -> "Ranking":
+        """Rank ``values``; ``names`` is indexed only at the selected positions."""
+        idx = top_k_indices(values, k, largest, where)
+        if isinstance(names, pd.Series):
+            names = names.iloc[idx].astype(str).to_numpy(dtype=object)
+        else:
+            names = np.asarray(names, dtype=object)[idx]
+        return cls(k, largest, values[idx], names)
+
+    @classmethod
+    def empty(cls, k: int, largest: bool) -> "Ranking":
+        return cls(k, largest, np.empty(0), np.empty(0, dtype=object))
+
+    def merge(self, other: "Ranking") -> "Ranking":
+        return Ranking.select(
+            np.concatenate([self.values, other.values]),
+            np.concatenate([self.names, other.names]),
+            self.k,
+            self.largest,
+        )
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def items(self) -> list[tuple[str, float]]:
+        return list(zip(self.names.tolist(), self.values.tolist()))
+
+
+def _group_codes(keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Unique keys and each row's index into them.
+
+    Small non-negative integer ranges (such as plate counts) are counted
+    directly; anything else falls back to sorting.
+    """
+    if keys.dtype.kind in "iub" and len(keys):
+        keys = keys.astype(np.int64)
+        low, high = int(keys.min()), int(keys.max())
+        if high - low <= 4 * len(keys) + 1024:
+            present = np.bincount(keys - low, minlength=high - low + 1) > 0
+            lookup = np.cumsum(present) - 1
+            return np.flatnonzero(present) + low, lookup[keys - low]
+    return np.unique(keys, return_inverse=True)
+
+
+@dataclass
+class GroupRollup:
+    """Model count, profit and margin totals per value of one column."""
+    keys: np.ndarray
+    count: np.ndarray
+    profit: np.ndarray
+    margin_sum: np.ndarray
+    margin_count: np.ndarray
+
+    @classmethod
+    def empty(cls) -> "GroupRollup":
+        ints, floats = np.empty(0, dtype=np.int64), np.empty(0)
+        return cls(ints, ints, floats, floats, ints)
+
+    @classmethod
+    def from_columns(
+        cls, keys: np.ndarray, profit: np.ndarray, margins: np.ndarray
+    ) -> "GroupRollup":
+        unique, codes = _group_codes(keys)
+        n = len(unique)
+        has_margin = ~np.isnan(margins)
+        return cls(
+            keys=unique,
+            count=np.bincount(codes, minlength=n).astype(np.int64),
+            profit=np.bincount(codes, weights=np.nan_to_num(profit), minlength=n),
+            margin_sum=np.bincount(
+                codes, weights=np.where(has_margin, margins, 0.0), minlength=n
+            ),
+            margin_count=np.bincount(codes, weights=has_margin, minlength=n).astype(np.int64),
+        )
+
+    def merge(self, other: "GroupRollup") -> "GroupRollup":
+        unique, codes = _group_codes(np.concatenate([self.keys, other.keys]))
+        n = len(unique)
+
+        def total(field_name):
+            values = np.concatenate([getattr(self, field_name), getattr(other, field_name)])
+            summed = np.bincount(codes, weights=values, minlength=n)
+            return summed.astype(values.dtype)
+
+        return GroupRollup(
+            unique, total("count"), total("profit"), total("margin_sum"), total("margin_count")
+        )
+
+    def to_frame(self, label: str, key_labels=None) -> pd.DataFrame:
+        keys = self.keys if key_labels is None else [key_labels[k] for k in self.keys.tolist()]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            average_margin = self.margin_sum / self.margin_count
+        return pd.DataFrame({
+            label: keys,
+            "Models": self.count,
+            "Profit ($)": self.profit,
+            "Avg margin (%)": average_margin,
+        })
+
+
+@dataclass
+class PortfolioInsights:
+    """Portfolio statistics built from the columnar results in one sweep.
+
+    Holds the headline ``totals``, profit per status, best/worst rankings by
+    margin and $/hour, the worst losing models and rollups by plate count
+    and remote-friendliness. Insights from chunks or shards combine with
+    ``merge``.
+    """
+    totals: PortfolioTotals
+    status_profit: np.ndarray
+    best_margin: Ranking
+    worst_margin: Ranking
+    best_hourly: Ranking
+    worst_hourly: Ranking
+    worst_losing: Ranking
+    by_plates: GroupRollup
+    by_remote: GroupRollup
+
+    @classmethod
+    def empty(cls, k: int = DEFAULT_TOP_K) -> "PortfolioInsights":
+        return cls(
+            totals=PortfolioTotals(),
+            status_profit=np.zeros(len(STATUS_LABELS)),
+            best_margin=Ranking.empty(k, largest=True),
+            worst_margin=Ranking.empty(k, largest=False),
+            best_hourly=Ranking.empty(k, largest=True),
+            worst_hourly=Ranking.empty(k, largest=False),
+            worst_losing=Ranking.empty(k, largest=False),
+            by_plates=GroupRollup.empty(),
+            by_remote=GroupRollup.empty(),
+        )
+
+    @classmethod
+    def from_results(
+        cls, results: PortfolioResults, k: int = DEFAULT_TOP_K
+    ) -> "PortfolioInsights":
+        with stage("aggregate", len(results)):
+            return cls._from_results(results, k)
+
+    @classmethod
+    def _from_results(cls, results: PortfolioResults, k: int) -> "PortfolioInsights":
+        breakdown = results.breakdown
+        margins = breakdown.profit_margin_percent
+        profit = breakdown.profit
+        hourly = results.profit_per_hour
+        names = results.inputs["model_name"]
+        status_codes = results.status_codes
+        return cls(
+            totals=PortfolioTotals.from_results(results),
+            status_profit=np.bincount(
+                status_codes, weights=np.nan_to_num(profit), minlength=len(STATUS_LABELS)
+            ),
+            best_margin=Ranking.select(margins, names, k, largest=True),
+            worst_margin=Ranking.select(margins, names, k, largest=False),
+            best_hourly=Ranking.select(hourly, names, k, largest=True),
+            worst_hourly=Ranking.select(hourly, names, k, largest=False),
+            worst_losing=Ranking.select(
+                profit, names, k, largest=False, where=status_codes == STATUS_LOSING
+            ),
+            by_plates=GroupRollup.from_columns(
+                results.inputs["plate_count"].to_numpy().astype(np.int64), profit, margins
+            ),
+            by_remote=GroupRollup.from_columns(breakdown.remote_friendly, profit, margins),
+        )
+
+    def merge(self, other: "PortfolioInsights") -> "PortfolioInsights":
+        return PortfolioInsights(
+            totals=self.totals.merge(other.totals),
+            status_profit=self.status_profit + other.status_profit,
+            best_margin=self.best_margin.merge(other.best_margin),
+            worst_margin=self.worst_margin.merge(other.worst_margin),
+            best_hourly=self.best_hourly.merge(other.best_hourly),
+            worst_hourly=self.worst_hourly.merge(other.worst_hourly),
+            worst_losing=self.worst_losing.merge(other.worst_losing),
+            by_plates=self.by_plates.merge(other.by_plates),
+            by_remote=self.by_remote.merge(other.by_remote),
+        )
+
+    @property
+    def remote_count(self) -> int:
+        return int(self.by_remote.count[self.by_remote.keys == 1].sum())
+
+    def status_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            "Status": STATUS_LABELS,
+            "Models": [self.totals.status_counts.get(s, 0) for s in STATUS_LABELS],
+            "Profit ($)": self.status_profit,
+        })
+
+
+@dataclass
+class EvaluationStats:
+    insights: PortfolioInsights
+    seconds: float
+    rejected_rows: int = 0
+
+    @property
+    def totals(self) -> PortfolioTotals:
+        return self.insights.totals
+
+    @property
+    def rows(self) -> int:
+        return self.totals.rows
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float("inf")
+
+
+def evaluate_portfolio_file(
+    source,
+    destination,
+    env_settings: EnvironmentSettings,
+    healthy_floor: float,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    evaluate=evaluate_portfolio,
+    rejects=None,
+) -> EvaluationStats:
+    """Stream a portfolio file through the cost model into a report file.
+
+    Input and report formats follow the file suffixes (CSV, Parquet or
+    Feather). Only one chunk is held in memory at a time, so memory use
+    depends on ``chunk_rows`` rather than on the size of the input file.
+    Each chunk is costed by ``evaluate``, e.g. a ``ResultStore``'s
+    read-through ``evaluate_portfolio``. Rows with invalid cells are
+    skipped; pass ``rejects`` to write the bad cells to a file.
+    """
+    start = time.perf_counter()
+    insights = PortfolioInsights.empty()
+    rows_read = 0
+    reject_writer = ReportWriter(rejects) if rejects is not None else nullcontext()
+    with ReportWriter(destination) as writer, reject_writer:
+        for chunk in iter_portfolio_chunks(source, chunk_rows):
+            valid, bad_cells = validate_portfolio(chunk, first_row=rows_read + 1)
+            rows_read += len(chunk)
+            if rejects is not None and len(bad_cells):
+                reject_writer.write(bad_cells)
+            if not len(valid):
+                continue
+            results = evaluate(env_settings, valid, healthy_floor)
+            writer.write(results.to_frame())
+            insights = insights.merge(PortfolioInsights.from_results(results))
+    return EvaluationStats(
+        insights=insights,
+        seconds=time.perf_counter() - start,
+        rejected_rows=rows_read - insights.totals.rows,
+    )
+
+
+# ---------------------------------------------------------------------
+# Sharded (multi-process) evaluation
+# ---------------------------------------------------------------------
+class _ByteRangeReader(io.RawIOBase):
+    """Read-only view of ``[start, end)`` of a binary file."""
+
+    def __init__(self, path, start: int, end: int):
+        self._fh = open(path, "rb")
+        self._fh.seek(start)
+        self._remaining = end - start
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self._remaining)
+        if size <= 0:
+            return 0
+        read = self._fh.readinto(memoryview(buffer)[:size])
+        self._remaining -= read
+        return read
+
+    def close(self) -> None:
+        self._fh.close()
+        super().close()
+
+
+def shard_byte_ranges(path, shards: int) -> tuple[list[str], list[tuple[int, int]]]:
+    """Split a CSV file into up to ``shards`` line-aligned byte ranges.
+
+    Returns the header column names and the ``(start, end)`` range of each
+    shard, excluding the header line. Fields with embedded newlines are not
+    supported, since boundaries are placed after the next newline.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as fh:
+        header_line = fh.readline()
+        data_start = fh.tell()
+        boundaries = [data_start]
+        for i in range(1, shards):
+            target = data_start + (size - data_start) * i // shards
+            if target <= boundaries[-1]:
+                continue
+            fh.seek(target - 1)
+            fh.readline()
+            boundaries.append(min(fh.tell(), size))
+        boundaries.append(size)
+
+    names = next(csv.reader([header_line.decode("utf-8-sig")]))
+    ranges = [(a, b) for a, b in zip(boundaries, boundaries[1:]) if b > a]
+    return names, ranges
+
+
+def _evaluate_shard(
+    path,
+    byte_range: tuple[int, int],
+    names: list[str],
+    destination: str,
+    env_settings: EnvironmentSettings,
+    healthy_floor: float,
+    chunk_rows: int,
+    timings: bool = False,
+):
+    """Evaluate one byte range; returns its insights, rows read, bad cells
+    and stage timings (``None`` unless ``timings``).
+
+    The part file has a header if any row was valid. Reject row numbers
+    count from the start of the shard.
+    """
+    with recording() if timings else nullcontext() as recorder:
+        insights, rows_read, rejects = _evaluate_shard_chunks(
+            path, byte_range, names, destination, env_settings, healthy_floor, chunk_rows
+        )
+    return insights, rows_read, rejects, recorder
+
+
+def _evaluate_shard_chunks(
+    path,
+    byte_range: tuple[int, int],
+    names: list[str],
+    destination: str,
+    env_settings: EnvironmentSettings,
+    healthy_floor: float,
+    chunk_rows: int,
+) -> tuple[PortfolioInsights, int, pd.DataFrame]:
+    insights = PortfolioInsights.empty()
+    rows_read = 0
+    rejects = []
+    reader = pd.read_csv(
+        io.BufferedReader(_ByteRangeReader(path, *byte_range)),
+        header=None,
+        names=names,
+        usecols=lambda col: col in INPUT_COLUMNS,
+        chunksize=chunk_rows,
+        dtype={"model_name": str, "reference_url": str},
+    )
+    with reader, open(destination, "w", encoding="utf-8", newline="") as out:
+        for chunk in staged("read", reader):
+            valid, bad_cells = validate_portfolio(chunk, first_row=rows_read + 1)
+            rows_read += len(chunk)
+            if len(bad_cells):
+                rejects.append(bad_cells)
+            if not len(valid):
+                continue
+            results = evaluate_portfolio(env_settings, valid, healthy_floor)
+            results.to_frame().to_csv(out, header=insights.totals.rows == 0, index=False)
+            insights = insights.merge(PortfolioInsights.from_results(results))
+    rejects = pd.concat(rejects, ignore_index=True) if rejects else _empty_rejects()
+    return insights, rows_read, rejects
+
+
+def evaluate_portfolio_file_parallel(
+    source,
+    destination,
+    env_settings: EnvironmentSettings,
+    healthy_floor: float,
+    workers: int,
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    rejects=None,
+) -> EvaluationStats:
+    """Evaluate a portfolio CSV on ``workers`` processes.
+
+    The file is split into line-aligned byte ranges, each worker streams its
+    range into its own part file, and the parts are concatenated in input
+    order. Totals from all shards are merged. Both files must be CSV.
+    Invalid rows are skipped as in ``evaluate_portfolio_file``.
+    """
+    if file_format(source) != "csv" or file_format(destination) != "csv":
+        raise ValueError("Sharded evaluation needs CSV input and output")
+    start = time.perf_counter()
+    names, ranges = shard_byte_ranges(source, workers)
+    missing = set(REQUIRED_COLUMNS) - set(names)
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(sorted(missing))}")
+
+    out_dir = os.path.dirname(os.path.abspath(destination))
+    with tempfile.TemporaryDirectory(dir=out_dir) as tmp_dir:
+        parts = [os.path.join(tmp_dir, f"part-{i:05d}.csv") for i in range(len(ranges))]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(
+                    _evaluate_shard,
+                    source,
+                    byte_range,
+                    names,
+                    part,
+                    env_settings,
+                    healthy_floor,
+                    chunk_rows,
+                    current_recorder() is not None,
+                )
+                for byte_range, part in zip(ranges, parts)
+            ]
+            shard_results = [future.result() for future in futures]
+
+        # Keep the header of the first part that has one
+        has_header = False
+        with open(destination, "wb") as out:
+            for part, (part_insights, *_) in zip(parts, shard_results):
+                part_rows = part_insights.totals.rows
+                with open(part, "rb") as fh:
+                    if part_rows and has_header:
+                        fh.readline()
+                    has_header = has_header or part_rows > 0
+                    shutil.copyfileobj(fh, out, 1 << 20)
+
+    insights = PortfolioInsights.empty()
+    rows_read = 0
+    bad_cells = []
+    recorder = current_recorder()
+    for part_insights, part_rows, part_rejects, part_timings in shard_results:
+        insights = insights.merge(part_insights)
+        if recorder is not None:
+            # Worker time adds up across processes, so it can exceed wall time
+            recorder.merge(part_timings)
+        bad_cells.append(part_rejects.assign(Row=part_rejects["Row"] + rows_read))
+        rows_read += part_rows
+    if rejects is not None:
+        with ReportWriter(rejects) as writer:
+            writer.write(pd.concat(bad_cells, ignore_index=True))
+    return EvaluationStats(
+        insights=insights,
+        seconds=time.perf_counter() - start,
+        rejected_rows=rows_read - insights.totals.rows,
+    )
+
+
+def report_stats(stats: EvaluationStats, stream=sys.stderr) -> None:
+    totals = stats.totals
+    print(
+        f"Evaluated {stats.rows:,} rows in {stats.seconds:.2f}s "
+        f"({stats.rows_per_second:,.0f} rows/sec)",
+        file=stream,
+    )
+    if stats.rejected_rows:
+        print(f"Skipped {stats.rejected_rows:,} rows with invalid cells", file=stream)
+    counts = ", ".join(f"{status}: {count:,}" for status, count in totals.status_counts.items())
+    print(
+        f"Status counts: {counts} | Avg margin: {totals.average_margin:.1f}% | "
+        f"Total profit: ${totals.total_profit:,.2f}",
+        file=stream,
+    )
+    insights = stats.insights
+    for label, ranking, value_format in (
+        ("Best margin", insights.best_margin, "{:.1f}%"),
+        ("Best $/hour", insights.best_hourly, "${:,.2f}/h"),
+        ("Worst losing", insights.worst_losing, "${:,.2f}"),
+    ):
+        if len(ranking):
+            ranked = ", ".join(
+                f"{name} ({value_format.format(value)})" for name, value in ranking.items()
+            )
+            print(f"{label}: {ranked}", file=stream)
+    print(f"Remote-friendly: {insights.remote_count:,}/{totals.rows:,}", file=stream)
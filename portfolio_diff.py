@@ -0,0 +1,277 @@
+# portfolio_diff.py - Incremental re-evaluation of re-uploaded portfolios
+
+from dataclasses import astuple, dataclass
+
+import numpy as np
+import pandas as pd
+
+from cost_model import CostBreakdownBatch, EnvironmentSettings, status_labels
+from portfolio import (
+    NUMERIC_COLUMNS,
+    PortfolioResults,
+    PortfolioTotals,
+    evaluate_portfolio,
+)
+
+
+KEY_COLUMNS = ("model_name", "reference_url")
+
+# Rows of each kind kept for the "what changed" table
+MAX_CHANGE_ROWS = 500
+
+
+def _key_column(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df:
+        return pd.Series("", index=df.index, dtype=str)
+    return df[col].fillna("").astype(str)
+
+
+def _occurrence(keys: np.ndarray) -> np.ndarray:
+    """0 for the first row with a key, 1 for the second and so on."""
+    series = pd.Series(keys)
+    if not series.duplicated().any():
+        return np.zeros(len(keys), dtype=np.int64)
+    return series.groupby(keys).cumcount().to_numpy(dtype=np.int64)
+
+
+def row_keys(
+    previous: pd.DataFrame, current: pd.DataFrame
+) -> tuple[np.ndarray, np.ndarray]:
+    """Integer identities of the rows of two uploads, from ``KEY_COLUMNS``.
+
+    Both uploads are factorized together, so equal name/URL pairs get equal
+    keys. Repeated pairs within an upload are told apart by their
+    occurrence number, so keys are unique within each upload.
+    """
+    keys = np.zeros(len(previous) + len(current), dtype=np.int64)
+    for col in KEY_COLUMNS:
+        values = pd.concat(
+            [_key_column(previous, col), _key_column(current, col)], ignore_index=True
+        )
+        codes, uniques = pd.factorize(values)
+        keys = keys * max(len(uniques), 1) + codes
+
+    previous_keys, current_keys = keys[:len(previous)], keys[len(previous):]
+    previous_occurrence = _occurrence(previous_keys)
+    current_occurrence = _occurrence(current_keys)
+    repeats = max(previous_occurrence.max(initial=0), current_occurrence.max(initial=0)) + 1
+    return (
+        previous_keys * repeats + previous_occurrence,
+        current_keys * repeats + current_occurrence,
+    )
+
+
+def _numeric_values(df: pd.DataFrame) -> np.ndarray:
+    return np.column_stack([df[col].to_numpy(dtype=np.float64) for col in NUMERIC_COLUMNS])
+
+
+@dataclass
+class PortfolioDiff:
+    """How a new upload differs from the previous one.
+
+    ``source`` maps each new row to its position in the previous upload
+    (-1 for added rows). ``added`` and ``changed`` are new row positions,
+    ``removed`` are previous row positions.
+    """
+    source: np.ndarray
+    added: np.ndarray
+    changed: np.ndarray
+    removed: np.ndarray
+
+    @property
+    def unchanged(self) -> int:
+        return len(self.source) - len(self.added) - len(self.changed)
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(len(self.added) or len(self.changed) or len(self.removed))
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.added):,} added, {len(self.changed):,} changed, "
+            f"{len(self.removed):,} removed, {self.unchanged:,} unchanged"
+        )
+
+
+def diff_portfolio(previous: pd.DataFrame, current: pd.DataFrame) -> PortfolioDiff:
+    """Match rows of two uploads on their keys and compare their numbers."""
+    previous_keys, current_keys = row_keys(previous, current)
+    source = pd.Index(previous_keys).get_indexer(current_keys)
+    matched = np.flatnonzero(source >= 0)
+
+    before = _numeric_values(previous)[source[matched]]
+    after = _numeric_values(current)[matched]
+    differs = ((before != after) & ~(np.isnan(before) & np.isnan(after))).any(axis=1)
+
+    kept = np.zeros(len(previous), dtype=bool)
+    kept[source[matched]] = True
+    return PortfolioDiff(
+        source=source,
+        added=np.flatnonzero(source < 0),
+        changed=matched[differs],
+        removed=np.flatnonzero(~kept),
+    )
+
+
+@dataclass
+class PortfolioSnapshot:
+    """Evaluated portfolio that the next upload is diffed against.
+
+    ``diff``, ``previous_totals`` and ``changes`` describe how this snapshot
+    differs from the one it was derived from (``None`` for a first upload).
+    """
+    results: PortfolioResults
+    totals: PortfolioTotals
+    settings: tuple
+    diff: PortfolioDiff | None = None
+    previous_totals: PortfolioTotals | None = None
+    changes: pd.DataFrame | None = None
+
+
+CHANGE_COLUMNS = (
+    "Change",
+    "Model",
+    "Sale before ($)",
+    "Sale after ($)",
+    "Profit before ($)",
+    "Profit after ($)",
+    "Status before",
+    "Status after",
+)
+
+
+def _change_side(results: PortfolioResults, rows, count: int, when: str) -> dict:
+    if rows is None:
+        return {
+            f"Sale {when} ($)": np.full(count, np.nan),
+            f"Profit {when} ($)": np.full(count, np.nan),
+            f"Status {when}": np.full(count, "", dtype=object),
+        }
+    return {
+        f"Sale {when} ($)": results.inputs["sale_price"].to_numpy(dtype=np.float64)[rows],
+        f"Profit {when} ($)": results.breakdown.profit[rows],
+        f"Status {when}": status_labels(results.status_codes[rows]),
+    }
+
+
+def _change_table(
+    previous: PortfolioResults, current: PortfolioResults, diff: PortfolioDiff
+) -> pd.DataFrame:
+    """Before/after sale price, profit and status of the rows that differ."""
+    changed = diff.changed[:MAX_CHANGE_ROWS]
+    parts = []
+    for change, old_rows, new_rows in (
+        ("Changed", diff.source[changed], changed),
+        ("Added", None, diff.added[:MAX_CHANGE_ROWS]),
+        ("Removed", diff.removed[:MAX_CHANGE_ROWS], None),
+    ):
+        rows = new_rows if new_rows is not None else old_rows
+        if len(rows) == 0:
+            continue
+        inputs = (current if new_rows is not None else previous).inputs
+        names = inputs["model_name"].iloc[rows].astype(str).to_numpy()
+        parts.append(pd.DataFrame({
+            "Change": change,
+            "Model": names,
+            **_change_side(previous, old_rows, len(rows), "before"),
+            **_change_side(current, new_rows, len(rows), "after"),
+        }))
+    if not parts:
+        return pd.DataFrame(columns=CHANGE_COLUMNS)
+    return pd.concat(parts, ignore_index=True)[list(CHANGE_COLUMNS)]
+
+
+def update_portfolio(
+    previous: PortfolioSnapshot | None,
+    env_settings: EnvironmentSettings,
+    df: pd.DataFrame,
+    healthy_floor: float,
+    evaluate=evaluate_portfolio,
+) -> PortfolioSnapshot:
+    """Evaluate an upload, recomputing only rows that differ from ``previous``.
+
+    Rows whose name, URL and numbers match the previous upload reuse its results,
+    added and changed rows go through ``evaluate``, and totals are
+    updated by removing the outgoing rows and merging the new ones. If the
+    settings changed, every row is recomputed but the diff is still
+    reported.
+    """
+    df = df.reset_index(drop=True)
+    settings = (astuple(env_settings), float(healthy_floor))
+    if previous is None:
+        results = evaluate(env_settings, df, healthy_floor)
+        return PortfolioSnapshot(results, PortfolioTotals.from_results(results), settings)
+
+    diff = diff_portfolio(previous.results.inputs, df)
+    if previous.settings != settings:
+        results = evaluate(env_settings, df, healthy_floor)
+        totals = PortfolioTotals.from_results(results)
+    else:
+        results, totals = _apply_diff(
+            previous, diff, env_settings, df, healthy_floor, evaluate
+        )
+    return _snapshot(previous, results, totals, settings, diff)
+
+
+def compare_snapshot(
+    previous: PortfolioSnapshot | None,
+    results: PortfolioResults,
+    totals: PortfolioTotals,
+    settings: tuple,
+) -> PortfolioSnapshot:
+    """Snapshot of results evaluated elsewhere (e.g. cached), diffed against ``previous``."""
+    if previous is None:
+        return PortfolioSnapshot(results, totals, settings)
+    diff = diff_portfolio(previous.results.inputs, results.inputs)
+    return _snapshot(previous, results, totals, settings, diff)
+
+
+def _snapshot(
+    previous: PortfolioSnapshot,
+    results: PortfolioResults,
+    totals: PortfolioTotals,
+    settings: tuple,
+    diff: PortfolioDiff,
+) -> PortfolioSnapshot:
+    return PortfolioSnapshot(
+        results,
+        totals,
+        settings,
+        diff=diff,
+        previous_totals=previous.totals,
+        changes=_change_table(previous.results, results, diff),
+    )
+
+
+def _apply_diff(
+    previous: PortfolioSnapshot,
+    diff: PortfolioDiff,
+    env_settings: EnvironmentSettings,
+    df: pd.DataFrame,
+    healthy_floor: float,
+    evaluate,
+) -> tuple[PortfolioResults, PortfolioTotals]:
+    stale = np.sort(np.concatenate([diff.added, diff.changed]))
+    reused = np.ones(len(df), dtype=bool)
+    reused[stale] = False
+    reused = np.flatnonzero(reused)
+    reused_from = diff.source[reused]
+
+    old = previous.results
+    breakdown = CostBreakdownBatch.empty(len(df))
+    breakdown.values[:, reused] = old.breakdown.values[:, reused_from]
+    breakdown.remote_friendly[reused] = old.breakdown.remote_friendly[reused_from]
+    status_codes = np.empty(len(df), dtype=old.status_codes.dtype)
+    status_codes[reused] = old.status_codes[reused_from]
+
+    totals = previous.totals.remove(PortfolioTotals.from_results(
+        old, np.concatenate([diff.removed, diff.source[diff.changed]])
+    ))
+    if len(stale):
+        fresh = evaluate(env_settings, df.iloc[stale], healthy_floor)
+        breakdown.values[:, stale] = fresh.breakdown.values
+        breakdown.remote_friendly[stale] = fresh.breakdown.remote_friendly
+        status_codes[stale] = fresh.status_codes
+        totals = totals.merge(PortfolioTotals.from_results(fresh))
+
+    return PortfolioResults(df, breakdown, status_codes), totals
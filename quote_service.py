@@ -0,0 +1,477 @@
+# quote_service.py - Local HTTP/JSON quote service with request coalescing
+
+import asyncio
+import json
+import math
+import time
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+from cost_model import (
+    COST_FIELDS,
+    FLOAT_COST_FIELDS,
+    EnvironmentSettings,
+    ModelInput,
+    calculate_break_even_and_health,
+    calculate_costs_batch,
+    classify_batch,
+    status_labels,
+)
+from portfolio import environment_from_settings
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_PROFILE = "default"
+
+# Single quotes waiting for the next micro-batch are flushed at this size
+DEFAULT_MAX_BATCH = 512
+MAX_BODY_BYTES = 8 << 20
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+}
+
+
+class QuoteError(ValueError):
+    """A request that cannot be quoted; reported to the client as HTTP 400."""
+
+
+Profile = tuple[EnvironmentSettings, float]
+
+
+def load_profiles(path: str | None) -> dict[str, Profile]:
+    """Named environment profiles from a JSON object of settings objects.
+
+    Each profile overrides the app defaults, like ``--env`` files do. A
+    ``default`` profile with the app defaults is added unless the file
+    defines one.
+    """
+    raw = {}
+    if path is not None:
+        with open(path, encoding="utf-8") as fh:
+            raw = json.load(fh)
+        if not isinstance(raw, dict):
+            raise ValueError("Profiles file must map profile names to settings")
+    profiles = {name: environment_from_settings(settings) for name, settings in raw.items()}
+    profiles.setdefault(DEFAULT_PROFILE, environment_from_settings({}))
+    return profiles
+
+
+def _finite(payload: dict, name: str) -> float:
+    value = float(payload[name])
+    if not math.isfinite(value):
+        raise QuoteError(f"Invalid model: {name} must be finite")
+    return value
+
+
+def parse_model(payload) -> ModelInput:
+    """Validate one quote request body into a ``ModelInput``.
+
+    NaN and infinite numbers (which ``json`` accepts) are rejected, so every
+    quote can be returned as strict JSON.
+    """
+    if not isinstance(payload, dict):
+        raise QuoteError("Each model must be a JSON object")
+    try:
+        target = payload.get("target_margin_percent")
+        return ModelInput(
+            model_name=payload.get("model_name"),
+            reference_url=payload.get("reference_url"),
+            filament_grams=_finite(payload, "filament_grams"),
+            print_time_hours=_finite(payload, "print_time_hours"),
+            plate_count=int(_finite(payload, "plate_count")),
+            sale_price=_finite(payload, "sale_price"),
+            target_margin_percent=(
+                None if target is None else _finite(payload, "target_margin_percent")
+            ),
+        )
+    except KeyError as exc:
+        raise QuoteError(f"Missing field: {exc.args[0]}") from None
+    except QuoteError:
+        raise
+    except (TypeError, ValueError, OverflowError) as exc:
+        raise QuoteError(f"Invalid model: {exc}") from None
+
+
+def _finite_or_none(value: float) -> float | None:
+    return value if math.isfinite(value) else None
+
+
+def quote_models(
+    env: EnvironmentSettings, healthy_floor: float, models: list[ModelInput]
+) -> list[dict]:
+    """Cost and classify models in one vectorized batch.
+
+    Each quote carries the ``CostBreakdown`` fields (identical to
+    ``calculate_costs``), the break-even and healthy prices and the status.
+    Numbers that overflow to infinity (or are undefined) are returned as
+    ``None``, so every quote is strict JSON.
+    """
+    n = len(models)
+    arrays = {
+        "filament_grams": np.fromiter((m.filament_grams for m in models), float, n),
+        "print_time_hours": np.fromiter((m.print_time_hours for m in models), float, n),
+        "plate_count": np.fromiter((m.plate_count for m in models), float, n),
+        "sale_price": np.fromiter((m.sale_price for m in models), float, n),
+        "target_margin_percent": np.fromiter(
+            (np.nan if m.target_margin_percent is None else m.target_margin_percent
+             for m in models),
+            float,
+            n,
+        ),
+    }
+    # Huge finite inputs may overflow; those values are returned as None
+    with np.errstate(over="ignore", invalid="ignore"):
+        batch = calculate_costs_batch(env, arrays)
+        statuses = status_labels(
+            classify_batch(arrays["sale_price"], batch.total_cost, healthy_floor)
+        ).tolist()
+        _, healthy_prices = calculate_break_even_and_health(batch.total_cost, healthy_floor)
+    healthy_prices = [None] * n if healthy_prices is None else healthy_prices.tolist()
+
+    quotes = []
+    for model, values, remote, status, healthy_price in zip(
+        models, batch.values.T.tolist(), batch.remote_friendly.tolist(), statuses, healthy_prices
+    ):
+        fields = {name: _finite_or_none(value) for name, value in zip(FLOAT_COST_FIELDS, values)}
+        fields["remote_friendly"] = remote
+        quotes.append({
+            "model_name": model.model_name,
+            **{name: fields[name] for name in COST_FIELDS},
+            "break_even_price": fields["total_cost"],
+            "healthy_price": None if healthy_price is None else _finite_or_none(healthy_price),
+            "status": status,
+        })
+    return quotes
+
+
+class QuoteBatcher:
+    """Coalesce concurrent single-quote requests into micro-batches.
+
+    Requests queue up until the event loop has handled every connection
+    that was ready (``max_wait`` of 0) or for ``max_wait`` seconds, or
+    until ``max_batch`` are waiting, and are then quoted together, one
+    vectorized batch per profile.
+    """
+
+    def __init__(
+        self,
+        profiles: dict[str, Profile],
+        max_batch: int = DEFAULT_MAX_BATCH,
+        max_wait: float = 0.0,
+    ):
+        self.profiles = profiles
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = 0
+        self.batches = 0
+        self._pending: list[tuple[str, ModelInput, asyncio.Future]] = []
+        self._flush_handle = None
+
+    def profile(self, name: str) -> Profile:
+        try:
+            return self.profiles[name]
+        except KeyError:
+            raise QuoteError(f"Unknown profile: {name}") from None
+
+    async def quote(self, profile: str, model: ModelInput) -> dict:
+        self.profile(profile)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((profile, model, future))
+        self.requests += 1
+        if len(self._pending) >= self.max_batch:
+            self.flush()
+        elif self._flush_handle is None:
+            if self.max_wait > 0:
+                self._flush_handle = loop.call_later(self.max_wait, self.flush)
+            else:
+                self._flush_handle = loop.call_soon(self.flush)
+        return await future
+
+    def flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        groups: dict[str, list] = {}
+        for item in pending:
+            groups.setdefault(item[0], []).append(item)
+
+        for name, items in groups.items():
+            self.batches += 1
+            env, healthy_floor = self.profiles[name]
+            try:
+                quotes = quote_models(env, healthy_floor, [model for _, model, _ in items])
+            except Exception as exc:
+                for _, _, future in items:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            for (_, _, future), quote in zip(items, quotes):
+                if not future.done():
+                    future.set_result(quote)
+
+
+class QuoteServer:
+    """HTTP/1.1 JSON endpoints over asyncio streams, with keep-alive.
+
+    ``GET /health``, ``GET /profiles``, ``POST /quote`` (one model, optional
+    ``profile``) and ``POST /quote/batch`` (``{"profile": ..., "models":
+    [...]}``).
+    """
+
+    def __init__(self, batcher: QuoteBatcher):
+        self.batcher = batcher
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> tuple[int, object]:
+        path = path.split("?", 1)[0].rstrip("/") or "/"
+        routes = {
+            "/health": ("GET", self._health),
+            "/profiles": ("GET", self._profiles),
+            "/quote": ("POST", self._quote),
+            "/quote/batch": ("POST", self._quote_batch),
+        }
+        if path not in routes:
+            return 404, {"error": f"No such endpoint: {path}"}
+        expected, handler = routes[path]
+        if method != expected:
+            return 405, {"error": f"{path} expects {expected}"}
+        try:
+            payload = json.loads(body) if body else None
+            return 200, await handler(payload)
+        except json.JSONDecodeError as exc:
+            return 400, {"error": f"Invalid JSON: {exc}"}
+        except QuoteError as exc:
+            return 400, {"error": str(exc)}
+        except Exception as exc:
+            return 500, {"error": f"{type(exc).__name__}: {exc}"}
+
+    async def _health(self, _payload) -> dict:
+        return {
+            "status": "ok",
+            "requests": self.batcher.requests,
+            "batches": self.batcher.batches,
+        }
+
+    async def _profiles(self, _payload) -> dict:
+        return {
+            name: {**asdict(env), "healthy_margin_floor_percent": floor}
+            for name, (env, floor) in self.batcher.profiles.items()
+        }
+
+    async def _quote(self, payload) -> dict:
+        if not isinstance(payload, dict):
+            raise QuoteError("Expected a JSON object")
+        profile = payload.get("profile", DEFAULT_PROFILE)
+        return await self.batcher.quote(profile, parse_model(payload))
+
+    async def _quote_batch(self, payload) -> dict:
+        if not isinstance(payload, dict) or not isinstance(payload.get("models"), list):
+            raise QuoteError('Expected {"models": [...]}')
+        profile = payload.get("profile", DEFAULT_PROFILE)
+        env, healthy_floor = self.batcher.profile(profile)
+        models = [parse_model(item) for item in payload["models"]]
+        quotes = quote_models(env, healthy_floor, models) if models else []
+        return {"profile": profile, "quotes": quotes}
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await _send(writer, 431, {"error": "Headers too large"}, False)
+                    break
+
+                request_line, *header_lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+                try:
+                    method, target, version = request_line.split(" ", 2)
+                except ValueError:
+                    await _send(writer, 400, {"error": "Malformed request line"}, False)
+                    break
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = (
+                    connection != "close"
+                    if version == "HTTP/1.1"
+                    else connection == "keep-alive"
+                )
+                length = headers.get("content-length") or "0"
+                if not (length.isascii() and length.isdigit()):
+                    await _send(writer, 400, {"error": "Invalid Content-Length"}, False)
+                    break
+                length = int(length)
+                if length > MAX_BODY_BYTES:
+                    await _send(writer, 413, {"error": "Request body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self.dispatch(method, target, body)
+                await _send(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+async def _send(writer: asyncio.StreamWriter, status: int, payload, keep_alive: bool) -> None:
+    try:
+        body = json.dumps(payload, allow_nan=False).encode("utf-8")
+    except (TypeError, ValueError) as exc:
+        status = 500
+        body = json.dumps({"error": f"Unserialisable response: {exc}"}).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+async def serve(
+    profiles: dict[str, Profile],
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    max_batch: int = DEFAULT_MAX_BATCH,
+    max_wait: float = 0.0,
+    ready=None,
+) -> None:
+    """Run the quote service until cancelled."""
+    server = await QuoteServer(QuoteBatcher(profiles, max_batch, max_wait)).start(host, port)
+    if ready is not None:
+        ready(server)
+    async with server:
+        await server.serve_forever()
+
+
+# ---------------------------------------------------------------------
+# Keep-alive client and load test
+# ---------------------------------------------------------------------
+class QuoteClient:
+    """Minimal HTTP/1.1 JSON client that keeps one connection open."""
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        self.host = host
+        self.port = port
+        self._reader = None
+        self._writer = None
+
+    async def __aenter__(self) -> "QuoteClient":
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._writer.close()
+        await self._writer.wait_closed()
+
+    async def request(self, method: str, path: str, payload=None) -> tuple[int, object]:
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        self._writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+        )
+        await self._writer.drain()
+
+        head = await self._reader.readuntil(b"\r\n\r\n")
+        status_line, *header_lines = head.decode("latin-1").rstrip("\r\n").split("\r\n")
+        length = 0
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        data = await self._reader.readexactly(length)
+        return int(status_line.split(" ", 2)[1]), json.loads(data)
+
+
+@dataclass
+class LoadTestReport:
+    latencies: list[float]
+    seconds: float
+    errors: int = 0
+
+    @property
+    def requests_per_second(self) -> float:
+        return len(self.latencies) / self.seconds if self.seconds > 0 else float("inf")
+
+    def percentile(self, p: float) -> float:
+        return float(np.percentile(self.latencies, p)) if self.latencies else float("nan")
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.latencies):,} requests in {self.seconds:.2f}s "
+            f"({self.requests_per_second:,.0f} req/s), {self.errors} errors | "
+            f"latency p50 {self.percentile(50) * 1000:.2f} ms, "
+            f"p99 {self.percentile(99) * 1000:.2f} ms"
+        )
+
+
+async def load_test(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    requests: int = 10_000,
+    concurrency: int = 64,
+    profile: str = DEFAULT_PROFILE,
+    batch_size: int = 1,
+    seed: int = 0,
+) -> LoadTestReport:
+    """Drive the service from ``concurrency`` keep-alive connections.
+
+    ``batch_size`` 1 sends single quotes (exercising coalescing); larger
+    values send that many models per ``/quote/batch`` request. Models come
+    from the synthetic benchmark portfolio.
+    """
+    from benchmark import generate_portfolio
+
+    sample = generate_portfolio(min(requests * batch_size, 4_096), seed)
+    sample = sample.drop(columns="reference_url").to_dict("records")
+    for model in sample:
+        if model["target_margin_percent"] != model["target_margin_percent"]:
+            model["target_margin_percent"] = None
+
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        async with QuoteClient(host, port) as client:
+            for i in counter:
+                if batch_size == 1:
+                    path, payload = "/quote", {**sample[i % len(sample)], "profile": profile}
+                else:
+                    start = i * batch_size
+                    models = [sample[(start + j) % len(sample)] for j in range(batch_size)]
+                    path, payload = "/quote/batch", {"profile": profile, "models": models}
+                started = time.perf_counter()
+                status, _ = await client.request("POST", path, payload)
+                latencies.append(time.perf_counter() - started)
+                errors += status != 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return LoadTestReport(latencies, time.perf_counter() - start, errors)
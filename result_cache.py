@@ -0,0 +1,69 @@
+# result_cache.py - Bounded LRU/TTL memoization of portfolio results
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import astuple
+
+from cost_model import EnvironmentSettings
+
+
+def content_digest(content: bytes) -> str:
+    """Return the SHA-256 hex digest of uploaded file content."""
+    return hashlib.sha256(content).hexdigest()
+
+
+def portfolio_cache_key(
+    digest: str, env_settings: EnvironmentSettings, healthy_floor: float
+) -> tuple:
+    """Key portfolio results on the upload and every setting that affects them."""
+    return (digest, astuple(env_settings), float(healthy_floor))
+
+
+class ResultCache:
+    """Thread-safe LRU cache whose entries also expire after ``ttl_seconds``."""
+
+    def __init__(
+        self,
+        max_entries: int = 16,
+        ttl_seconds: float | None = 3600.0,
+        clock=time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the cached value for ``key``, or ``None`` on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if self.ttl_seconds is None or self._clock() - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = (self._clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
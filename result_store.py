@@ -0,0 +1,374 @@
+# result_store.py - Persistent SQLite store of evaluated models
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, astuple
+
+import numpy as np
+import pandas as pd
+
+from cost_model import (
+    FLOAT_COST_FIELDS,
+    STATUS_LABELS,
+    CostBreakdownBatch,
+    EnvironmentSettings,
+)
+from portfolio import PortfolioResults, evaluate_portfolio
+
+
+# Bump when the table layout or the key derivation changes; older stores
+# are cleared on open since every row can be recomputed
+SCHEMA_VERSION = 2
+
+# Store used by the app when no other path is configured
+DEFAULT_STORE_PATH = "portfolio_results.sqlite"
+
+# Rows written per transaction by ``upsert``
+DEFAULT_BATCH_ROWS = 50_000
+
+# Rows kept before the oldest are evicted (about 300 MB on disk)
+DEFAULT_MAX_ROWS = 1_000_000
+
+INPUT_FIELDS = (
+    "filament_grams",
+    "print_time_hours",
+    "plate_count",
+    "sale_price",
+    "target_margin_percent",
+)
+# Fields that are filtered on get their own (indexed) columns; the full
+# inputs and breakdown are packed float64 blobs, so values round-trip
+# exactly and a lookup decodes one blob per row
+RESULT_COLUMNS = (
+    ("key", "INTEGER PRIMARY KEY"),
+    ("settings_key", "INTEGER NOT NULL"),
+    ("model_name", "TEXT"),
+    ("reference_url", "TEXT"),
+    ("status_code", "INTEGER NOT NULL"),
+    ("profit_margin_percent", "REAL"),
+    ("remote_friendly", "INTEGER NOT NULL"),
+    ("stored_at", "REAL NOT NULL"),
+    ("inputs", "BLOB NOT NULL"),
+    ("breakdown", "BLOB NOT NULL"),
+)
+
+
+def _pack_rows(values: np.ndarray) -> list[bytes]:
+    """One float64 blob per row of a 2-D array."""
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    flat = values.tobytes()
+    width = values.shape[1] * 8
+    return [flat[i:i + width] for i in range(0, len(flat), width)]
+
+
+def _unpack_rows(blobs, width: int) -> np.ndarray:
+    return np.frombuffer(b"".join(blobs), dtype=np.float64).reshape(-1, width)
+
+
+def settings_key(env_settings: EnvironmentSettings, healthy_floor: float) -> int:
+    """Signed 64-bit key of every setting that affects a result."""
+    payload = repr((astuple(env_settings), float(healthy_floor))).encode("utf-8")
+    return int.from_bytes(hashlib.sha256(payload).digest()[:8], "little", signed=True)
+
+
+def _text_column(df: pd.DataFrame, col: str) -> np.ndarray:
+    if col not in df:
+        return np.full(len(df), "", dtype=object)
+    return df[col].fillna("").astype(str).to_numpy(dtype=object)
+
+
+def _input_values(df: pd.DataFrame) -> np.ndarray:
+    columns = [
+        df[col].to_numpy(dtype=np.float64) if col in df else np.full(len(df), np.nan)
+        for col in INPUT_FIELDS
+    ]
+    return np.column_stack(columns) if len(df) else np.empty((0, len(INPUT_FIELDS)))
+
+
+def row_keys(df: pd.DataFrame, settings: int) -> np.ndarray:
+    """Signed 64-bit key of each row's ``ModelInput`` under ``settings``."""
+    content = pd.DataFrame({
+        "model_name": _text_column(df, "model_name"),
+        "reference_url": _text_column(df, "reference_url"),
+        **{col: values for col, values in zip(INPUT_FIELDS, _input_values(df).T)},
+        "settings": np.full(len(df), settings, dtype=np.int64),
+    })
+    return pd.util.hash_pandas_object(content, index=False).to_numpy().view(np.int64)
+
+
+class ResultStore:
+    """Evaluated models keyed by ``ModelInput`` plus settings, in SQLite.
+
+    Safe to share between threads; the database uses WAL so several
+    processes can read while one writes. After each write, rows older than
+    ``max_age_days`` and then the oldest rows beyond ``max_rows`` are
+    evicted (``None`` disables either limit).
+    """
+
+    def __init__(
+        self,
+        path,
+        batch_rows: int = DEFAULT_BATCH_ROWS,
+        max_rows: int | None = DEFAULT_MAX_ROWS,
+        max_age_days: float | None = None,
+    ):
+        self.path = str(path)
+        self.batch_rows = batch_rows
+        self.max_rows = max_rows
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA cache_size=-65536")
+        self._create_schema()
+
+    def __enter__(self) -> "ResultStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _create_schema(self) -> None:
+        conn = self._conn
+        with conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                conn.execute("DROP TABLE IF EXISTS results")
+                conn.execute("DROP TABLE IF EXISTS settings")
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            columns = ", ".join(f"{name} {kind}" for name, kind in RESULT_COLUMNS)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS results ({columns})")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS settings "
+                "(settings_key INTEGER PRIMARY KEY, settings TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS results_model_name ON results (model_name)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS results_status "
+                "ON results (settings_key, status_code)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS results_margin "
+                "ON results (settings_key, profit_margin_percent)"
+            )
+            # Status and margin filters may come without a settings profile
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS results_status_any ON results (status_code)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS results_margin_any "
+                "ON results (profit_margin_percent)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS results_stored_at ON results (stored_at)"
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def fetch(self, keys: np.ndarray) -> tuple[np.ndarray, CostBreakdownBatch, np.ndarray]:
+        """Stored results for ``keys``.
+
+        Returns the positions in ``keys`` that were found, and their
+        breakdowns and status codes in the same order.
+        """
+        with self._lock, self._conn as conn:
+            conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS lookup "
+                "(pos INTEGER PRIMARY KEY, key INTEGER NOT NULL)"
+            )
+            conn.execute("DELETE FROM lookup")
+            conn.executemany("INSERT INTO lookup VALUES (?, ?)", enumerate(keys.tolist()))
+            rows = conn.execute(
+                "SELECT l.pos, r.remote_friendly, r.status_code, r.breakdown "
+                "FROM lookup l JOIN results r ON r.key = l.key"
+            ).fetchall()
+            conn.execute("DELETE FROM lookup")
+
+        if not rows:
+            return np.empty(0, dtype=np.int64), CostBreakdownBatch.empty(0), np.empty(0, np.int8)
+        positions, remote, status, blobs = zip(*rows)
+        breakdown = CostBreakdownBatch(
+            np.ascontiguousarray(_unpack_rows(blobs, len(FLOAT_COST_FIELDS)).T),
+            np.array(remote, dtype=bool),
+        )
+        return np.array(positions, dtype=np.int64), breakdown, np.array(status, dtype=np.int8)
+
+    def upsert(
+        self,
+        env_settings: EnvironmentSettings,
+        healthy_floor: float,
+        results: PortfolioResults,
+        keys: np.ndarray | None = None,
+    ) -> None:
+        """Insert or replace results, ``batch_rows`` rows per transaction.
+
+        Rows are written in key order, which keeps B-tree inserts local.
+        """
+        settings = settings_key(env_settings, healthy_floor)
+        if keys is None:
+            keys = row_keys(results.inputs, settings)
+        order = np.argsort(keys, kind="stable")
+        inputs = results.inputs.iloc[order]
+        breakdown = results.breakdown
+        columns = [
+            keys[order].tolist(),
+            [settings] * len(keys),
+            _text_column(inputs, "model_name").tolist(),
+            _text_column(inputs, "reference_url").tolist(),
+            results.status_codes[order].tolist(),
+            # SQLite stores NaN as NULL, which reads back as NaN
+            breakdown.profit_margin_percent[order].tolist(),
+            breakdown.remote_friendly[order].astype(int).tolist(),
+            [time.time()] * len(keys),
+            _pack_rows(_input_values(inputs)),
+            _pack_rows(breakdown.values[:, order].T),
+        ]
+        placeholders = ", ".join("?" * len(RESULT_COLUMNS))
+        sql = f"INSERT OR REPLACE INTO results VALUES ({placeholders})"
+        settings_json = json.dumps(
+            {**asdict(env_settings), "healthy_margin_floor_percent": float(healthy_floor)}
+        )
+
+        rows = list(zip(*columns))
+        with self._lock:
+            with self._conn as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO settings VALUES (?, ?)", (settings, settings_json)
+                )
+            for start in range(0, len(rows), self.batch_rows):
+                with self._conn as conn:
+                    conn.executemany(sql, rows[start:start + self.batch_rows])
+            self._evict()
+
+    def _evict(self) -> None:
+        """Apply the age and size limits; callers hold the lock."""
+        with self._conn as conn:
+            if self.max_age_days is not None:
+                cutoff = time.time() - self.max_age_days * 86_400.0
+                conn.execute("DELETE FROM results WHERE stored_at < ?", (cutoff,))
+            if self.max_rows is not None:
+                excess = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_rows
+                if excess > 0:
+                    conn.execute(
+                        "DELETE FROM results WHERE key IN "
+                        "(SELECT key FROM results ORDER BY stored_at LIMIT ?)",
+                        (excess,),
+                    )
+            conn.execute(
+                "DELETE FROM settings WHERE settings_key NOT IN "
+                "(SELECT DISTINCT settings_key FROM results)"
+            )
+
+    def evaluate_portfolio(
+        self, env_settings: EnvironmentSettings, df: pd.DataFrame, healthy_floor: float
+    ) -> PortfolioResults:
+        """``evaluate_portfolio`` that reads through the store.
+
+        Rows already stored for these settings are looked up; the rest are
+        costed in one batch and written back.
+        """
+        df = df.reset_index(drop=True)
+        keys = row_keys(df, settings_key(env_settings, healthy_floor))
+        found, stored, stored_status = self.fetch(keys)
+        self.hits += len(found)
+        self.misses += len(df) - len(found)
+
+        breakdown = CostBreakdownBatch.empty(len(df))
+        status_codes = np.empty(len(df), dtype=np.int8)
+        breakdown.values[:, found] = stored.values
+        breakdown.remote_friendly[found] = stored.remote_friendly
+        status_codes[found] = stored_status
+
+        missing = np.ones(len(df), dtype=bool)
+        missing[found] = False
+        missing = np.flatnonzero(missing)
+        if len(missing):
+            fresh = evaluate_portfolio(env_settings, df.iloc[missing], healthy_floor)
+            self.upsert(env_settings, healthy_floor, fresh, keys[missing])
+            breakdown.values[:, missing] = fresh.breakdown.values
+            breakdown.remote_friendly[missing] = fresh.breakdown.remote_friendly
+            status_codes[missing] = fresh.status_codes
+
+        return PortfolioResults(df, breakdown, status_codes)
+
+    def query(
+        self,
+        model_name: str | None = None,
+        status: str | None = None,
+        min_margin: float | None = None,
+        max_margin: float | None = None,
+        env_settings: EnvironmentSettings | None = None,
+        healthy_floor: float | None = None,
+        limit: int | None = None,
+    ) -> pd.DataFrame:
+        """Stored results matching every given filter.
+
+        Pass ``env_settings`` and ``healthy_floor`` together to restrict the
+        results to one settings profile; the margin range is inclusive.
+        """
+        if (env_settings is None) != (healthy_floor is None):
+            raise ValueError("Pass env_settings and healthy_floor together")
+        where, params = [], []
+        if env_settings is not None:
+            where.append("r.settings_key = ?")
+            params.append(settings_key(env_settings, healthy_floor))
+        if model_name is not None:
+            where.append("r.model_name = ?")
+            params.append(model_name)
+        if status is not None:
+            if status not in STATUS_LABELS:
+                raise ValueError(f"Unknown status: {status}")
+            where.append("r.status_code = ?")
+            params.append(STATUS_LABELS.index(status))
+        if min_margin is not None:
+            where.append("r.profit_margin_percent >= ?")
+            params.append(min_margin)
+        if max_margin is not None:
+            where.append("r.profit_margin_percent <= ?")
+            params.append(max_margin)
+
+        sql = (
+            "SELECT r.settings_key, s.settings, r.model_name, r.reference_url, "
+            "r.status_code, r.remote_friendly, r.inputs, r.breakdown "
+            "FROM results r JOIN settings s USING (settings_key)"
+        )
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        keys, settings, names, urls, status, remote, inputs, breakdown = (
+            zip(*rows) if rows else ((),) * 8
+        )
+        df = pd.DataFrame({
+            "settings_key": np.array(keys, dtype=np.int64),
+            "settings": list(settings),
+            "model_name": list(names),
+            "reference_url": list(urls),
+        })
+        for name, values in zip(INPUT_FIELDS, _unpack_rows(inputs, len(INPUT_FIELDS)).T):
+            df[name] = values
+        for name, values in zip(FLOAT_COST_FIELDS, _unpack_rows(breakdown, len(FLOAT_COST_FIELDS)).T):
+            df[name] = values
+        df.insert(
+            df.columns.get_loc("profit_margin_percent") + 1,
+            "remote_friendly",
+            np.array(remote, dtype=bool),
+        )
+        df["status"] = np.asarray(STATUS_LABELS, dtype=object)[np.array(status, dtype=np.int64)]
+        return df
@@ -0,0 +1,153 @@
+# sensitivity.py - Parameter sweeps over EnvironmentSettings
+
+from dataclasses import dataclass, fields, replace
+
+import numpy as np
+import pandas as pd
+
+from cost_model import (
+    CostQuantities,
+    EnvironmentSettings,
+    cost_coefficients,
+)
+
+
+SWEEPABLE_FIELDS = tuple(
+    f.name for f in fields(EnvironmentSettings) if f.name != "has_automation"
+)
+
+# Upper bound on the models x grid-points block compared at once
+BLOCK_CELLS = 4_000_000
+
+
+@dataclass
+class SweepResult:
+    """Portfolio aggregates over a Cartesian grid of settings.
+
+    Every surface has one axis per swept field, in ``axes`` order. There is
+    a count for each of ``STATUS_LABELS``; statuses no model can reach
+    under the healthy floor count 0.
+    """
+    axes: dict[str, np.ndarray]
+    total_profit: np.ndarray
+    average_margin: np.ndarray
+    losing_count: np.ndarray
+    low_margin_count: np.ndarray
+    healthy_count: np.ndarray
+    profitable_count: np.ndarray
+
+    def surface(self, metric: str) -> np.ndarray:
+        return getattr(self, metric)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Long format: one row per grid point."""
+        grid = np.meshgrid(*self.axes.values(), indexing="ij")
+        columns = {name: values.ravel() for name, values in zip(self.axes, grid)}
+        for metric in (
+            "total_profit",
+            "average_margin",
+            "losing_count",
+            "low_margin_count",
+            "healthy_count",
+            "profitable_count",
+        ):
+            columns[metric] = self.surface(metric).ravel()
+        return pd.DataFrame(columns)
+
+
+def sweep(
+    env: EnvironmentSettings,
+    quantities: CostQuantities,
+    ranges: dict[str, "np.typing.ArrayLike"],
+    healthy_floor: float,
+) -> SweepResult:
+    """Evaluate a portfolio over every combination of the given settings.
+
+    ``ranges`` maps ``EnvironmentSettings`` field names to the values to try;
+    other fields keep their value in ``env``. Cost coefficients for all grid
+    points are built by broadcasting, total profit and average margin follow
+    directly from them, and status counts compare blocks of grid points
+    against the whole portfolio at once.
+    """
+    unknown = set(ranges) - set(SWEEPABLE_FIELDS)
+    if unknown:
+        raise ValueError(f"Cannot sweep: {', '.join(sorted(unknown))}")
+
+    axes = {name: np.asarray(values, dtype=np.float64) for name, values in ranges.items()}
+    shape = tuple(len(values) for values in axes.values())
+    grid = np.meshgrid(*axes.values(), indexing="ij")
+    points = {name: values.ravel() for name, values in zip(axes, grid)}
+    n_points = int(np.prod(shape))
+
+    total_profit = np.empty(n_points)
+    average_margin = np.empty(n_points)
+    losing = np.empty(n_points, dtype=np.int64)
+    low_margin = np.empty(n_points, dtype=np.int64)
+    healthy = np.empty(n_points, dtype=np.int64)
+    profitable = np.zeros(n_points, dtype=np.int64)
+
+    # Capacity changes the plate column, so evaluate each capacity separately
+    capacities = points.get("automated_plate_capacity")
+    groups = (
+        [(env.automated_plate_capacity, np.arange(n_points))]
+        if capacities is None
+        else [(c, np.flatnonzero(capacities == c)) for c in np.unique(capacities)]
+    )
+
+    sale_price = quantities.sale_price
+    positive_sale = sale_price > 0
+    healthy_sale = (
+        sale_price * (1.0 - healthy_floor / 100.0)
+        if 0 < healthy_floor < 100
+        else None
+    )
+    block = max(1, BLOCK_CELLS // max(len(sale_price), 1))
+
+    for capacity, idx in groups:
+        group_env = replace(env, automated_plate_capacity=int(capacity))
+        group_quantities = quantities.with_plate_policy(group_env)
+        matrix = group_quantities.matrix
+        column_totals = matrix.sum(axis=0)
+        margin_totals = (matrix[positive_sale] / sale_price[positive_sale, None]).sum(axis=0)
+
+        swept_env = replace(
+            group_env,
+            **{name: values[idx] for name, values in points.items()},
+        )
+        coefficients = np.broadcast_to(
+            cost_coefficients(swept_env).reshape(matrix.shape[1], -1),
+            (matrix.shape[1], len(idx)),
+        )
+
+        total_profit[idx] = sale_price.sum() - column_totals @ coefficients
+        n_positive = positive_sale.sum()
+        average_margin[idx] = (
+            100.0 * (n_positive - margin_totals @ coefficients) / n_positive
+            if n_positive
+            else np.nan
+        )
+
+        for start in range(0, len(idx), block):
+            cols = slice(start, start + block)
+            cost = matrix @ coefficients[:, cols]
+            losing_block = np.count_nonzero(sale_price[:, None] < cost, axis=0)
+            losing[idx[cols]] = losing_block
+            if healthy_sale is None:
+                # Without a healthy price every model that covers its cost is Profitable
+                low_margin[idx[cols]] = 0
+                healthy[idx[cols]] = 0
+                profitable[idx[cols]] = len(sale_price) - losing_block
+                continue
+            healthy_block = np.count_nonzero(healthy_sale[:, None] >= cost, axis=0)
+            healthy[idx[cols]] = healthy_block
+            low_margin[idx[cols]] = len(sale_price) - losing_block - healthy_block
+
+    return SweepResult(
+        axes=axes,
+        total_profit=total_profit.reshape(shape),
+        average_margin=average_margin.reshape(shape),
+        losing_count=losing.reshape(shape),
+        low_margin_count=low_margin.reshape(shape),
+        healthy_count=healthy.reshape(shape),
+        profitable_count=profitable.reshape(shape),
+    )
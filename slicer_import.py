@@ -0,0 +1,347 @@
+# slicer_import.py - Read filament, time and plates from sliced G-code and 3MF files
+
+import math
+import mmap
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from xml.etree import ElementTree
+
+import numpy as np
+import pandas as pd
+
+from cost_model import ModelInput
+from portfolio import INPUT_COLUMNS
+
+SLICER_SUFFIXES = (".gcode", ".gco", ".3mf")
+
+# Slicers put their summary in a comment block at the start (Bambu Studio,
+# Cura) or near the end (PrusaSlicer, OrcaSlicer, Simplify3D). Tail windows
+# grow until the values are found; PrusaSlicer's config dump after the
+# summary is usually well under the first one.
+HEAD_BYTES = 64 * 1024
+TAIL_WINDOWS = (256 * 1024, 4 * 1024 * 1024, 32 * 1024 * 1024)
+
+# Cura reports filament length only; weight assumes 1.75 mm PLA
+DEFAULT_FILAMENT_DIAMETER_MM = 1.75
+DEFAULT_FILAMENT_DENSITY_G_CM3 = 1.24
+
+# Comment keys in order of preference, lower-cased
+WEIGHT_KEYS = (
+    "total filament used [g]",
+    "total filament weight [g]",
+    "filament used [g]",
+    "plastic weight",
+)
+TIME_KEYS = (
+    "estimated printing time (normal mode)",
+    "total estimated time",
+    "model printing time",
+    "print.time",
+    "time",
+    "build time",
+)
+LENGTH_KEYS = ("filament used",)
+
+# Errors that mean a file could not be imported
+READ_ERRORS = (OSError, ValueError, zipfile.BadZipFile, ElementTree.ParseError)
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_PARENTHESISED = re.compile(r"\([^)]*\)")
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)\s*(d|h|m|s)[a-z]*", re.IGNORECASE)
+_PLATE_GCODE = re.compile(r"Metadata/plate_(\d+)\.gcode$")
+_UNIT_SECONDS = {"d": 86_400.0, "h": 3_600.0, "m": 60.0, "s": 1.0}
+
+
+@dataclass
+class SlicedPlate:
+    index: int
+    filament_grams: float
+    print_time_hours: float
+
+
+@dataclass
+class SlicedModel:
+    """Slicer estimates for one file; 3MF projects have one entry per plate."""
+    name: str
+    path: str
+    plates: list[SlicedPlate]
+
+    @property
+    def filament_grams(self) -> float:
+        return sum(plate.filament_grams for plate in self.plates)
+
+    @property
+    def print_time_hours(self) -> float:
+        return sum(plate.print_time_hours for plate in self.plates)
+
+    @property
+    def plate_count(self) -> int:
+        return len(self.plates)
+
+    def to_model_input(self, sale_price: float, reference_url: str = "") -> ModelInput:
+        return ModelInput(
+            model_name=self.name,
+            reference_url=reference_url,
+            filament_grams=self.filament_grams,
+            print_time_hours=self.print_time_hours,
+            plate_count=self.plate_count,
+            sale_price=sale_price,
+        )
+
+
+def model_name_from_path(path) -> str:
+    name = os.path.basename(str(path))
+    for suffix in (".gcode.3mf",) + SLICER_SUFFIXES:
+        if name.lower().endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+def parse_duration(text: str) -> float:
+    """Seconds in ``1d 2h 3m 4s``, ``2 hours 5 minutes`` or a bare number of seconds."""
+    text = text.strip()
+    parts = _DURATION.findall(text)
+    if parts:
+        return sum(float(value) * _UNIT_SECONDS[unit.lower()] for value, unit in parts)
+    return float(text)
+
+
+def parse_comments(data: bytes) -> dict[str, str]:
+    """``key -> value`` pairs from ``; key = value`` / ``;key: value`` comment lines.
+
+    Several pairs on one line (Bambu Studio's ``; model printing time: ...;
+    total estimated time: ...``) are split apart. The first occurrence of a
+    key wins.
+    """
+    found = {}
+    for line in data.decode("utf-8", errors="replace").splitlines():
+        if not line.startswith(";"):
+            continue
+        for part in line.split(";"):
+            key, sep, value = part.partition("=")
+            if not sep:
+                key, sep, value = part.partition(":")
+            if sep:
+                found.setdefault(key.strip().lower(), value.strip())
+    return found
+
+
+def _total(value: str) -> float:
+    """Sum of a value's numbers, without parenthesised conversions.
+
+    Per-extruder lists ("1.20, 3.40") are summed; Simplify3D's
+    "42.22 g (0.09 lb)" is 42.22.
+    """
+    return sum(float(v) for v in _NUMBER.findall(_PARENTHESISED.sub("", value)))
+
+
+def _weight(comments: dict[str, str]) -> float | None:
+    for key in WEIGHT_KEYS:
+        if key in comments:
+            return _total(comments[key])
+    for key in LENGTH_KEYS:
+        if comments.get(key, "").endswith("m"):
+            metres = _total(comments[key])
+            area_mm2 = math.pi * (DEFAULT_FILAMENT_DIAMETER_MM / 2.0) ** 2
+            return metres * 1000.0 * area_mm2 / 1000.0 * DEFAULT_FILAMENT_DENSITY_G_CM3
+    return None
+
+
+def _hours(comments: dict[str, str]) -> float | None:
+    for key in TIME_KEYS:
+        if key in comments:
+            try:
+                return parse_duration(comments[key]) / 3600.0
+            except ValueError:
+                continue
+    return None
+
+
+def _estimates(comments: dict[str, str]) -> tuple[float | None, float | None]:
+    return _weight(comments), _hours(comments)
+
+
+def _plate(index: int, comments: dict[str, str], source: str) -> SlicedPlate:
+    grams, hours = _estimates(comments)
+    if grams is None or hours is None:
+        missing = "filament weight" if grams is None else "print time"
+        raise ValueError(f"No {missing} found in {source}")
+    return SlicedPlate(index, grams, hours)
+
+
+def _source_name(source) -> str:
+    return str(getattr(source, "name", source))
+
+
+def _gcode_comments(data, size: int) -> dict[str, str]:
+    """Comments from the head of ``data`` and, until found, growing tail windows."""
+    comments = parse_comments(bytes(data[:HEAD_BYTES]))
+    for window in TAIL_WINDOWS:
+        if None not in _estimates(comments):
+            break
+        # Tail values override head ones (e.g. Cura's ;TIME header)
+        comments = {**comments, **parse_comments(bytes(data[max(size - window, 0):]))}
+        if window >= size:
+            break
+    return comments
+
+
+def read_gcode(source) -> SlicedModel:
+    """Slicer estimates of a plain G-code file path or in-memory upload.
+
+    Files are memory-mapped and only their head and growing tail windows
+    are parsed, so size does not matter.
+    """
+    name = _source_name(source)
+    if hasattr(source, "getbuffer"):
+        with source.getbuffer() as data:
+            comments = _gcode_comments(data, len(data)) if len(data) else None
+    else:
+        with open(source, "rb") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            comments = None
+            if size:
+                with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    comments = _gcode_comments(data, size)
+    if comments is None:
+        raise ValueError(f"{name} is empty")
+    return SlicedModel(model_name_from_path(name), name, [_plate(1, comments, name)])
+
+
+def _slice_info_plates(archive: zipfile.ZipFile) -> list[SlicedPlate]:
+    """Per-plate estimates from a Bambu/Orca project's ``slice_info.config``."""
+    try:
+        config = archive.read("Metadata/slice_info.config")
+    except KeyError:
+        return []
+    plates = []
+    for plate in ElementTree.fromstring(config).iter("plate"):
+        meta = {m.get("key"): m.get("value") for m in plate.iter("metadata")}
+        try:
+            index = int(meta["index"])
+            seconds = float(meta["prediction"])
+            grams = meta.get("weight")
+            grams = (
+                float(grams)
+                if grams
+                else sum(float(f.get("used_g", 0.0)) for f in plate.iter("filament"))
+            )
+        except (KeyError, TypeError, ValueError):
+            return []
+        plates.append(SlicedPlate(index, grams, seconds / 3600.0))
+    return plates
+
+
+def _member_comments(archive: zipfile.ZipFile, member: str) -> dict[str, str]:
+    """Comments from a compressed G-code member: its head, then a bounded tail.
+
+    Compressed members cannot be mapped, so the tail is found by streaming
+    through the member while keeping only the last window.
+    """
+    with archive.open(member) as fh:
+        comments = parse_comments(fh.read(HEAD_BYTES))
+        if None not in _estimates(comments):
+            return comments
+        tail = b""
+        window = TAIL_WINDOWS[0]
+        while block := fh.read(1 << 20):
+            tail = (tail + block)[-window:]
+    return {**comments, **parse_comments(tail)}
+
+
+def read_3mf(source) -> SlicedModel:
+    """Slicer estimates of a sliced 3MF project, one entry per plate."""
+    path = _source_name(source)
+    with zipfile.ZipFile(source) as archive:
+        plates = _slice_info_plates(archive)
+        if not plates:
+            members = sorted(
+                (int(match.group(1)), name)
+                for name in archive.namelist()
+                if (match := _PLATE_GCODE.search(name))
+            )
+            plates = [
+                _plate(index, _member_comments(archive, name), f"{path}:{name}")
+                for index, name in members
+            ]
+    if not plates:
+        raise ValueError(f"{path} has no sliced plates; slice and export it as .gcode.3mf")
+    return SlicedModel(model_name_from_path(path), path, sorted(plates, key=lambda p: p.index))
+
+
+def read_slicer_file(source) -> SlicedModel:
+    """Slicer estimates of a ``.gcode`` or sliced ``.3mf`` path or upload."""
+    is_zip = zipfile.is_zipfile(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return read_3mf(source) if is_zip else read_gcode(source)
+
+
+def find_slicer_files(directory) -> list[str]:
+    """Sliced files under ``directory``, recursively, in sorted order."""
+    paths = []
+    for root, _, names in os.walk(directory):
+        paths.extend(
+            os.path.join(root, name) for name in names if name.lower().endswith(SLICER_SUFFIXES)
+        )
+    return sorted(paths)
+
+
+def _read_or_error(path) -> tuple[SlicedModel | None, str | None]:
+    try:
+        return read_slicer_file(path), None
+    except READ_ERRORS as exc:
+        return None, str(exc)
+
+
+def read_slicer_files(paths, workers: int = 1) -> tuple[list[SlicedModel], pd.DataFrame]:
+    """Read many files, on ``workers`` processes when above 1.
+
+    Files that cannot be read are skipped and listed with the reason.
+    Models keep the order of ``paths``.
+    """
+    paths = [str(path) for path in paths]
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(paths) // (workers * 8))
+            outcomes = list(pool.map(_read_or_error, paths, chunksize=chunksize))
+    else:
+        outcomes = [_read_or_error(path) for path in paths]
+    models = [model for model, _ in outcomes if model is not None]
+    errors = pd.DataFrame(
+        [(path, error) for path, (_, error) in zip(paths, outcomes) if error is not None],
+        columns=["File", "Reason"],
+    )
+    return models, errors
+
+
+def portfolio_frame(
+    models: list[SlicedModel], sale_price: float = np.nan, per_plate: bool = False
+) -> pd.DataFrame:
+    """Portfolio template columns for imported models.
+
+    ``sale_price`` is left blank by default, to fill in before costing.
+    With ``per_plate`` each plate of a project is its own one-plate row.
+    """
+    if per_plate:
+        rows = [
+            (f"{model.name} (plate {plate.index})", model.path, plate.filament_grams,
+             plate.print_time_hours, 1)
+            for model in models
+            for plate in model.plates
+        ]
+    else:
+        rows = [
+            (model.name, model.path, model.filament_grams, model.print_time_hours,
+             model.plate_count)
+            for model in models
+        ]
+    frame = pd.DataFrame(
+        rows,
+        columns=["model_name", "reference_url", "filament_grams", "print_time_hours", "plate_count"],
+    )
+    frame["sale_price"] = sale_price
+    return frame[list(INPUT_COLUMNS)]
@@ -0,0 +1,54 @@
+"""Tests for the synthetic portfolio generator and benchmark comparison."""
+
+import pandas as pd
+
+from benchmark import (
+    STAGES,
+    BenchmarkReport,
+    BenchmarkTiming,
+    _scalar_loop,
+    benchmark_size,
+    generate_portfolio,
+)
+from cli import main
+from cost_model import STATUS_LABELS, calculate_costs_batch, classify_batch
+from portfolio import REQUIRED_COLUMNS, evaluate_portfolio, load_environment
+
+
+def test_generator_is_seeded_and_covers_every_status():
+    df = generate_portfolio(5_000, seed=3)
+    pd.testing.assert_frame_equal(df, generate_portfolio(5_000, seed=3))
+    assert set(REQUIRED_COLUMNS) <= set(df.columns)
+    assert (df["filament_grams"] > 0).all() and (df["plate_count"] >= 1).all()
+
+    env, healthy_floor = load_environment(None)
+    counts = evaluate_portfolio(env, df, healthy_floor).status_codes
+    assert set(counts.tolist()) == {0, 1, 2}  # Losing, Low margin, Healthy
+
+
+def test_benchmark_times_every_stage(tmp_path):
+    env, healthy_floor = load_environment(None)
+    timings = benchmark_size("tiny", 200, env, healthy_floor, repeat=1, workdir=tmp_path)
+    assert [t.stage for t in timings] == list(STAGES)
+    assert all(t.rows == 200 and len(t.seconds) == 1 for t in timings)
+
+
+def test_scalar_loop_classifies_like_the_batch_stage():
+    env, healthy_floor = load_environment(None)
+    df = generate_portfolio(2_000, seed=5)
+    codes = classify_batch(
+        df["sale_price"].to_numpy(), calculate_costs_batch(env, df).total_cost, healthy_floor
+    )
+    assert _scalar_loop(env, df, healthy_floor) == [STATUS_LABELS[code] for code in codes]
+
+
+def test_compare_flags_regressions(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    current = tmp_path / "current.json"
+    BenchmarkReport([BenchmarkTiming("1k", "batch", 1_000, [0.010])]).save(baseline)
+
+    BenchmarkReport([BenchmarkTiming("1k", "batch", 1_000, [0.0105])]).save(current)
+    assert main(["bench-compare", str(baseline), str(current)]) == 0
+
+    BenchmarkReport([BenchmarkTiming("1k", "batch", 1_000, [0.020])]).save(current)
+    assert main(["bench-compare", str(baseline), str(current)]) == 1
@@ -1,7 +1,61 @@
 #!/usr/bin/env python3
 """Test the cost model with the provided test case."""
 
-from cost_model import EnvironmentSettings, ModelInput, calculate_costs
+import dataclasses
+import math
+
+import numpy as np
+import pandas as pd
+
+from cost_model import (
+    LINEAR_SETTINGS,
+    CostBreakdown,
+    EnvironmentSettings,
+    ModelInput,
+    breakdown_from_quantities,
+    calculate_break_even_and_health,
+    calculate_costs,
+    calculate_costs_batch,
+    classify_batch,
+    classify_model,
+    cost_budget,
+    margin_price,
+    max_quantity,
+    max_setting,
+    precompute_quantities,
+    reprice,
+    status_labels,
+)
+
+
+def make_env(**overrides) -> EnvironmentSettings:
+    settings = dict(
+        filament_price_per_kg=25.0,
+        electricity_price_per_kwh=0.30,
+        printer_power_watts=250.0,
+        labour_rate_per_hour=30.0,
+        prep_time_minutes=10.0,
+        cleanup_time_minutes=10.0,
+        plate_change_time_minutes=5.0,
+        remote_check_minutes_per_hour=2.0,
+        has_automation=False,
+        automated_plate_capacity=4,
+    )
+    settings.update(overrides)
+    return EnvironmentSettings(**settings)
+
+
+def make_portfolio(n: int = 500, seed: int = 7) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "model_name": [f"Model {i}" for i in range(n)],
+        "reference_url": [""] * n,
+        "filament_grams": rng.uniform(-10.0, 800.0, n).round(1),
+        "print_time_hours": rng.uniform(-1.0, 40.0, n).round(2),
+        "plate_count": rng.integers(-1, 9, n),
+        "sale_price": rng.uniform(-5.0, 120.0, n).round(2),
+        "target_margin_percent": rng.choice([np.nan, 0.0, 30.0, 99.0, 100.0, -5.0], n),
+    })
 
 
 def test_example_case():
@@ -107,5 +161,97 @@ def test_example_case():
     print("=" * 60)
 
 
+def test_batch_matches_scalar():
+    """calculate_costs_batch reproduces calculate_costs exactly, row by row."""
+    df = make_portfolio()
+    for env in (
+        make_env(),
+        make_env(has_automation=True, automated_plate_capacity=4),
+        make_env(has_automation=True, automated_plate_capacity=1),
+    ):
+        batch = calculate_costs_batch(env, df)
+        status = status_labels(classify_batch(df["sale_price"], batch.total_cost, 20.0))
+        for i, row in enumerate(df.itertuples(index=False)):
+            target = None if math.isnan(row.target_margin_percent) else row.target_margin_percent
+            expected = calculate_costs(env, ModelInput(
+                model_name=row.model_name,
+                reference_url=row.reference_url,
+                filament_grams=row.filament_grams,
+                print_time_hours=row.print_time_hours,
+                plate_count=row.plate_count,
+                sale_price=row.sale_price,
+                target_margin_percent=target,
+            ))
+            assert batch[i].to_breakdown() == expected
+            _, healthy_price = calculate_break_even_and_health(expected.total_cost, 20.0)
+            assert status[i] == classify_model(row.sale_price, expected.total_cost, healthy_price)
+
+
+def test_reprice_matches_batch_across_settings():
+    """Precomputed quantities re-price to the batch totals for any settings."""
+    df = make_portfolio()
+    quantities = precompute_quantities(make_env(), df)
+    for env in (
+        make_env(filament_price_per_kg=40.0, electricity_price_per_kwh=0.6),
+        make_env(labour_rate_per_hour=55.0, remote_check_minutes_per_hour=0.0),
+        make_env(has_automation=True, automated_plate_capacity=3),
+        make_env(has_automation=True, automated_plate_capacity=6, prep_time_minutes=2.0),
+    ):
+        quantities = quantities.with_plate_policy(env)
+        expected = calculate_costs_batch(env, df.drop(columns="target_margin_percent"))
+        np.testing.assert_allclose(
+            reprice(env, quantities), expected.total_cost, rtol=1e-12, atol=1e-12
+        )
+        breakdown = breakdown_from_quantities(env, quantities)
+        np.testing.assert_allclose(breakdown.values, expected.values, rtol=1e-12, atol=1e-9)
+        np.testing.assert_array_equal(breakdown.remote_friendly, expected.remote_friendly)
+
+
+def test_batch_frame_is_zero_copy():
+    batch = calculate_costs_batch(make_env(), make_portfolio(100))
+    frame = batch.to_frame()
+
+    assert list(frame.columns) == [f.name for f in dataclasses.fields(CostBreakdown)]
+    assert np.shares_memory(frame["total_cost"].to_numpy(), batch.values)
+    assert frame["profit"].iloc[5] == batch[5].profit == batch.profit[5]
+
+
+def test_inverse_pricing_lands_on_the_budget():
+    """Each solved value costs exactly the budget; a little more goes over it."""
+    env = make_env(has_automation=True, automated_plate_capacity=3)
+    df = make_portfolio()
+    quantities = precompute_quantities(env, df)
+    budget = cost_budget(quantities.sale_price, 20.0)
+
+    def total_cost(env, **columns):
+        return calculate_costs_batch(env, df.assign(**columns)).total_cost
+
+    for setting in LINEAR_SETTINGS:
+        largest = max_setting(env, quantities, setting, budget)
+        finite = np.isfinite(largest)
+        assert finite.sum() > 100
+        assert (largest[finite] >= 0).all()
+        for i in np.flatnonzero(finite)[:20]:
+            at_limit = dataclasses.replace(env, **{setting: largest[i]})
+            over = dataclasses.replace(env, **{setting: largest[i] * 1.001 + 1e-6})
+            assert math.isclose(total_cost(at_limit)[i], budget[i], rel_tol=1e-9, abs_tol=1e-9)
+            assert total_cost(over)[i] > budget[i]
+        # No value works where even zero is over budget
+        at_zero = total_cost(dataclasses.replace(env, **{setting: 0.0}))
+        np.testing.assert_array_equal(np.isnan(largest), at_zero > budget)
+
+    hours = max_quantity(env, quantities, "print_time_hours", quantities.sale_price)
+    finite = np.isfinite(hours)
+    np.testing.assert_allclose(
+        total_cost(env, print_time_hours=np.where(finite, hours, 0.0))[finite],
+        quantities.sale_price[finite],
+    )
+
+    price = margin_price(calculate_costs_batch(env, df).total_cost, 35.0)
+    margins = calculate_costs_batch(env, df.assign(sale_price=price)).profit_margin_percent
+    np.testing.assert_allclose(margins[price > 0], 35.0)
+    assert np.isnan(margin_price(np.ones(3), 100.0)).all()
+
+
 if __name__ == "__main__":
     test_example_case()
@@ -0,0 +1,121 @@
+"""Tests for the in-memory catalog index."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from catalog_index import CatalogIndex, CatalogQuery, NameIndex, Range, parse_condition
+from cli import main
+from portfolio import evaluate_portfolio, load_environment, page_results
+from test_calculations import make_portfolio
+
+NAMES = ["Dragon", "dragonfly", "Drägon Ëgg", "Owl", "owl owl", "Gear", "", "Vase 12", "vase 123"]
+
+
+def make_results(rows: int = 3_000):
+    rng = np.random.default_rng(7)
+    df = make_portfolio(rows)
+    df["model_name"] = [
+        f"{NAMES[i % len(NAMES)]}{' ' + str(i) if i % 4 else ''}" for i in rng.permutation(rows)
+    ]
+    env, healthy_floor = load_environment(None)
+    results = evaluate_portfolio(env, df, healthy_floor)
+    # A few models without a margin
+    results.breakdown.values[:, :5] = np.nan
+    return results
+
+
+def test_parse_condition():
+    assert parse_condition("margin=5:15") == Range("Margin (%)", 5.0, 15.0)
+    assert parse_condition("plates>2") == Range("Plates", low=2.0, include_low=False)
+    assert parse_condition(" cost <= 9.5 ") == Range("Cost ($)", high=9.5)
+    assert parse_condition("sale=:20") == Range("Sale ($)", None, 20.0)
+    assert parse_condition("plates=3") == Range("Plates", 3.0, 3.0)
+    for text in ("weight>2", "margin>x", "margin"):
+        with pytest.raises(ValueError):
+            parse_condition(text)
+
+
+def test_long_names_do_not_widen_the_index(monkeypatch):
+    # Small build blocks so names straddle several of them
+    monkeypatch.setattr("catalog_index._BUILD_BLOCK", 1_000)
+    names = np.array([f"{NAMES[i % len(NAMES)]} {i}" for i in range(2_000)], dtype=object)
+    names[7] = "Pasted " + "long description " * 60_000 + "Dragon"
+    index = NameIndex(names)
+    lower = np.array([name.lower() for name in names], dtype=object)
+    for text in ("dragon", "on 1", "n d", "description long", "7"):
+        expected = np.flatnonzero([text in name for name in lower])
+        np.testing.assert_array_equal(index.containing(text), expected)
+    assert index.starting_with("pasted").tolist() == [7]
+    assert sorted(index.starting_with("owl 1")) == [
+        i for i, name in enumerate(lower) if name.startswith("owl 1")
+    ]
+
+
+def test_index_matches_a_full_scan():
+    results = make_results()
+    index = CatalogIndex(results)
+    margins = results.breakdown.profit_margin_percent
+    low, high = np.nanpercentile(margins, [20, 60])
+    queries = [
+        CatalogQuery(),
+        CatalogQuery().where("margin", low, high).where("plates", 2, include_low=False),
+        CatalogQuery().where("Cost ($)", high=20.0, include_high=False),
+        CatalogQuery().starting_with("DRAGON"),
+        CatalogQuery().starting_with("dräg").where("margin", low),
+        CatalogQuery().containing("owl"),
+        CatalogQuery().containing("l o"),
+        CatalogQuery().containing("ë"),
+        CatalogQuery().containing("12"),
+        CatalogQuery().containing("e 123 "),
+        CatalogQuery().containing("zebra"),
+        CatalogQuery().containing("gon").with_status("Healthy", "Profitable"),
+        CatalogQuery().with_status("Losing money") & CatalogQuery().where("plates", 3),
+        CatalogQuery().with_status("Healthy") & CatalogQuery().with_status("Low margin"),
+        CatalogQuery().where("margin", high, low),
+    ]
+    for query in queries:
+        expected = np.flatnonzero(query.mask(results))
+        np.testing.assert_array_equal(index.select(query), expected)
+    assert index.count(CatalogQuery().containing("owl owl")) > 0
+    assert index.count(queries[-1]) == 0
+
+    # Re-costed results keep the name index and reindex the columns
+    repriced = results.take(np.arange(len(results)))
+    repriced.breakdown.values[:] = results.breakdown.values[:, ::-1]
+    reindexed = index.with_results(repriced)
+    assert reindexed.names is index.names
+    query = CatalogQuery().containing("dragon").where("margin", low, high)
+    np.testing.assert_array_equal(
+        reindexed.select(query), np.flatnonzero(query.mask(repriced))
+    )
+
+    # The table pages the same rows with or without the index
+    query = CatalogQuery().where("plates", 2)
+    for sort_by in ("Margin (%)", "Model", None):
+        paged = [
+            page_results(
+                results, statuses=["Healthy", "Low margin"], search="O", sort_by=sort_by,
+                descending=True, page=1, page_size=40, query=query, index=candidate,
+            )
+            for candidate in (index, None)
+        ]
+        np.testing.assert_array_equal(paged[0].rows, paged[1].rows)
+        assert paged[0].matches == paged[1].matches > 40
+
+
+def test_cli_query(tmp_path):
+    source = tmp_path / "portfolio.csv"
+    df = make_portfolio(500)
+    df.to_csv(source, index=False)
+    output = tmp_path / "matches.csv"
+    args = [
+        "query", str(source), "--output", str(output), "--where", "plates>=2",
+        "--where", "margin=0:40", "--prefix", "model 1", "--sort", "margin", "--limit", "10",
+    ]
+    assert main(args) == 0
+    matches = pd.read_csv(output)
+    assert 0 < len(matches) <= 10
+    assert matches["Model"].str.startswith("Model 1").all()
+    assert (matches["Plates"] >= 2).all() and matches["Margin (%)"].between(0, 40).all()
+    assert matches["Margin (%)"].is_monotonic_increasing
@@ -0,0 +1,113 @@
+"""Tests for the printer farm scheduler."""
+
+import dataclasses
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cli import main
+from cost_model import calculate_costs_batch, precompute_quantities
+from farm_schedule import FarmConfig, schedule_farm
+from portfolio import load_environment
+from test_calculations import make_portfolio
+
+
+def farm_env(**overrides):
+    env, _ = load_environment(None)
+    return dataclasses.replace(env, **overrides)
+
+
+def queues(schedule):
+    frame = pd.DataFrame({
+        "job": np.arange(len(schedule)),
+        "printer": schedule.printer,
+        "position": schedule.position,
+    })
+    for printer, rows in frame.sort_values(["printer", "position"]).groupby("printer"):
+        assert rows["position"].tolist() == list(range(len(rows)))
+        yield printer, rows["job"].to_numpy()
+
+
+@pytest.mark.parametrize("automation", [False, True])
+def test_always_staffed_schedule(automation):
+    env = farm_env(has_automation=automation, automated_plate_capacity=3)
+    df = make_portfolio(2_000)
+    quantities = precompute_quantities(env, df)
+    schedule = schedule_farm(env, quantities, FarmConfig(printers=12))
+
+    plates = np.maximum(quantities.plate_count, 1)
+    hours = quantities.matrix[:, 1]
+    capacity = 3 if automation else 1
+    visit_hours = env.plate_change_time_minutes / 60.0
+    for printer, jobs in queues(schedule):
+        # Each visit loads the next ``capacity`` plates of the queue
+        first_plates = np.cumsum(plates[jobs]) - plates[jobs]
+        total = int(plates[jobs].sum())
+        visits = -(-total // capacity)
+        loads_with_start = len(np.unique(first_plates // capacity))
+        assert schedule.visits[printer] == visits
+        assert schedule.plate_changes[printer] == visits - loads_with_start
+        assert schedule.printer_end_hours[printer] == pytest.approx(
+            hours[jobs].sum() + visits * visit_hours
+        )
+        starts, ends = schedule.start_hours[jobs], schedule.end_hours[jobs]
+        assert (ends >= starts).all() and (starts[1:] >= ends[:-1] - 1e-9).all()
+
+    assert schedule.idle_hours.sum() == 0
+    assert schedule.makespan_hours <= schedule.lower_bound_hours * 1.01
+    summary = schedule.summary()
+    naive = calculate_costs_batch(env, df)
+    assert summary["naive_plate_changes"] == (
+        naive.plate_change_minutes.sum() / env.plate_change_time_minutes
+    )
+    assert summary["naive_labour_cost"] == pytest.approx(naive.labour_cost.sum())
+    if automation:
+        # Shared stacker loads need far fewer changes than jobs run alone
+        assert summary["plate_changes"] < summary["naive_plate_changes"] / 2
+        assert summary["labour_saving"] == pytest.approx(
+            (summary["naive_plate_changes"] - summary["plate_changes"])
+            * env.plate_change_time_minutes / 60.0 * env.labour_rate_per_hour
+        )
+    else:
+        # One plate per visit: only the order of the work can change
+        assert summary["plate_changes"] == summary["naive_plate_changes"]
+        assert summary["labour_saving"] == pytest.approx(0.0)
+
+
+def test_shifts_and_horizon():
+    env = farm_env()
+    df = make_portfolio(300)
+    quantities = precompute_quantities(env, df)
+    config = FarmConfig(printers=4, shift_hours=8.0, horizon_hours=500.0)
+    schedule = schedule_farm(env, quantities, config)
+    staffed = schedule_farm(env, quantities, dataclasses.replace(config, shift_hours=24.0))
+
+    # Without automation every job starts right after an on-shift visit
+    visit_hours = env.plate_change_time_minutes / 60.0
+    assert ((schedule.start_hours - visit_hours) % 24 < 8.0 + 1e-9).all()
+    assert schedule.idle_hours.sum() > 0
+    assert schedule.makespan_hours > staffed.makespan_hours
+    assert schedule.late_jobs == np.count_nonzero(schedule.end_hours > 500.0) > 0
+
+    for bad in ({"printers": 0}, {"shift_hours": 0.0}, {"shift_hours": 25.0}):
+        with pytest.raises(ValueError):
+            FarmConfig(**bad)
+
+
+def test_cli_schedule(tmp_path):
+    source = tmp_path / "portfolio.csv"
+    make_portfolio(500).to_csv(source, index=False)
+    output, summary = tmp_path / "schedule.csv", tmp_path / "printers.csv"
+    args = [
+        "schedule", str(source), str(output), "--printers", "5",
+        "--shift-hours", "10", "--summary", str(summary),
+    ]
+    assert main(args) == 0
+    jobs = pd.read_csv(output)
+    assert len(jobs) == 500 and set(jobs["Printer"]) == {1, 2, 3, 4, 5}
+    printers = pd.read_csv(summary)
+    assert printers["Jobs"].sum() == 500
+    last_end = jobs.groupby("Printer")["End (h)"].max().to_numpy()
+    np.testing.assert_allclose(printers["Busy until (h)"], last_end)
+    assert main(["schedule", str(source), str(output), "--printers", "0"]) == 2
@@ -0,0 +1,79 @@
+"""Tests for fleet (many profiles x many models) evaluation."""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from cli import main
+from cost_model import calculate_costs_batch, precompute_quantities
+from fleet import evaluate_fleet, load_fleet
+from portfolio import PortfolioTotals, evaluate_portfolio
+from test_calculations import make_env, make_portfolio
+
+
+FLEET = {
+    "mk4": {"printer_power_watts": 120.0, "labour_rate_per_hour": 35.0},
+    "x1c": {"has_automation": True, "automated_plate_capacity": 4},
+    "farm": {
+        "has_automation": True,
+        "automated_plate_capacity": 1,
+        "electricity_price_per_kwh": 0.12,
+        "healthy_margin_floor_percent": 0.0,
+    },
+    "site-b": {"labour_rate_per_hour": 18.0, "healthy_margin_floor_percent": 35.0},
+}
+
+
+def write_fleet(tmp_path):
+    path = tmp_path / "fleet.json"
+    path.write_text(json.dumps(FLEET), encoding="utf-8")
+    return path
+
+
+def test_fleet_matches_per_profile_evaluation(tmp_path):
+    profiles = load_fleet(write_fleet(tmp_path))
+    df = make_portfolio(3_000)
+    result = evaluate_fleet(profiles, precompute_quantities(make_env(), df))
+    assert result.total_cost.shape == (3_000, 4)
+
+    totals = result.totals()
+    for i, (env, healthy_floor) in enumerate(profiles.values()):
+        np.testing.assert_allclose(
+            result.total_cost[:, i], calculate_costs_batch(env, df).total_cost, rtol=1e-12
+        )
+        expected = PortfolioTotals.from_results(evaluate_portfolio(env, df, healthy_floor))
+        assert totals.status_counts[i].tolist() == list(expected.status_counts.values())
+        assert np.isclose(totals.total_profit[i], expected.total_profit)
+
+    np.testing.assert_array_equal(result.best, result.total_cost.argmin(axis=1))
+    assert totals.assigned.sum() == 3_000
+    frame = result.to_frame(df["model_name"], matrix=True)
+    np.testing.assert_allclose(frame["Cost ($)"], result.total_cost.min(axis=1))
+    assert (frame["Saving ($)"] >= 0).all()
+    assert np.isclose(totals.best_total_profit, frame["Profit ($)"].sum())
+    assert list(frame.columns[-4:]) == [f"Profit: {name}" for name in FLEET]
+
+
+def test_cli_fleet_streams_chunks(tmp_path):
+    source = tmp_path / "portfolio.csv"
+    make_portfolio(1_000).to_csv(source, index=False)
+    fleet_path = write_fleet(tmp_path)
+
+    assert main([
+        "fleet", str(source), str(tmp_path / "chunked.csv"),
+        "--profiles", str(fleet_path), "--chunk-rows", "128",
+        "--summary", str(tmp_path / "summary.csv"),
+    ]) == 0
+    assert main([
+        "fleet", str(source), str(tmp_path / "whole.csv"), "--profiles", str(fleet_path),
+        "--summary", str(tmp_path / "whole-summary.csv"),
+    ]) == 0
+
+    pd.testing.assert_frame_equal(
+        pd.read_csv(tmp_path / "chunked.csv"), pd.read_csv(tmp_path / "whole.csv")
+    )
+    summary = pd.read_csv(tmp_path / "summary.csv")
+    assert list(summary["Profile"]) == list(FLEET)
+    assert summary["Best for (models)"].sum() == 1_000
+    pd.testing.assert_frame_equal(summary, pd.read_csv(tmp_path / "whole-summary.csv"))
@@ -0,0 +1,52 @@
+"""Tests for opt-in stage timings."""
+
+import json
+
+from cli import main
+from cost_model import ModelInput, calculate_costs
+from instrumentation import STAGES, count, current_recorder, recording, stage
+from portfolio import evaluate_portfolio_file, load_environment
+from test_calculations import make_env, make_portfolio
+
+
+def test_recording_covers_every_portfolio_stage(tmp_path):
+    source = tmp_path / "portfolio.csv"
+    df = make_portfolio(1_000)
+    df.loc[3, "sale_price"] = None
+    df.to_csv(source, index=False)
+    env, healthy_floor = load_environment(None)
+
+    with recording() as recorder:
+        evaluate_portfolio_file(
+            source, tmp_path / "report.parquet", env, healthy_floor, chunk_rows=300
+        )
+        calculate_costs(make_env(), ModelInput("A", "", 10.0, 1.0, 1, 5.0))
+        with stage("aggregate", 5), stage("aggregate", 5):
+            pass
+
+    timings = recorder.stages
+    assert set(timings) == set(STAGES)
+    assert (timings["read"].calls, timings["read"].rows) == (4, 1_000)
+    assert timings["validate"].rows == 1_000
+    assert timings["cost"].rows == timings["export"].rows == 999
+    assert timings["aggregate"].calls == 5  # nested entries count once
+    assert recorder.counters == {"calculate_costs": 1}
+    assert [r.get("stage") for r in recorder.records()][:len(STAGES)] == list(STAGES)
+
+    # Nothing is recorded outside a recording
+    assert current_recorder() is None
+    with stage("cost", 10):
+        count("calculate_costs")
+    assert recorder.counters == {"calculate_costs": 1}
+
+
+def test_cli_writes_timings_as_json_lines(tmp_path):
+    source = tmp_path / "portfolio.csv"
+    make_portfolio(200).to_csv(source, index=False)
+    timings = tmp_path / "timings.jsonl"
+
+    assert main(["evaluate", str(source), str(tmp_path / "r.csv"), "--timings", str(timings)]) == 0
+    records = [json.loads(line) for line in timings.read_text().splitlines()]
+    assert {r["stage"] for r in records} == set(STAGES)
+    assert all(r["command"] == "evaluate" for r in records)
+    assert next(r for r in records if r["stage"] == "cost")["rows"] == 200
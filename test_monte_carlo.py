@@ -0,0 +1,45 @@
+"""Tests for the Monte Carlo uncertainty engine."""
+
+import numpy as np
+
+from cost_model import STATUS_LABELS
+from monte_carlo import Distribution, MonteCarloConfig, simulate
+from portfolio import evaluate_portfolio
+from test_calculations import make_env, make_portfolio
+
+
+def test_zero_uncertainty_matches_point_estimate():
+    df = make_portfolio(300)
+    env = make_env(has_automation=True)
+    config = MonteCarloConfig(
+        filament=Distribution("fixed"), print_time=Distribution("fixed"), samples=20
+    )
+    result = simulate(env, df, config, 20.0)
+    expected = evaluate_portfolio(env, df, 20.0)
+
+    for p in (10, 50, 90):
+        np.testing.assert_allclose(
+            result[f"cost_p{p}"], expected.breakdown.total_cost, rtol=1e-12
+        )
+        np.testing.assert_allclose(
+            result[f"profit_p{p}"], expected.breakdown.profit, atol=1e-9
+        )
+    probabilities = result[[f"p_{s.lower().replace(' ', '_')}" for s in STATUS_LABELS]]
+    assert probabilities.isin([0.0, 1.0]).all().all()
+    most_likely = np.asarray(STATUS_LABELS)[probabilities.to_numpy().argmax(axis=1)]
+    assert (most_likely == expected.status).all()
+
+
+def test_chunking_does_not_change_results():
+    df = make_portfolio(250)
+    env = make_env()
+    config = MonteCarloConfig(failure_rate=0.1, samples=500, seed=3)
+    whole = simulate(env, df, config, 20.0)
+    config.chunk_cells = 7 * config.samples
+    chunked = simulate(env, df, config, 20.0)
+
+    np.testing.assert_array_equal(whole.to_numpy(), chunked.to_numpy())
+    probabilities = whole[[col for col in whole if col.startswith("p_")]]
+    np.testing.assert_allclose(probabilities.sum(axis=1), 1.0)
+    assert (whole["cost_p10"] <= whole["cost_p50"]).all()
+    assert (whole["cost_p50"] <= whole["cost_p90"]).all()
@@ -0,0 +1,328 @@
+"""Tests for portfolio evaluation shared by the app and the CLI."""
+
+import io
+import re
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cli import main
+from portfolio import (
+    INPUT_COLUMNS,
+    REPORT_COLUMNS,
+    THRESHOLD_COLUMNS,
+    PortfolioInsights,
+    evaluate_portfolio,
+    evaluate_portfolio_file,
+    evaluate_portfolio_file_parallel,
+    load_environment,
+    page_results,
+    ReportWriter,
+    read_portfolio,
+    report_bytes,
+    solve_thresholds,
+    validate_portfolio,
+    write_report,
+)
+from test_calculations import make_portfolio
+
+
+def test_cli_evaluate_streams_chunks(tmp_path):
+    source = tmp_path / "portfolio.csv"
+    destination = tmp_path / "report.csv"
+    df = make_portfolio(1_000)
+    df.to_csv(source, index=False)
+
+    assert main(["evaluate", str(source), str(destination), "--chunk-rows", "64"]) == 0
+
+    env, healthy_floor = load_environment(None)
+    expected = evaluate_portfolio(env, pd.read_csv(source), healthy_floor)
+    pd.testing.assert_frame_equal(
+        pd.read_csv(destination),
+        pd.read_csv(io.StringIO(expected.to_frame().to_csv(index=False))),
+    )
+
+
+def test_sharded_evaluation_preserves_order_and_totals(tmp_path):
+    source = tmp_path / "portfolio.csv"
+    make_portfolio(2_000).to_csv(source, index=False)
+    env, healthy_floor = load_environment(None)
+
+    sequential = evaluate_portfolio_file(
+        source, tmp_path / "seq.csv", env, healthy_floor, chunk_rows=300
+    )
+    sharded = evaluate_portfolio_file_parallel(
+        source, tmp_path / "par.csv", env, healthy_floor, workers=4, chunk_rows=300
+    )
+
+    assert (tmp_path / "seq.csv").read_bytes() == (tmp_path / "par.csv").read_bytes()
+    assert sharded.totals.rows == sequential.totals.rows == 2_000
+    assert sharded.totals.status_counts == sequential.totals.status_counts
+    assert abs(sharded.totals.total_profit - sequential.totals.total_profit) < 1e-6
+    assert abs(sharded.totals.average_margin - sequential.totals.average_margin) < 1e-9
+
+
+def test_columnar_formats_match_csv(tmp_path):
+    df = make_portfolio(500)
+    df["reference_url"] = [f"https://example.com/{i}" for i in range(len(df))]
+    df["notes"] = "not a portfolio column"
+    df.to_csv(tmp_path / "portfolio.csv", index=False)
+    df.to_parquet(tmp_path / "portfolio.parquet", index=False)
+    df.to_feather(tmp_path / "portfolio.feather")
+
+    expected = read_portfolio(tmp_path / "portfolio.csv")
+    assert list(expected.columns) == list(INPUT_COLUMNS)
+    for name in ("portfolio.parquet", "portfolio.feather"):
+        pd.testing.assert_frame_equal(read_portfolio(tmp_path / name), expected)
+
+    env, healthy_floor = load_environment(None)
+    csv_report = tmp_path / "report.csv"
+    evaluate_portfolio_file(tmp_path / "portfolio.csv", csv_report, env, healthy_floor)
+    for name in ("report.parquet", "report.feather"):
+        evaluate_portfolio_file(
+            tmp_path / "portfolio.feather", tmp_path / name, env, healthy_floor, chunk_rows=128
+        )
+    reports = [
+        pd.read_parquet(tmp_path / "report.parquet"),
+        pd.read_feather(tmp_path / "report.feather"),
+    ]
+    pd.testing.assert_frame_equal(reports[0], reports[1])
+    pd.testing.assert_frame_equal(
+        pd.read_csv(io.BytesIO(report_bytes(reports[0], "csv"))), pd.read_csv(csv_report)
+    )
+
+
+def test_validation_reports_every_bad_cell():
+    df = read_portfolio(io.StringIO(
+        "model_name,filament_grams,print_time_hours,plate_count,sale_price\n"
+        "A,10,1,1,20\n"
+        "B,,1,1,20\n"
+        "C,abc,1,x,20\n"
+        "D,5,inf,2,  \n"
+        "E,5,2,2,30\n"
+    ))
+    valid, rejects = validate_portfolio(df)
+
+    assert list(valid["model_name"]) == ["A", "E"]
+    assert valid["filament_grams"].dtype == "float64"
+    assert rejects.values.tolist() == [
+        [2, "filament_grams", "", "missing"],
+        [3, "filament_grams", "abc", "not a number"],
+        [3, "plate_count", "x", "not a number"],
+        [4, "print_time_hours", "inf", "not finite"],
+        [4, "sale_price", "", "missing"],
+    ]
+
+    clean, none = validate_portfolio(valid)
+    assert len(none) == 0
+    pd.testing.assert_frame_equal(clean, valid)
+
+
+def test_invalid_rows_are_skipped_and_reported(tmp_path):
+    source = tmp_path / "portfolio.csv"
+    df = make_portfolio(2_000).astype({"sale_price": object})
+    df.loc[[0, 999, 1_500], "sale_price"] = ["twelve", "", "1e999"]
+    df.loc[1_500, "plate_count"] = None
+    df.to_csv(source, index=False)
+    env, healthy_floor = load_environment(None)
+
+    sequential = evaluate_portfolio_file(
+        source, tmp_path / "seq.csv", env, healthy_floor,
+        chunk_rows=300, rejects=tmp_path / "seq-rejects.csv",
+    )
+    sharded = evaluate_portfolio_file_parallel(
+        source, tmp_path / "par.csv", env, healthy_floor,
+        workers=4, chunk_rows=300, rejects=tmp_path / "par-rejects.csv",
+    )
+
+    assert sequential.rejected_rows == sharded.rejected_rows == 3
+    assert sequential.rows == sharded.rows == 1_997
+    assert (tmp_path / "seq.csv").read_bytes() == (tmp_path / "par.csv").read_bytes()
+    rejects = pd.read_csv(tmp_path / "seq-rejects.csv", keep_default_na=False)
+    assert rejects[["Row", "Column", "Reason"]].values.tolist() == [
+        [1, "sale_price", "not a number"],
+        [1_000, "sale_price", "missing"],
+        [1_501, "plate_count", "missing"],
+        [1_501, "sale_price", "not finite"],
+    ]
+    assert (tmp_path / "par-rejects.csv").read_bytes() == (
+        tmp_path / "seq-rejects.csv"
+    ).read_bytes()
+
+
+def test_cli_commands_report_skipped_rows(tmp_path, capsys):
+    source = tmp_path / "portfolio.csv"
+    df = make_portfolio(500).astype({"sale_price": object})
+    df.loc[[3, 400], "sale_price"] = ["", "n/a"]
+    df.to_csv(source, index=False)
+    profiles = tmp_path / "fleet.json"
+    profiles.write_text('{"shop": {}, "farm": {"has_automation": true}}')
+    output = str(tmp_path / "out.csv")
+    commands = {
+        "fleet": ["fleet", str(source), output, "--profiles", str(profiles), "--chunk-rows", "100"],
+        "schedule": ["schedule", str(source), output, "--printers", "3", "--time-limit", "0.1"],
+        "query": ["query", str(source), "--output", output],
+        "simulate": ["simulate", str(source), output, "--samples", "100", "--chunk-rows", "100"],
+    }
+    for name, args in commands.items():
+        rejects = tmp_path / f"{name}-rejects.csv"
+        assert main([*args, "--rejects", str(rejects)]) == 0
+        assert "Skipped 2 rows with invalid cells" in capsys.readouterr().err
+        assert len(pd.read_csv(output)) == 498
+        assert pd.read_csv(rejects)["Row"].tolist() == [4, 401]
+
+
+def test_insights_match_pandas_and_merge_across_chunks():
+    env, healthy_floor = load_environment(None)
+    df = make_portfolio(5_000)
+    results = evaluate_portfolio(env, df, healthy_floor)
+    insights = PortfolioInsights.from_results(results, k=10)
+
+    report = results.to_frame()
+    assert insights.best_margin.names.tolist() == report.nlargest(10, "Margin (%)")["Model"].tolist()
+    assert insights.worst_hourly.names.tolist() == report.nsmallest(10, "$/hour")["Model"].tolist()
+    losing = report[report["Status"] == "Losing money"]
+    assert insights.worst_losing.names.tolist() == losing.nsmallest(10, "Profit ($)")["Model"].tolist()
+    np.testing.assert_allclose(
+        insights.status_frame().set_index("Status")["Profit ($)"],
+        report.groupby("Status")["Profit ($)"].sum().reindex(
+            insights.status_frame()["Status"], fill_value=0.0
+        ),
+    )
+    by_plates = report.groupby("Plates").agg(
+        Models=("Model", "size"), Profit=("Profit ($)", "sum"), Margin=("Margin (%)", "mean")
+    )
+    rollup = insights.by_plates.to_frame("Plates").set_index("Plates")
+    assert rollup["Models"].tolist() == by_plates["Models"].tolist()
+    np.testing.assert_allclose(rollup["Profit ($)"], by_plates["Profit"])
+    np.testing.assert_allclose(rollup["Avg margin (%)"], by_plates["Margin"])
+    assert insights.remote_count == (report["Remote"] == "✅").sum()
+
+    merged = PortfolioInsights.empty(k=10)
+    for start in range(0, len(df), 1_700):
+        chunk = evaluate_portfolio(env, df.iloc[start:start + 1_700], healthy_floor)
+        merged = merged.merge(PortfolioInsights.from_results(chunk, k=10))
+    assert merged.best_margin.items() == insights.best_margin.items()
+    assert merged.worst_losing.items() == insights.worst_losing.items()
+    assert merged.totals.status_counts == insights.totals.status_counts
+    np.testing.assert_allclose(merged.by_plates.profit, insights.by_plates.profit)
+    assert merged.by_remote.count.tolist() == insights.by_remote.count.tolist()
+
+
+def test_report_streams_from_columnar_results(tmp_path):
+    env, healthy_floor = load_environment(None)
+    results = evaluate_portfolio(env, make_portfolio(1_000), healthy_floor)
+    expected = results.to_frame()
+
+    frames = list(results.iter_frames(chunk_rows=300))
+    assert [len(frame) for frame in frames] == [300, 300, 300, 100]
+    pd.testing.assert_frame_equal(pd.concat(frames, ignore_index=True), expected)
+
+    assert write_report(results, tmp_path / "report.parquet", chunk_rows=300) == 1_000
+    pd.testing.assert_frame_equal(pd.read_parquet(tmp_path / "report.parquet"), expected)
+    buffer = io.BytesIO()
+    write_report(results, buffer, "csv", chunk_rows=300)
+    assert buffer.getvalue() == report_bytes(expected, "csv")
+
+
+def test_results_pages_match_filtered_sorted_report():
+    env, healthy_floor = load_environment(None)
+    results = evaluate_portfolio(env, make_portfolio(2_000), healthy_floor)
+    report = results.to_frame()
+
+    expected = report[
+        report["Status"].isin(["Low margin", "Healthy"])
+        & report["Margin (%)"].between(5.0, 60.0)
+        & report["Model"].str.contains("model 1", case=False, regex=False)
+    ].sort_values("Profit ($)", ascending=False, kind="stable")
+    pages = [
+        page_results(
+            results,
+            statuses=["Low margin", "Healthy"],
+            min_margin=5.0,
+            max_margin=60.0,
+            search="model 1",
+            sort_by="Profit ($)",
+            descending=True,
+            page=page,
+            page_size=20,
+        )
+        for page in range(3)
+    ]
+    assert pages[0].matches == len(expected) > 40
+    assert pages[0].pages == -(-len(expected) // 20)
+    assert np.concatenate([page.rows for page in pages]).tolist() == expected.index[:60].tolist()
+    pd.testing.assert_frame_equal(pages[1].frame, expected.iloc[20:40].reset_index(drop=True))
+    assert pages[1].status_codes.tolist() == results.status_codes[pages[1].rows].tolist()
+
+    by_status = page_results(results, sort_by="Status", page=99, page_size=500)
+    assert by_status.page == 3
+    assert np.all(np.diff(results.status_codes[by_status.rows]) >= 0)
+    for sort_by in ("Status", "Model", "Plates"):
+        page = page_results(results, sort_by=sort_by, descending=True, page_size=len(results))
+        expected = page.frame.assign(Row=page.rows).sort_values(
+            [sort_by, "Row"],
+            ascending=[False, True],
+            key=lambda col: results.status_codes[page.rows] if col.name == "Status" else col,
+        )
+        assert page.rows.tolist() == expected["Row"].tolist()
+    assert page_results(results, search="no such model").matches == 0
+
+
+def test_xlsx_report_continues_on_new_sheets():
+    env, healthy_floor = load_environment(None)
+    frame = evaluate_portfolio(env, make_portfolio(25), healthy_floor).to_frame()
+    buffer = io.BytesIO()
+    with ReportWriter(buffer, "xlsx", sheet_rows=11) as writer:
+        writer.write(frame.iloc[:7])
+        writer.write(frame.iloc[7:])
+
+    with zipfile.ZipFile(buffer) as xlsx:
+        sheets = sorted(n for n in xlsx.namelist() if n.startswith("xl/worksheets/sheet"))
+        rows = [len(re.findall(r"<row ", xlsx.read(n).decode())) for n in sheets]
+    assert rows == [11, 11, 6]  # 10 + 10 + 5 models, each sheet with a header
+
+    with pytest.raises(ValueError, match="only supported for reports"):
+        read_portfolio("portfolio.xlsx")
+
+
+def test_thresholds_are_shown_and_exported(tmp_path):
+    source = tmp_path / "portfolio.csv"
+    df = make_portfolio(300)
+    df.loc[0, "filament_grams"] = 0.0
+    df.to_csv(source, index=False)
+    env, healthy_floor = load_environment(None)
+    results = evaluate_portfolio(env, read_portfolio(source), healthy_floor)
+    solved = solve_thresholds(env, results, healthy_floor)
+
+    report = solved.to_frame()
+    assert list(report.columns) == list(REPORT_COLUMNS + THRESHOLD_COLUMNS)
+    # The default target is the healthy floor, so Healthy rows are priced above it
+    healthy = report["Status"].isin(["Healthy", "Profitable"])
+    assert (report.loc[healthy, "Sale ($)"] >= report.loc[healthy, "Target price ($)"] - 1e-9).all()
+    assert (report.loc[~healthy, "Sale ($)"] < report.loc[~healthy, "Target price ($)"]).all()
+    # Healthy models keep being Healthy up to a filament price above the current one
+    assert (report.loc[healthy, "Max filament ($/kg)"] >= env.filament_price_per_kg - 1e-9).all()
+    # Without filament the filament price never matters
+    assert report.loc[0, "Max filament ($/kg)"] == np.inf or np.isnan(
+        report.loc[0, "Max filament ($/kg)"]
+    )
+
+    page = page_results(solved, sort_by="Max print time (h)", descending=True, page_size=10)
+    assert list(page.frame.columns) == list(solved.columns)
+    assert page.frame["Max print time (h)"].is_monotonic_decreasing
+
+    output = tmp_path / "report.csv"
+    args = ["evaluate", str(source), str(output), "--solve", "--target-margin", "40"]
+    assert main(args) == 0
+    exported = pd.read_csv(output)
+    expected = solve_thresholds(env, results, healthy_floor, 40.0).to_frame()
+    np.testing.assert_allclose(
+        exported[list(THRESHOLD_COLUMNS)].to_numpy(),
+        expected[list(THRESHOLD_COLUMNS)].to_numpy(),
+    )
+    with ReportWriter(tmp_path / "report.xlsx") as writer:
+        writer.write(report)
+    assert main(args + ["--workers", "2"]) == 2
@@ -0,0 +1,82 @@
+"""Tests for incremental re-evaluation of re-uploaded portfolios."""
+
+import dataclasses
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio import PortfolioTotals, evaluate_portfolio, load_environment
+from portfolio_diff import compare_snapshot, update_portfolio
+from test_calculations import make_portfolio
+
+
+def assert_matches_full_evaluation(snapshot, env, df, healthy_floor):
+    expected = evaluate_portfolio(env, df, healthy_floor)
+    np.testing.assert_array_equal(snapshot.results.breakdown.values, expected.breakdown.values)
+    np.testing.assert_array_equal(
+        snapshot.results.breakdown.remote_friendly, expected.breakdown.remote_friendly
+    )
+    np.testing.assert_array_equal(snapshot.results.status_codes, expected.status_codes)
+
+    totals = PortfolioTotals.from_results(expected)
+    assert snapshot.totals.rows == totals.rows
+    assert snapshot.totals.status_counts == totals.status_counts
+    assert snapshot.totals.margin_count == totals.margin_count
+    assert snapshot.totals.total_profit == pytest.approx(totals.total_profit)
+    assert snapshot.totals.margin_sum == pytest.approx(totals.margin_sum)
+
+
+def test_reupload_recomputes_only_differences():
+    env, healthy_floor = load_environment(None)
+    df = make_portfolio(1_000)
+    df.loc[10:12, "model_name"] = "Duplicate"  # repeated names stay distinct rows
+    first = update_portfolio(None, env, df, healthy_floor)
+    assert first.diff is None
+
+    edited = df.drop(index=[3, 11]).copy()
+    edited.loc[[20, 500], "sale_price"] += 5.0
+    edited.loc[700, "plate_count"] = 3
+    added = df.iloc[:2].assign(model_name=["New A", "New B"])
+    edited = pd.concat([added, edited.iloc[::-1]], ignore_index=True)
+
+    second = update_portfolio(first, env, edited, healthy_floor)
+    diff = second.diff
+    assert (len(diff.added), len(diff.removed)) == (2, 2)
+    changed_names = set(edited["model_name"].iloc[diff.changed])
+    assert changed_names <= {df.loc[i, "model_name"] for i in (20, 500, 700, 10, 12)}
+    assert {"Model 20", "Model 500", "Model 700"} <= changed_names
+    assert diff.unchanged == len(edited) - 2 - len(diff.changed)
+    assert set(second.changes["Change"]) == {"Added", "Changed", "Removed"}
+    assert_matches_full_evaluation(second, env, edited, healthy_floor)
+
+
+def test_settings_change_recomputes_every_row():
+    env, healthy_floor = load_environment(None)
+    df = make_portfolio(300)
+    first = update_portfolio(None, env, df, healthy_floor)
+
+    cheaper = dataclasses.replace(env, labour_rate_per_hour=10.0)
+    second = update_portfolio(first, cheaper, df, healthy_floor)
+    assert not second.diff.has_changes
+    assert_matches_full_evaluation(second, cheaper, df, healthy_floor)
+
+
+def test_cached_results_are_diffed_against_the_previous_upload():
+    env, healthy_floor = load_environment(None)
+    upload_a = make_portfolio(300)
+    upload_b = upload_a.drop(index=[0, 1])
+    upload_c = upload_a.assign(sale_price=upload_a["sale_price"] + 1.0)
+    snapshot_a = update_portfolio(None, env, upload_a, healthy_floor)
+    snapshot_b = update_portfolio(snapshot_a, env, upload_b, healthy_floor)
+    snapshot_c = update_portfolio(snapshot_b, env, upload_c, healthy_floor)
+
+    # B again, served from results cached when B was first uploaded
+    again = compare_snapshot(
+        snapshot_c, snapshot_b.results, snapshot_b.totals, snapshot_b.settings
+    )
+    assert again.results is snapshot_b.results
+    assert again.previous_totals is snapshot_c.totals
+    assert (len(again.diff.changed), len(again.diff.removed)) == (298, 2)
+    assert set(again.changes["Change"]) == {"Changed", "Removed"}
+    assert compare_snapshot(None, snapshot_b.results, snapshot_b.totals, ()).diff is None
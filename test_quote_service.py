@@ -0,0 +1,168 @@
+"""Tests for the HTTP quote service and its request coalescing."""
+
+import asyncio
+import dataclasses
+import json
+
+from cost_model import (
+    ModelInput,
+    calculate_break_even_and_health,
+    calculate_costs,
+    classify_model,
+)
+from quote_service import (
+    QuoteBatcher,
+    QuoteClient,
+    QuoteServer,
+    _send,
+    load_profiles,
+    parse_model,
+    quote_models,
+)
+from test_calculations import make_portfolio
+
+
+def run_with_server(profiles, scenario):
+    async def main():
+        batcher = QuoteBatcher(profiles)
+        server = await QuoteServer(batcher).start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await scenario(port, batcher)
+
+    return asyncio.run(main())
+
+
+def expected_quote(profile, payload):
+    env, healthy_floor = profile
+    model = ModelInput(reference_url=None, **payload)
+    breakdown = calculate_costs(env, model)
+    _, healthy_price = calculate_break_even_and_health(breakdown.total_cost, healthy_floor)
+    return {
+        "model_name": model.model_name,
+        **dataclasses.asdict(breakdown),
+        "break_even_price": breakdown.total_cost,
+        "healthy_price": healthy_price,
+        "status": classify_model(model.sale_price, breakdown.total_cost, healthy_price),
+    }
+
+
+def portfolio_payloads(n):
+    df = make_portfolio(n).drop(columns="reference_url")
+    df["target_margin_percent"] = df["target_margin_percent"].astype(object)
+    df.loc[df["target_margin_percent"].isna(), "target_margin_percent"] = None
+    return json.loads(df.to_json(orient="records"))
+
+
+def test_coalesced_quotes_match_scalar(tmp_path):
+    profiles_path = tmp_path / "profiles.json"
+    profiles_path.write_text(json.dumps({
+        "automated": {"has_automation": True, "healthy_margin_floor_percent": 0},
+    }))
+    profiles = load_profiles(str(profiles_path))
+    payloads = portfolio_payloads(200)
+
+    async def scenario(port, batcher):
+        async def one(i, payload):
+            profile = ("default", "automated")[i % 2]
+            async with QuoteClient("127.0.0.1", port) as client:
+                return await client.request("POST", "/quote", {**payload, "profile": profile})
+
+        responses = await asyncio.gather(*(one(i, p) for i, p in enumerate(payloads)))
+        return responses, batcher.batches
+
+    responses, batches = run_with_server(profiles, scenario)
+
+    assert batches < len(payloads)  # concurrent requests shared batches
+    for i, (payload, (status, quote)) in enumerate(zip(payloads, responses)):
+        profile = profiles[("default", "automated")[i % 2]]
+        assert status == 200
+        assert quote == json.loads(json.dumps(expected_quote(profile, payload)))
+
+
+def test_batch_endpoint_and_errors_on_one_connection():
+    profiles = load_profiles(None)
+    payloads = portfolio_payloads(50)
+
+    async def scenario(port, _batcher):
+        async with QuoteClient("127.0.0.1", port) as client:
+            batch = await client.request("POST", "/quote/batch", {"models": payloads})
+            unknown = await client.request("POST", "/quote", {"profile": "nope", **payloads[0]})
+            invalid = await client.request("POST", "/quote", {"sale_price": 10})
+            missing = await client.request("GET", "/nowhere")
+            health = await client.request("GET", "/health")
+        return batch, unknown, invalid, missing, health
+
+    batch, unknown, invalid, missing, health = run_with_server(profiles, scenario)
+
+    assert batch[0] == 200
+    expected = [expected_quote(profiles["default"], p) for p in payloads]
+    assert batch[1]["quotes"] == json.loads(json.dumps(expected))
+    assert unknown == (400, {"error": "Unknown profile: nope"})
+    assert invalid[0] == 400 and "filament_grams" in invalid[1]["error"]
+    assert missing[0] == 404
+    assert health[0] == 200
+
+
+def test_rejects_bad_numbers_and_lengths():
+    profiles = load_profiles(None)
+    payload = portfolio_payloads(1)[0]
+
+    async def raw(port, head: bytes) -> bytes:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(head)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return response
+
+    async def scenario(port, _batcher):
+        async with QuoteClient("127.0.0.1", port) as client:
+            # json.dumps writes these as the non-standard Infinity / NaN
+            replies = [
+                await client.request("POST", "/quote", {**payload, "plate_count": float("inf")}),
+                await client.request("POST", "/quote", {**payload, "sale_price": float("nan")}),
+                await client.request(
+                    "POST", "/quote/batch", {"models": [{**payload, "filament_grams": 1e400}]}
+                ),
+            ]
+        for length in (b"abc", b"-5", b"1e3", str(2 ** 40).encode()):
+            replies.append(await raw(
+                port, b"POST /quote HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n"
+            ))
+        return replies
+
+    *numbers, text, negative, exponent, huge = run_with_server(profiles, scenario)
+    for status, body in numbers:
+        assert status == 400 and "must be finite" in body["error"]
+    for response in (text, negative, exponent):
+        assert response.startswith(b"HTTP/1.1 400 ") and b"Invalid Content-Length" in response
+    assert huge.startswith(b"HTTP/1.1 413 ")
+
+
+def test_overflowing_quotes_are_strict_json():
+    env, healthy_floor = load_profiles(None)["default"]
+    env = dataclasses.replace(env, filament_price_per_kg=1e6)
+    profiles = {"default": (env, healthy_floor)}
+    payload = {**portfolio_payloads(1)[0], "filament_grams": 1e308}
+    (quote,) = quote_models(env, healthy_floor, [parse_model(payload)])
+    json.dumps(quote, allow_nan=False)
+    assert quote["total_cost"] is None and quote["healthy_price"] is None
+
+    async def scenario(port, _batcher):
+        async with QuoteClient("127.0.0.1", port) as client:
+            return await client.request("POST", "/quote", payload)
+
+    status, body = run_with_server(profiles, scenario)
+    assert status == 200 and body["profit"] is None
+
+    class Writer:
+        def write(self, data):
+            self.data = data
+
+        async def drain(self):
+            pass
+
+    writer = Writer()
+    asyncio.run(_send(writer, 200, {"value": float("inf")}, True))
+    assert writer.data.startswith(b"HTTP/1.1 500 ") and b"Unserialisable" in writer.data
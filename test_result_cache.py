@@ -0,0 +1,37 @@
+"""Tests for the bounded portfolio result cache."""
+
+from result_cache import ResultCache, content_digest, portfolio_cache_key
+from test_calculations import make_env
+
+
+def test_lru_eviction_and_counters():
+    cache = ResultCache(max_entries=2, ttl_seconds=None)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_entries_expire_after_ttl():
+    now = [0.0]
+    cache = ResultCache(max_entries=4, ttl_seconds=10.0, clock=lambda: now[0])
+    cache.put("a", 1)
+    now[0] = 10.0
+    assert cache.get("a") == 1
+    now[0] = 10.5
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_key_tracks_content_and_settings():
+    digest = content_digest(b"model_name,filament_grams\nA,1\n")
+    key = portfolio_cache_key(digest, make_env(), 20.0)
+    assert key == portfolio_cache_key(digest, make_env(), 20.0)
+    assert key != portfolio_cache_key(digest, make_env(labour_rate_per_hour=31.0), 20.0)
+    assert key != portfolio_cache_key(digest, make_env(), 25.0)
+    assert key != portfolio_cache_key(content_digest(b"other"), make_env(), 20.0)
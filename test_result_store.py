@@ -0,0 +1,137 @@
+"""Tests for the persistent SQLite result store."""
+
+import dataclasses
+
+import numpy as np
+import pytest
+
+from portfolio import evaluate_portfolio, evaluate_portfolio_file, load_environment
+from result_store import ResultStore
+from test_calculations import make_portfolio
+
+
+def assert_same_results(actual, expected):
+    np.testing.assert_array_equal(actual.breakdown.values, expected.breakdown.values)
+    np.testing.assert_array_equal(
+        actual.breakdown.remote_friendly, expected.breakdown.remote_friendly
+    )
+    np.testing.assert_array_equal(actual.status_codes, expected.status_codes)
+
+
+def test_repeat_evaluation_is_a_lookup(tmp_path):
+    env, healthy_floor = load_environment(None)
+    df = make_portfolio(1_000)
+    expected = evaluate_portfolio(env, df, healthy_floor)
+
+    with ResultStore(tmp_path / "results.sqlite", batch_rows=300) as store:
+        assert_same_results(store.evaluate_portfolio(env, df, healthy_floor), expected)
+        assert (store.hits, store.misses, len(store)) == (0, 1_000, 1_000)
+
+    # A new process sees the stored rows; edited rows and new settings miss
+    edited = df.copy()
+    edited.loc[[5, 6], "sale_price"] += 1.0
+    with ResultStore(tmp_path / "results.sqlite") as store:
+        results = store.evaluate_portfolio(env, edited.iloc[::-1], healthy_floor)
+        assert_same_results(results, evaluate_portfolio(env, edited.iloc[::-1], healthy_floor))
+        assert (store.hits, store.misses) == (998, 2)
+
+        cheaper = dataclasses.replace(env, labour_rate_per_hour=10.0)
+        store.evaluate_portfolio(cheaper, df, healthy_floor)
+        store.evaluate_portfolio(env, df, healthy_floor + 5.0)
+        assert store.misses == 2_002
+        assert len(store) == 3_002
+
+
+def test_query_filters(tmp_path):
+    env, healthy_floor = load_environment(None)
+    df = make_portfolio(500)
+    expected = evaluate_portfolio(env, df, healthy_floor).to_frame()
+
+    with ResultStore(tmp_path / "results.sqlite") as store:
+        store.evaluate_portfolio(env, df, healthy_floor)
+        store.evaluate_portfolio(dataclasses.replace(env, has_automation=True), df, healthy_floor)
+
+        low = store.query(
+            status="Low margin", min_margin=5.0, max_margin=15.0,
+            env_settings=env, healthy_floor=healthy_floor,
+        )
+        with pytest.raises(ValueError, match="together"):
+            store.query(env_settings=env)
+        margins = expected["Margin (%)"]
+        mask = (expected["Status"] == "Low margin") & margins.between(5.0, 15.0)
+        assert sorted(low["model_name"]) == sorted(expected.loc[mask, "Model"])
+        assert (low["status"] == "Low margin").all()
+
+        by_name = store.query(model_name="Model 42")
+        assert len(by_name) == 2
+        row = by_name[by_name["settings_key"] == low["settings_key"].iloc[0]].iloc[0]
+        assert row["total_cost"] == expected.loc[42, "Cost ($)"]
+        assert row["sale_price"] == df.loc[42, "sale_price"]
+
+        assert len(store.query(limit=7)) == 7
+        with pytest.raises(ValueError):
+            store.query(status="Unknown")
+
+
+def test_queries_use_an_index(tmp_path):
+    env, healthy_floor = load_environment(None)
+    with ResultStore(tmp_path / "results.sqlite") as store:
+        store.evaluate_portfolio(env, make_portfolio(200), healthy_floor)
+        statements = []
+        store._conn.set_trace_callback(statements.append)
+        for filters in (
+            {"status": "Healthy"},
+            {"min_margin": 5.0, "max_margin": 15.0},
+            {"status": "Healthy", "env_settings": env, "healthy_floor": healthy_floor},
+            {"min_margin": 5.0, "env_settings": env, "healthy_floor": healthy_floor},
+            {"model_name": "Model 42"},
+        ):
+            store.query(**filters)
+        store._conn.set_trace_callback(None)
+
+        selects = [sql for sql in statements if sql.startswith("SELECT")]
+        assert len(selects) == 5
+        for sql in selects:
+            plan = [row[-1] for row in store._conn.execute("EXPLAIN QUERY PLAN " + sql)]
+            assert any(step.startswith("SEARCH r USING INDEX") for step in plan), plan
+
+
+def test_file_evaluation_reads_through_store(tmp_path):
+    env, healthy_floor = load_environment(None)
+    source = tmp_path / "portfolio.csv"
+    make_portfolio(400).to_csv(source, index=False)
+
+    with ResultStore(tmp_path / "results.sqlite") as store:
+        for name in ("first.csv", "second.csv"):
+            evaluate_portfolio_file(
+                source, tmp_path / name, env, healthy_floor,
+                chunk_rows=150, evaluate=store.evaluate_portfolio,
+            )
+        assert (store.hits, store.misses) == (400, 400)
+    assert (tmp_path / "first.csv").read_bytes() == (tmp_path / "second.csv").read_bytes()
+
+
+def test_old_and_excess_rows_are_evicted(tmp_path, monkeypatch):
+    env, healthy_floor = load_environment(None)
+    df = make_portfolio(400)
+    clock = [1_000_000.0]
+    monkeypatch.setattr("result_store.time.time", lambda: clock[0])
+
+    with ResultStore(tmp_path / "results.sqlite", max_rows=500, max_age_days=1.0) as store:
+        store.evaluate_portfolio(env, df.iloc[:300], healthy_floor)
+        clock[0] += 3_600.0
+        store.evaluate_portfolio(env, df.iloc[300:], healthy_floor)
+        assert len(store) == 400
+
+        # Over the row limit: the oldest rows go first
+        clock[0] += 3_600.0
+        cheaper = dataclasses.replace(env, labour_rate_per_hour=10.0)
+        store.evaluate_portfolio(cheaper, df.iloc[:200], healthy_floor)
+        assert len(store) == 500
+        assert len(store.query(env_settings=env, healthy_floor=healthy_floor)) == 300
+
+        # A day after the first writes, the next write evicts them
+        clock[0] += 86_400.0 - 60.0
+        store.evaluate_portfolio(cheaper, df.iloc[200:201], healthy_floor)
+        assert len(store) == 201
+        assert store.query(env_settings=env, healthy_floor=healthy_floor).empty
@@ -0,0 +1,45 @@
+"""Tests for settings sweeps."""
+
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+from cost_model import precompute_quantities
+from portfolio import PortfolioTotals, evaluate_portfolio
+from sensitivity import sweep
+from test_calculations import make_env, make_portfolio
+
+
+@pytest.mark.parametrize("healthy_floor", [20.0, 0.0])
+def test_sweep_matches_pointwise_evaluation(healthy_floor):
+    df = make_portfolio(2_000)
+    env = make_env(has_automation=True)
+    ranges = {
+        "filament_price_per_kg": [18.0, 29.0, 40.0],
+        "automated_plate_capacity": [1, 4],
+        "labour_rate_per_hour": [20.0, 45.0],
+    }
+    result = sweep(env, precompute_quantities(env, df), ranges, healthy_floor)
+    assert result.total_profit.shape == (3, 2, 2)
+    assert {"losing_count", "low_margin_count", "healthy_count", "profitable_count"} <= set(
+        result.to_frame().columns
+    )
+
+    for i, price in enumerate(ranges["filament_price_per_kg"]):
+        for j, capacity in enumerate(ranges["automated_plate_capacity"]):
+            for k, labour in enumerate(ranges["labour_rate_per_hour"]):
+                point = replace(
+                    env,
+                    filament_price_per_kg=price,
+                    automated_plate_capacity=capacity,
+                    labour_rate_per_hour=labour,
+                )
+                results = evaluate_portfolio(point, df, healthy_floor)
+                totals = PortfolioTotals.from_results(results)
+                assert np.isclose(result.total_profit[i, j, k], totals.total_profit)
+                assert np.isclose(result.average_margin[i, j, k], totals.average_margin)
+                assert result.losing_count[i, j, k] == totals.status_counts["Losing money"]
+                assert result.low_margin_count[i, j, k] == totals.status_counts["Low margin"]
+                assert result.healthy_count[i, j, k] == totals.status_counts["Healthy"]
+                assert result.profitable_count[i, j, k] == totals.status_counts["Profitable"]
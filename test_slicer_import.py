@@ -0,0 +1,154 @@
+"""Tests for importing slicer estimates from G-code and 3MF files."""
+
+import io
+import zipfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cli import main
+from slicer_import import (
+    HEAD_BYTES,
+    find_slicer_files,
+    parse_duration,
+    portfolio_frame,
+    read_slicer_file,
+    read_slicer_files,
+)
+
+MOVES = "G1 X10.0 Y10.0 E0.5\n" * 20_000
+
+PRUSA_FOOTER = """; filament used [mm] = 27890.12
+; filament used [cm3] = 67.09
+; filament used [g] = 83.20
+; total filament used [g] = 83.20
+; estimated printing time (normal mode) = 5h 24m 0s
+; estimated first layer printing time (normal mode) = 3m 1s
+
+; prusaslicer_config = begin
+; layer_height = 0.2
+; prusaslicer_config = end
+"""
+
+BAMBU_HEADER = """; HEADER_BLOCK_START
+; BambuStudio 01.09.00.70
+; model printing time: 1h 50m 2s; total estimated time: 2h 0m 0s
+; total layer number: 120
+; total filament weight [g] : 30.50
+; HEADER_BLOCK_END
+"""
+
+SLICE_INFO = """<?xml version="1.0" encoding="UTF-8"?>
+<config>
+  <header><header_item key="X-BBL-Client-Type" value="slicer"/></header>
+  <plate>
+    <metadata key="index" value="1"/>
+    <metadata key="prediction" value="7200"/>
+    <metadata key="weight" value="30.50"/>
+    <filament id="1" type="PLA" used_m="10.2" used_g="30.50"/>
+  </plate>
+  <plate>
+    <metadata key="index" value="2"/>
+    <metadata key="prediction" value="1800"/>
+    <metadata key="weight" value=""/>
+    <filament id="1" type="PLA" used_m="1.0" used_g="3.00"/>
+    <filament id="2" type="PETG" used_m="0.5" used_g="1.50"/>
+  </plate>
+</config>
+"""
+
+
+SIMPLIFY3D_FOOTER = """; Build Summary
+;   Build time: 2 hours 5 minutes
+;   Filament length: 14141.4 mm (14.14 m)
+;   Plastic volume: 34013.94 mm^3 (34.01 cc)
+;   Plastic weight: 42.22 g (0.09 lb)
+;   Material cost: 0.84
+"""
+
+
+def write_3mf(path, members: dict[str, str]) -> None:
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("3D/3dmodel.model", "<model/>")
+        for name, text in members.items():
+            archive.writestr(name, text)
+
+
+def test_durations():
+    assert parse_duration("1d 2h 3m 4s") == 93_784
+    assert parse_duration("2 hours 5 minutes") == 7_500
+    assert parse_duration("4530") == 4_530
+
+
+def test_reads_each_slicer_layout(tmp_path):
+    prusa = tmp_path / "benchy.gcode"
+    prusa.write_text("; generated by PrusaSlicer 2.7.1\n" + MOVES + PRUSA_FOOTER)
+    assert prusa.stat().st_size > 4 * HEAD_BYTES
+    model = read_slicer_file(prusa)
+    assert (model.name, model.filament_grams, model.plate_count) == ("benchy", 83.2, 1)
+    assert model.print_time_hours == pytest.approx(5.4)
+
+    cura = tmp_path / "bracket.gcode"
+    cura.write_text(";FLAVOR:Marlin\n;TIME:9000\n;Filament used: 1m, 0.5m\n" + MOVES)
+    model = read_slicer_file(cura)
+    assert model.print_time_hours == 2.5
+    assert model.filament_grams == pytest.approx(1.5 * np.pi * 0.875 ** 2 * 1.24)
+
+    simplify = tmp_path / "hook.gcode"
+    simplify.write_text("; G-Code generated by Simplify3D(R)\n" + MOVES + SIMPLIFY3D_FOOTER)
+    model = read_slicer_file(simplify)
+    assert model.filament_grams == 42.22
+    assert model.print_time_hours == pytest.approx(125 / 60)
+
+    # Bambu project: per-plate values from slice_info, plate 2 from its filaments
+    project = tmp_path / "heli.gcode.3mf"
+    write_3mf(project, {"Metadata/slice_info.config": SLICE_INFO})
+    model = read_slicer_file(project)
+    assert model.name == "heli"
+    assert [(p.index, p.filament_grams, p.print_time_hours) for p in model.plates] == [
+        (1, 30.5, 2.0), (2, 4.5, 0.5)
+    ]
+
+    # Without slice_info the plate G-code headers are read instead
+    bare = tmp_path / "bare.3mf"
+    write_3mf(bare, {
+        "Metadata/plate_2.gcode": BAMBU_HEADER + MOVES,
+        "Metadata/plate_1.gcode": MOVES + PRUSA_FOOTER,
+    })
+    model = read_slicer_file(bare)
+    assert [(p.index, p.filament_grams, p.print_time_hours) for p in model.plates] == [
+        (1, 83.2, pytest.approx(5.4)), (2, 30.5, 2.0)
+    ]
+
+    upload = io.BytesIO(prusa.read_bytes())
+    upload.name = "benchy.gcode"
+    assert read_slicer_file(upload).filament_grams == 83.2
+
+
+def test_directory_import_in_parallel(tmp_path):
+    (tmp_path / "sub").mkdir()
+    for i in range(6):
+        footer = PRUSA_FOOTER.replace("83.20", f"{10 + i}.00")
+        (tmp_path / "sub" / f"part{i}.gcode").write_text(MOVES[:2_000] + footer)
+    write_3mf(tmp_path / "heli.gcode.3mf", {"Metadata/slice_info.config": SLICE_INFO})
+    (tmp_path / "broken.gcode").write_text("G28\nG1 X0\n")
+    (tmp_path / "notes.txt").write_text("ignored")
+
+    paths = find_slicer_files(tmp_path)
+    assert len(paths) == 8
+    models, errors = read_slicer_files(paths, workers=2)
+    assert [m.name for m in models] == ["heli"] + [f"part{i}" for i in range(6)]
+    assert errors["File"].tolist() == [str(tmp_path / "broken.gcode")]
+    assert "filament weight" in errors["Reason"][0]
+
+    frame = portfolio_frame(models, per_plate=True)
+    assert frame["model_name"][:2].tolist() == ["heli (plate 1)", "heli (plate 2)"]
+    assert frame["plate_count"].eq(1).all() and frame["sale_price"].isna().all()
+
+    output = tmp_path / "portfolio.csv"
+    assert main(["import", str(tmp_path), str(output), "--sale-price", "25", "--workers", "2"]) == 0
+    imported = pd.read_csv(output)
+    assert imported["plate_count"].tolist() == [2] + [1] * 6
+    assert imported["filament_grams"].tolist() == [35.0] + [10.0 + i for i in range(6)]
+    assert imported["sale_price"].eq(25).all()
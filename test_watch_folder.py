@@ -0,0 +1,148 @@
+"""Tests for the watch-folder daemon."""
+
+import functools
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+import pandas as pd
+import pytest
+
+from cost_model import calculate_costs
+from portfolio import load_environment
+from result_store import ResultStore
+from slicer_import import read_slicer_file
+from test_slicer_import import PRUSA_FOOTER
+from watch_folder import (
+    FolderWatch,
+    InotifyWatcher,
+    PollingWatcher,
+    RollingCsv,
+    cost_sliced_file,
+    write_status,
+)
+
+
+def drop(path, grams: float, chunks: int = 1) -> None:
+    """Write a sliced file in ``chunks`` separate appends, like a slow copy."""
+    text = "G28\n" * 500 + PRUSA_FOOTER.replace("83.20", f"{grams:.2f}")
+    step = -(-len(text) // chunks)
+    for start in range(0, len(text), step):
+        with open(path, "a", encoding="utf-8") as out:
+            out.write(text[start:start + step])
+        time.sleep(0.02)
+
+
+@pytest.mark.parametrize("watcher_type", ["inotify", "polling"])
+def test_watch_costs_each_settled_file_once(tmp_path, watcher_type):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    try:
+        watcher = (
+            InotifyWatcher(inbox)
+            if watcher_type == "inotify"
+            else PollingWatcher(inbox, interval=0.05)
+        )
+    except OSError:
+        pytest.skip("inotify is not available")
+    env, healthy_floor = load_environment(None)
+    output = RollingCsv(tmp_path / "results.csv", max_rows=2)
+    store = ResultStore(tmp_path / "results.sqlite")
+    statuses = []
+    watch = FolderWatch(
+        watcher,
+        functools.partial(
+            cost_sliced_file,
+            env_settings=env,
+            healthy_floor=healthy_floor,
+            prices={"cheap": 1.0},
+            default_price=40.0,
+        ),
+        sinks=[
+            lambda row, frame: output.write(row),
+            lambda row, frame: store.evaluate_portfolio(env, frame, healthy_floor),
+        ],
+        workers=2,
+        settle_seconds=0.3,
+    )
+    runner = threading.Thread(
+        target=watch.run,
+        kwargs={
+            "tick": 0.02,
+            "status": lambda stats: statuses.append(stats.to_dict()),
+            "status_seconds": 0.1,
+            "max_files": 4,
+        },
+    )
+    runner.start()
+    drop(inbox / "cheap.gcode", 40.0)
+    drop(inbox / "burst.gcode", 120.0, chunks=5)
+    drop(inbox / "large.gcode", 500.0)
+    (inbox / "broken.gcode").write_text("G28\n")
+    (inbox / "notes.txt").write_text("not a slicer file")
+    runner.join(timeout=20)
+    assert not runner.is_alive()
+
+    stats = watch.stats
+    assert (stats.processed, stats.failed, stats.backlog) == (3, 1, 0)
+    assert len(stats.latencies) == 3 and min(stats.latencies) >= 0.3
+
+    # Three rows over two files: the first file rolled over after two rows
+    rolled = sorted(tmp_path.glob("results-*.csv"))
+    assert len(rolled) == 1
+    rows = pd.concat([pd.read_csv(rolled[0]), pd.read_csv(tmp_path / "results.csv")])
+    rows = rows.set_index("Model").sort_index()
+    assert rows.index.tolist() == ["burst", "cheap", "large"]
+    assert rows.loc["cheap", "Status"] == "Losing money"
+    expected = calculate_costs(
+        env, read_slicer_file(inbox / "burst.gcode").to_model_input(40.0)
+    )
+    assert rows.loc["burst", "Cost ($)"] == pytest.approx(expected.total_cost)
+    assert len(store) == 3
+    store.close()
+
+    final = statuses[-1]
+    assert (final["processed"], final["failed"], final["backlog"]) == (3, 1, 0)
+    assert final["latency_p95_seconds"] >= final["latency_p50_seconds"] >= 0.3
+    write_status(stats, tmp_path / "status.json")
+    assert json.loads((tmp_path / "status.json").read_text())["processed"] == 3
+
+
+def test_watch_survives_unexpected_errors(tmp_path):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    env, healthy_floor = load_environment(None)
+
+    def process(path):
+        if path.endswith("corrupt.3mf"):
+            raise zlib.error("invalid stored block lengths")
+        return cost_sliced_file(path, env, healthy_floor, {}, default_price=40.0)
+
+    def store(row, frame):
+        if row["Model"] == "locked":
+            raise sqlite3.OperationalError("database is locked")
+        saved.append(row["Model"])
+
+    saved, errors = [], []
+    watch = FolderWatch(
+        PollingWatcher(inbox, interval=0.05),
+        process,
+        sinks=[store],
+        settle_seconds=0.1,
+        on_error=lambda path, exc: errors.append((path.rsplit("/", 1)[-1], type(exc))),
+    )
+    runner = threading.Thread(target=watch.run, kwargs={"tick": 0.02, "max_files": 3})
+    runner.start()
+    (inbox / "corrupt.3mf").write_bytes(b"PK")
+    drop(inbox / "locked.gcode", 40.0)
+    drop(inbox / "fine.gcode", 40.0)
+    runner.join(timeout=20)
+    assert not runner.is_alive()
+
+    assert (watch.stats.processed, watch.stats.failed) == (1, 2)
+    assert saved == ["fine"]
+    assert sorted(errors) == [
+        ("corrupt.3mf", zlib.error), ("locked.gcode", sqlite3.OperationalError)
+    ]
@@ -0,0 +1,407 @@
+# watch_folder.py - Cost sliced jobs as they land in a watched directory
+
+import csv
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from cost_model import (
+    EnvironmentSettings,
+    calculate_break_even_and_health,
+    calculate_costs,
+    classify_model,
+)
+from slicer_import import SLICER_SUFFIXES, portfolio_frame, read_slicer_file
+
+# A file is costed once it has had no events for this long, so a burst of
+# writes (or a copy in progress) is handled once
+DEFAULT_SETTLE_SECONDS = 2.0
+DEFAULT_POLL_SECONDS = 1.0
+DEFAULT_STATUS_SECONDS = 5.0
+# Per-file latencies kept for the percentiles in the status
+LATENCY_WINDOW = 1_000
+
+WATCH_COLUMNS = (
+    "Processed at",
+    "File",
+    "Model",
+    "Filament (g)",
+    "Time (h)",
+    "Plates",
+    "Sale ($)",
+    "Cost ($)",
+    "Profit ($)",
+    "Margin (%)",
+    "Remote",
+    "Status",
+    "Latency (s)",
+)
+
+# inotify(7) event bits
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _is_slicer_file(name: str) -> bool:
+    return name.lower().endswith(SLICER_SUFFIXES) and not name.startswith(".")
+
+
+class InotifyWatcher:
+    """Files finished writing into (or moved into) a directory, via Linux inotify.
+
+    Raises ``OSError`` where inotify is unavailable.
+    """
+
+    def __init__(self, directory):
+        self.directory = str(directory)
+        libc_name = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(libc_name, use_errno=True) if libc_name else None
+        if libc is None or not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = _IN_CLOSE_WRITE | _IN_MOVED_TO
+        if libc.inotify_add_watch(self._fd, os.fsencode(self.directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"Cannot watch {self.directory}")
+
+    def poll(self, timeout: float) -> list[str]:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if _is_slicer_file(name):
+                paths.append(os.path.join(self.directory, name))
+        return paths
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Files whose size or modification time changed since the last scan."""
+
+    def __init__(self, directory, interval: float = DEFAULT_POLL_SECONDS):
+        self.directory = str(directory)
+        self.interval = interval
+        self._seen = self._scan()
+        self._next_scan = 0.0
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        with os.scandir(self.directory) as entries:
+            return {
+                entry.path: (entry.stat().st_size, entry.stat().st_mtime_ns)
+                for entry in entries
+                if entry.is_file() and _is_slicer_file(entry.name)
+            }
+
+    def poll(self, timeout: float) -> list[str]:
+        delay = self._next_scan - time.monotonic()
+        if delay > 0:
+            time.sleep(min(delay, timeout))
+            if delay > timeout:
+                return []
+        self._next_scan = time.monotonic() + self.interval
+        current = self._scan()
+        changed = [path for path, stamp in current.items() if self._seen.get(path) != stamp]
+        self._seen = current
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+def open_watcher(directory, polling: bool = False, interval: float = DEFAULT_POLL_SECONDS):
+    """inotify where available, otherwise (or when asked) a polling scan."""
+    if not polling:
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directory, interval)
+
+
+def load_prices(path) -> dict[str, float]:
+    """Sale prices by model name from a CSV with model_name and sale_price columns."""
+    prices = pd.read_csv(path, usecols=["model_name", "sale_price"], dtype={"model_name": str})
+    prices = prices.dropna()
+    return dict(zip(prices["model_name"], prices["sale_price"].astype(float)))
+
+
+def cost_sliced_file(
+    path,
+    env_settings: EnvironmentSettings,
+    healthy_floor: float,
+    prices: dict[str, float],
+    default_price: float | None = None,
+) -> tuple[dict, pd.DataFrame]:
+    """Import one sliced file and cost it with the scalar model.
+
+    Returns the watch-report row (without timing columns) and the
+    portfolio row. Raises ``ValueError`` if the model has no sale price.
+    """
+    model = read_slicer_file(path)
+    sale_price = prices.get(model.name, default_price)
+    if sale_price is None or np.isnan(sale_price):
+        raise ValueError(f"No sale price for {model.name}; add it to the price list")
+    breakdown = calculate_costs(env_settings, model.to_model_input(sale_price))
+    _, healthy_price = calculate_break_even_and_health(breakdown.total_cost, healthy_floor)
+    row = {
+        "File": str(path),
+        "Model": model.name,
+        "Filament (g)": model.filament_grams,
+        "Time (h)": model.print_time_hours,
+        "Plates": model.plate_count,
+        "Sale ($)": sale_price,
+        "Cost ($)": breakdown.total_cost,
+        "Profit ($)": breakdown.profit,
+        "Margin (%)": breakdown.profit_margin_percent,
+        "Remote": "✅" if breakdown.remote_friendly else "❌",
+        "Status": classify_model(sale_price, breakdown.total_cost, healthy_price),
+    }
+    return row, portfolio_frame([model], sale_price=sale_price)
+
+
+class RollingCsv:
+    """Append rows to a CSV; past ``max_rows`` the file is renamed with a
+    timestamp suffix and a new one is started."""
+
+    def __init__(self, path, max_rows: int | None = None):
+        self.path = str(path)
+        self.max_rows = max_rows
+        self._rows = self._count_rows()
+
+    def _count_rows(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, encoding="utf-8") as fh:
+            return max(sum(1 for _ in fh) - 1, 0)
+
+    def write(self, row: dict) -> None:
+        if self.max_rows and self._rows >= self.max_rows:
+            stem, ext = os.path.splitext(self.path)
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+            os.replace(self.path, f"{stem}-{stamp}{ext}")
+            self._rows = 0
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "a", encoding="utf-8", newline="") as out:
+            writer = csv.DictWriter(out, fieldnames=WATCH_COLUMNS)
+            if new_file:
+                writer.writeheader()
+            writer.writerow(row)
+        self._rows += 1
+
+
+@dataclass
+class WatchStats:
+    """Counters and gauges of a running watch.
+
+    Latency runs from the first event for a file to its result being
+    written. ``backlog`` counts files waiting to settle, queued or being
+    costed.
+    """
+    processed: int = 0
+    failed: int = 0
+    backlog: int = 0
+    in_flight: int = 0
+    latencies: deque = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+    started: float = field(default_factory=time.monotonic)
+
+    def latency_percentiles(self) -> tuple[float, float, float]:
+        """p50, p95 and max latency in seconds over the recent window."""
+        if not self.latencies:
+            return (float("nan"),) * 3
+        values = np.fromiter(self.latencies, dtype=np.float64)
+        p50, p95 = np.percentile(values, [50, 95])
+        return float(p50), float(p95), float(values.max())
+
+    def to_dict(self) -> dict:
+        p50, p95, worst = (
+            None if np.isnan(value) else round(value, 3) for value in self.latency_percentiles()
+        )
+        return {
+            "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "uptime_seconds": round(time.monotonic() - self.started, 1),
+            "processed": self.processed,
+            "failed": self.failed,
+            "backlog": self.backlog,
+            "in_flight": self.in_flight,
+            "latency_p50_seconds": p50,
+            "latency_p95_seconds": p95,
+            "latency_max_seconds": worst,
+        }
+
+
+def write_status(stats: WatchStats, path) -> None:
+    """Replace ``path`` with the current stats as JSON (atomically)."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as out:
+        json.dump(stats.to_dict(), out, indent=2)
+    os.replace(tmp, path)
+
+
+class FolderWatch:
+    """Debounce file events and cost settled files on a bounded thread pool.
+
+    ``process(path)`` returns a report row and a portfolio frame; each
+    ``sinks`` entry gets ``sink(row, frame)`` from the watch thread, so
+    sinks need no locking. At most ``2 * workers`` files are in flight;
+    the rest wait in the backlog. A file whose processing or sinks raise is
+    passed to ``on_error(path, exc)`` and counted as failed; the watch
+    keeps running.
+    """
+
+    def __init__(
+        self,
+        watcher,
+        process,
+        sinks=(),
+        workers: int = 2,
+        settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+        on_error=None,
+    ):
+        if on_error is None:
+            on_error = log_error
+        self.watcher = watcher
+        self.process = process
+        self.sinks = list(sinks)
+        self.workers = workers
+        self.settle_seconds = settle_seconds
+        self.on_error = on_error
+        self.stats = WatchStats()
+        # path -> (first event, last event), monotonic seconds
+        self._pending: dict[str, tuple[float, float]] = {}
+        self._ready: deque[tuple[str, float]] = deque()
+        self._stop = threading.Event()
+
+    def add(self, paths, now: float | None = None) -> None:
+        """Record events for ``paths`` (e.g. files present at start-up)."""
+        now = time.monotonic() if now is None else now
+        for path in paths:
+            first, _ = self._pending.get(path, (now, now))
+            self._pending[path] = (first, now)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _settle(self, now: float) -> None:
+        settled = [
+            (path, first)
+            for path, (first, last) in self._pending.items()
+            if now - last >= self.settle_seconds
+        ]
+        for path, first in settled:
+            del self._pending[path]
+            self._ready.append((path, first))
+
+    def _finish(self, future, path: str, first: float) -> None:
+        # Anything a corrupt file or a failing sink raises stops here, so
+        # one bad file cannot end a long-running watch
+        try:
+            row, frame = future.result()
+            latency = time.monotonic() - first
+            row = {
+                "Processed at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                **row,
+                "Latency (s)": round(latency, 3),
+            }
+            for sink in self.sinks:
+                sink(row, frame)
+        except Exception as exc:
+            self.stats.failed += 1
+            self.on_error(path, exc)
+            return
+        self.stats.processed += 1
+        self.stats.latencies.append(latency)
+
+    def run(
+        self,
+        tick: float = 0.2,
+        status=None,
+        status_seconds: float = DEFAULT_STATUS_SECONDS,
+        max_files: int | None = None,
+    ) -> WatchStats:
+        """Watch until ``stop()`` (or ``max_files`` files are done).
+
+        ``status(stats)`` is called every ``status_seconds`` and on exit.
+        """
+        running = {}
+        next_status = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while not self._stop.is_set():
+                self.add(self.watcher.poll(tick if not running else min(tick, 0.05)))
+                now = time.monotonic()
+                self._settle(now)
+                while self._ready and len(running) < 2 * self.workers:
+                    path, first = self._ready.popleft()
+                    running[pool.submit(self.process, path)] = (path, first)
+                if running:
+                    done, _ = wait(running, timeout=0, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._finish(future, *running.pop(future))
+
+                stats = self.stats
+                stats.in_flight = len(running)
+                stats.backlog = len(self._pending) + len(self._ready) + len(running)
+                if status is not None and now >= next_status:
+                    status(stats)
+                    next_status = now + status_seconds
+                if max_files is not None and stats.processed + stats.failed >= max_files:
+                    break
+            for future in list(running):
+                self._finish(future, *running.pop(future))
+        self.stats.in_flight = 0
+        self.stats.backlog = len(self._pending) + len(self._ready)
+        if status is not None:
+            status(self.stats)
+        self.watcher.close()
+        return self.stats
+
+
+def existing_files(directory) -> list[str]:
+    with os.scandir(directory) as entries:
+        return sorted(
+            entry.path for entry in entries if entry.is_file() and _is_slicer_file(entry.name)
+        )
+
+
+def log_error(path: str, exc: Exception, stream=sys.stderr) -> None:
+    print(f"Skipped {path}: {type(exc).__name__}: {exc}", file=stream)
+
+
+def log_row(row: dict, stream=sys.stderr) -> None:
+    margin = row["Margin (%)"]
+    margin = f"{margin:.1f}%" if margin is not None else "n/a"
+    print(
+        f"[{row['Status']}] {row['Model']}: cost ${row['Cost ($)']:,.2f}, "
+        f"margin {margin}, latency {row['Latency (s)']:.2f}s",
+        file=stream,
+    )